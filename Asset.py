@@ -1,9 +1,12 @@
 """This module contain classes that encapsule the assets (Bonds, Stocks, Cash) in a financial portfolio
 
     Assets have an id, a type, a purchase price, holding and purchase timestamp
-    Assest of the same type and id can be added and substracted. 
+    Assest of the same type and id can be added and substracted, the result keeps the class of the left operand.
     The Asset class needs to be initialized with a PricingSystem object
 
+    Assets use __slots__ (no per instance __dict__) and interned string ids, to keep millions of them in memory.
+    An asset can be made immutable with freeze().
+
    Usage example:
 
     Asset.pricing_system = PricingSystem()
@@ -20,6 +23,7 @@
     print(cash_asset_1 == bond_asset_2)
 """
 
+import sys
 from enum import Enum, unique
 from Currency import Currency
 
@@ -32,6 +36,20 @@ class AssetType(Enum):
     Bond = "BOND"
     Stock = "STOCK"
 
+    @property
+    def code(self):
+        """Integer code of the asset type (its definition order), used by compact encodings"""
+        return _ASSET_TYPE_CODES[self]
+
+    @staticmethod
+    def from_code(code):
+        """Returns the asset type of an integer code"""
+        return _ASSET_TYPES[code]
+
+
+_ASSET_TYPES = list(AssetType)
+_ASSET_TYPE_CODES = {asset_type: code for code, asset_type in enumerate(_ASSET_TYPES)}
+
 
 class Asset:
     """Financial asset. An asset is defined by:
@@ -42,10 +60,15 @@ class Asset:
             - the holding (amount) of that particular asset
     """
 
+    __slots__ = ("type", "id", "currency", "holding", "unit_price", "timestamp")
+
     # Pricing system object to determine the current asset value
     # and to convert currency values
     pricing_system = None
 
+    # True for the classes of frozen (immutable) assets
+    frozen = False
+
     def __init__(self, asset_type, id, holding, currency = Currency.Dollars, unit_price = 0, timestamp = None):
         """Create a new asset
 
@@ -67,9 +90,9 @@ class Asset:
         if unit_price < 0:
             raise ValueError("holding must be a non negative value")
         
-        # Assign attribute values
+        # Assign attribute values, string ids are interned so equal ids share the same object
         self.type = asset_type
-        self.id = id  
+        self.id = sys.intern(id) if type(id) is str else id
         self.currency = currency
         self.holding = holding
         self.unit_price = unit_price
@@ -88,23 +111,30 @@ class Asset:
 
         return purchase_value
 
-    def current_value(self, currency = None):
-        """Gets the current value of the asset in the specified currency"""
+    def current_value(self, currency = None, current_unit_price = None):
+        """Gets the current value of the asset in the specified currency
+
+        current_unit_price is the sell price in that currency, if None it is requested to the pricing system
+        """
 
         if currency == None:
             currency = self.currency
 
         # Get the current value of the asset, its unit price
-        current_unit_price = self.pricing_system.get_asset_sell_price(self.id, currency)
+        if current_unit_price is None:
+            current_unit_price = self.pricing_system.get_asset_sell_price(self.id, currency)
         return self.holding * current_unit_price
 
-    def profit(self, currency = None):
-        """Get the current profit of this asset in the specified currency"""
+    def profit(self, currency = None, current_unit_price = None):
+        """Get the current profit of this asset in the specified currency
+
+        current_unit_price is the sell price in that currency, if None it is requested to the pricing system
+        """
 
         if currency == None:
             currency = self.currency
         
-        return self.current_value(currency) - self.purchase_value(currency)
+        return self.current_value(currency, current_unit_price) - self.purchase_value(currency)
 
 
     def __eq__(self, other):
@@ -140,7 +170,7 @@ class Asset:
             raise ValueError("Assest to substract must be of the same type and id")
 
         total_holding = self.holding - other.holding
-        return Asset(self.type, self.id, total_holding, self.currency, self.unit_price, self.timestamp)
+        return self._copy(total_holding, self.unit_price, self.timestamp)
 
     def __add__(self, other):
         """Overloads add operator
@@ -162,7 +192,46 @@ class Asset:
         total_purchase_value = self.purchase_value() + other.purchase_value(self.currency)
         unit_price = total_purchase_value / total_holding
 
-        return Asset(self.type, self.id, total_holding, self.currency, unit_price, other.timestamp)
+        return self._copy(total_holding, unit_price, other.timestamp)
+
+    def _copy(self, holding, unit_price, timestamp):
+        """Returns an asset of the same class, type, id and currency with the given holding, unit price and timestamp
+
+        Raises:
+            ValueError: if holding or unit price are negative values
+        """
+
+        if holding < 0:
+            raise ValueError("holding must be a non negative value")
+        if unit_price < 0:
+            raise ValueError("unit price must be a non negative value")
+
+        # Slots are set through their descriptors, so frozen classes can be copied too
+        asset = object.__new__(type(self))
+        for name, value in (("type", self.type), ("id", self.id), ("currency", self.currency),
+                            ("holding", holding), ("unit_price", unit_price), ("timestamp", timestamp)):
+            getattr(Asset, name).__set__(asset, value)
+        return asset
+
+    def __getstate__(self):
+        """Pickle state: the slot values"""
+        return tuple(getattr(self, name) for name in Asset.__slots__)
+
+    def __setstate__(self, state):
+        """Restores the pickle state through the slot descriptors (frozen assets can be unpickled)"""
+
+        for name, value in zip(Asset.__slots__, state):
+            getattr(Asset, name).__set__(self, value)
+
+    def freeze(self):
+        """Makes the asset immutable and returns it
+
+        The asset class becomes the frozen version of its class (a subclass), frozen assets can be hashed.
+        """
+
+        if not self.frozen:
+            self.__class__ = frozen_class(type(self))
+        return self
 
     def __str__(self):
         """String output"""
@@ -172,6 +241,8 @@ class Asset:
 class CashAsset(Asset):
     """Constructs a chash asset"""
 
+    __slots__ = ()
+
     def __init__(self, id, holding, currency = Currency.Dollars, unit_price = 0, timestamp = None):
         """Create new asset
 
@@ -190,6 +261,8 @@ class CashAsset(Asset):
 class BondAsset(Asset):
     """Constructs a bond asset"""
 
+    __slots__ = ()
+
     def __init__(self, id, holding, currency = Currency.Dollars, unit_price = 0, timestamp = None):
         """Create new asset
 
@@ -209,6 +282,8 @@ class BondAsset(Asset):
 class StockAsset(Asset):
     """Constructs a stock asset"""
 
+    __slots__ = ()
+
     def __init__(self, id, holding, currency = Currency.Dollars, unit_price = 0, timestamp = None):
         """Create new asset
 
@@ -225,6 +300,38 @@ class StockAsset(Asset):
         super(StockAsset, self).__init__(AssetType.Stock, id, holding, currency, unit_price, timestamp)
 
 
+def _frozen_setattr(self, name, value):
+    raise AttributeError("Frozen assets can not be modified")
+
+
+def _frozen_hash(self):
+    return hash((self.currency, self.id, self.type, self.unit_price, self.holding))
+
+
+def frozen_class(asset_class):
+    """Returns the frozen (immutable) version of an asset class, creating it the first time
+
+    Frozen classes are published in this module, so frozen assets can be pickled.
+    """
+
+    name = "Frozen" + asset_class.__name__
+    frozen = globals().get(name)
+    if frozen is None:
+        frozen = type(name, (asset_class,), {"__slots__": (), "__module__": __name__, "frozen": True,
+                                             "__setattr__": _frozen_setattr, "__delattr__": _frozen_setattr,
+                                             "__hash__": _frozen_hash})
+        globals()[name] = frozen
+    return frozen
+
+
+# Asset class used to build each type of asset
+ASSET_CLASSES = {
+    AssetType.Cash: CashAsset,
+    AssetType.Bond: BondAsset,
+    AssetType.Stock: StockAsset,
+}
+
+
 if __name__ == "__main__":
 
     import MockPricingSystem
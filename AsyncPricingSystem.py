@@ -0,0 +1,111 @@
+"""Asynchronous pricing system protocol and concurrent price requests
+
+An asynchronous pricing system provides the coroutine versions of the pricing system methods:
+    - async convert_currency_value(value, input_currency, output_currency, timestamp = None)
+    - async get_asset_sell_price(asset_id, currency, timestamp = None)
+
+Synchronous pricing systems (like MockPricingSystem) are wrapped in an AsyncPricingAdapter,
+that runs their calls in a thread pool executor.
+
+Requests are fanned out concurrently by a RequestPolicy, that limits the number of requests in flight
+and applies a timeout and retries to each of them.
+
+Usage example:
+
+    value = asyncio.run(portfolio.get_current_value_async(Currency.Euros, policy = RequestPolicy(max_concurrency = 32)))
+"""
+
+import asyncio
+import functools
+
+
+class AsyncPricingAdapter:
+    """Runs the calls of a synchronous pricing system in an executor"""
+
+    def __init__(self, pricing_system, executor = None):
+        """Create an adapter
+
+        Args:
+            pricing_system: synchronous pricing system
+            executor: concurrent.futures executor, the event loop default executor if None
+        """
+
+        self.pricing_system = pricing_system
+        self.executor = executor
+
+    async def _run(self, function, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(function, *args))
+
+    async def convert_currency_value(self, value, input_currency, output_currency, timestamp = None):
+        """Returns the value in input currency converted to output currency according to the timestamp"""
+        return await self._run(self.pricing_system.convert_currency_value, value, input_currency, output_currency, timestamp)
+
+    async def get_asset_sell_price(self, asset_id, currency, timestamp = None):
+        """Returns the sell unit price of the asset in the given currency"""
+        return await self._run(self.pricing_system.get_asset_sell_price, asset_id, currency, timestamp)
+
+
+def as_async_pricing_system(pricing_system):
+    """Returns the pricing system if its methods are coroutines, else wraps it in an AsyncPricingAdapter"""
+
+    if asyncio.iscoroutinefunction(getattr(pricing_system, "get_asset_sell_price", None)):
+        return pricing_system
+    return AsyncPricingAdapter(pricing_system)
+
+
+class RequestPolicy:
+    """Concurrency limit, timeout and retries applied to asynchronous pricing requests"""
+
+    def __init__(self, max_concurrency = 16, timeout = None, retries = 0, retry_delay = 0.05):
+        """Create a request policy
+
+        Args:
+            max_concurrency: maximum number of requests in flight
+            timeout: seconds allowed for each request attempt, None for no timeout
+            retries: number of times a failed or timed out request is retried
+            retry_delay: seconds waited before the first retry, doubled on each retry
+
+        Raises:
+            ValueError: if max_concurrency is not positive or retries is negative
+        """
+
+        if max_concurrency <= 0:
+            raise ValueError("max_concurrency must be a positive value")
+        if retries < 0:
+            raise ValueError("retries must be a non negative value")
+
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+
+    async def _request(self, semaphore, function, *args):
+        """Runs one request, retrying it on errors and timeouts"""
+
+        attempt = 0
+        while True:
+            try:
+                async with semaphore:
+                    return await asyncio.wait_for(function(*args), self.timeout)
+            except asyncio.CancelledError:
+                # A subclass of Exception before Python 3.8: a cancelled request is not retried
+                raise
+            except Exception:
+                if attempt >= self.retries:
+                    raise
+                await asyncio.sleep(self.retry_delay * (2 ** attempt))
+                attempt += 1
+
+    async def gather(self, requests):
+        """Runs the requests concurrently and returns their results in the same order
+
+        Args:
+            requests: list of (coroutine function, args tuple)
+
+        Raises:
+            the exception of the first request that still fails after its retries
+        """
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        return await asyncio.gather(*[self._request(semaphore, function, *args) for function, args in requests])
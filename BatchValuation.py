@@ -0,0 +1,171 @@
+"""Values many portfolios in parallel across a process pool
+
+Each worker replays one portfolio at a time from its transaction history file and sends back its positions:
+holdings and purchase values in the valuation currency. Portfolio objects are already replayed, so their
+positions are taken in the parent process while the workers replay the files (they are not pickled, and
+they are not counted in the WorkerStats).
+Prices are only requested by the parent process, in one batch per newly seen asset ids, and shared by the
+valuation of every portfolio, so each distinct asset is priced once for the whole run.
+Valuations are yielded as soon as each portfolio finishes.
+
+Usage:
+    From the console, go to the directory where this file is located ($ROOT_DIR) and execute
+
+        python BatchValuation.py <DOL|EUR> <transaction_history_file.json> [<transaction_history_file.json> ...]
+
+Usage example:
+
+    for valuation in value_portfolios(["client1.json", "client2.json"], Currency.Euros, max_workers = 8):
+        print(valuation.source, valuation.value)
+"""
+
+import os
+import sys
+import time
+import collections
+import concurrent.futures
+from Currency import Currency
+from Asset import Asset
+from Portfolio import Portfolio
+from PricingSystem import get_price_snapshot
+from CachingPricingSystem import CachingPricingSystem
+import TransactionLoader
+
+
+# Valuation of one portfolio
+#   - source: the transaction history file or Portfolio object that was valued
+#   - value: total value in the valuation currency
+#   - profits: dict asset_id -> profit in the valuation currency
+#   - worker: process id of the worker that replayed the portfolio (the parent process for Portfolio objects)
+#   - elapsed: seconds spent by the worker
+PortfolioValuation = collections.namedtuple("PortfolioValuation", ["source", "value", "profits", "worker", "elapsed"])
+
+
+class WorkerStats:
+    """Throughput of each worker of a batch valuation"""
+
+    def __init__(self):
+        self.portfolios = collections.Counter()
+        self.transactions = collections.Counter()
+        self.busy_time = collections.Counter()
+
+    def add(self, worker, transactions, elapsed):
+        """Registers a portfolio replayed by a worker"""
+
+        self.portfolios[worker] += 1
+        self.transactions[worker] += transactions
+        self.busy_time[worker] += elapsed
+
+    def throughput(self):
+        """Returns a dict worker -> (portfolios/sec, transactions/sec) measured on the worker busy time"""
+
+        return {worker: (self.portfolios[worker] / max(self.busy_time[worker], 1e-9),
+                         self.transactions[worker] / max(self.busy_time[worker], 1e-9))
+                for worker in self.portfolios}
+
+    def __str__(self):
+        """String output"""
+
+        lines = []
+        for worker, (portfolios_rate, transactions_rate) in sorted(self.throughput().items()):
+            lines.append(f"Worker {worker}: {self.portfolios[worker]} portfolios, {self.transactions[worker]} transactions, "
+                         f"{portfolios_rate: .1f} portfolios/sec, {transactions_rate: .0f} transactions/sec")
+        return "\n".join(lines)
+
+
+def _init_worker(pricing_system):
+    """Sets the pricing system of a worker process, conversion rates are cached for the worker lifetime"""
+
+    Asset.pricing_system = CachingPricingSystem(pricing_system)
+
+
+def _positions(portfolio, currency):
+    """Returns the positions of a portfolio, as a list of (asset_id, holding, purchase value in currency)"""
+
+    # Purchase values are converted with one conversion matrix per portfolio
+    holdings, values, currencies, timestamps = portfolio.assets.purchase_terms()
+    purchase_values = portfolio.get_fx_matrix(currency).convert(values, currencies, currency, timestamps)
+    return list(zip(portfolio.get_asset_ids(), holdings.tolist(), purchase_values.tolist()))
+
+
+def _replay(source, currency):
+    """Worker task: replays the portfolio of a transaction history file and returns its positions
+
+    Returns:
+        (positions, transaction count, worker process id, elapsed seconds), positions being a list of
+        (asset_id, holding, purchase value in currency)
+    """
+
+    start = time.perf_counter()
+    stats = TransactionLoader.LoaderStats()
+    portfolio = Portfolio()
+    portfolio.transactions(TransactionLoader.load_transactions(source, stats = stats))
+    return _positions(portfolio, currency), stats.rows, os.getpid(), time.perf_counter() - start
+
+
+def value_portfolios(sources, currency, pricing_system = None, max_workers = None, stats = None, mp_context = None):
+    """Values portfolios in a process pool, yielding each PortfolioValuation as soon as it is ready
+
+    Args:
+        sources: transaction history files and/or Portfolio objects
+        currency: valuation Currency
+        pricing_system: pricing system used by the parent and the workers (must be picklable),
+                        Asset.pricing_system if None
+        max_workers: number of worker processes, the number of CPUs if None
+        stats: optional WorkerStats updated as the transaction history files finish
+        mp_context: multiprocessing context of the pool (eg: multiprocessing.get_context("spawn")),
+                    the platform default if None
+
+    Raises:
+        the exception raised by the replay of a portfolio (eg: ValueError on a short position)
+    """
+
+    sources = list(sources)
+    pricing_system = pricing_system if pricing_system is not None else Asset.pricing_system
+    prices = {}
+
+    def valuation(source, positions, worker, elapsed):
+        # Only the asset ids never seen before are priced
+        missing = [asset_id for asset_id, _, _ in positions if asset_id not in prices]
+        if missing:
+            prices.update(get_price_snapshot(pricing_system, missing, currency))
+
+        value = 0
+        profits = {}
+        for asset_id, holding, purchase_value in positions:
+            current_value = holding * prices[asset_id]
+            value += current_value
+            profits[asset_id] = current_value - purchase_value
+        return PortfolioValuation(source, value, profits, worker, elapsed)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers = max_workers, mp_context = mp_context, initializer = _init_worker,
+                                                initargs = (pricing_system,)) as executor:
+        futures = {executor.submit(_replay, source, currency): source for source in sources if not isinstance(source, Portfolio)}
+
+        for source in sources:
+            if isinstance(source, Portfolio):
+                start = time.perf_counter()
+                positions = _positions(source, currency)
+                yield valuation(source, positions, os.getpid(), time.perf_counter() - start)
+
+        for future in concurrent.futures.as_completed(futures):
+            positions, transactions, worker, elapsed = future.result()
+            if stats is not None:
+                stats.add(worker, transactions, elapsed)
+            yield valuation(futures[future], positions, worker, elapsed)
+
+if __name__ == "__main__":
+
+    import MockPricingSystem
+
+    if len(sys.argv) < 3:
+        print("Error: Expecting at least 2 parameters ")
+        print(" - Usage: python BatchValuation.py <DOL|EUR> <transaction_history_file.json> [...]")
+        exit()
+
+    currency = Currency.Dollars if sys.argv[1] == "DOL" else Currency.Euros
+    stats = WorkerStats()
+    for valuation in value_portfolios(sys.argv[2:], currency, MockPricingSystem.MockPricingSystem(), stats = stats):
+        print(f"{valuation.source}: Portfolio value: {valuation.value: .3f} {currency.name} (worker {valuation.worker})")
+
+    print(stats)
@@ -0,0 +1,189 @@
+"""Defines a caching layer that wraps any pricing system
+
+Sell prices and currency conversion rates are kept in a bounded LRU cache:
+    - live entries (no timestamp) expire after a time to live (TTL), that can depend on the asset id
+    - historical entries (with a timestamp) never expire, they can only be evicted by the LRU policy
+
+Hits and misses are also counted by method in the pricing_cache_requests_total counter of METRICS (if enabled).
+
+Currency conversions are cached as rates (the conversion of a unit value), so the wrapped pricing
+system conversion is assumed to be proportional to the value.
+
+Usage example:
+
+    Asset.pricing_system = CachingPricingSystem(PricingSystem(), max_size = 100000, price_ttl = 5)
+    ...
+    print(Asset.pricing_system.stats())
+"""
+
+import time
+import collections
+from PricingSystem import as_batch_pricing_system
+from Metrics import METRICS
+
+
+class CachingPricingSystem:
+    """Pricing system decorator with a bounded LRU cache of prices and conversion rates"""
+
+    def __init__(self, pricing_system, max_size = 100000, price_ttl = 60.0, clock = time.monotonic):
+        """Create a caching pricing system
+
+        Args:
+            pricing_system: the pricing system to wrap
+            max_size: maximum number of cached entries, the least recently used are evicted first
+            price_ttl: time to live in seconds of live entries, a number or a function asset_id -> seconds
+                       (currency conversion entries use the function with asset_id None)
+            clock: function returning the current time in seconds
+        """
+
+        if max_size <= 0:
+            raise ValueError("max_size must be a positive value")
+
+        self.pricing_system = pricing_system
+        self.max_size = max_size
+        self.price_ttl = price_ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        # key -> (value, expiration time or None)
+        self._cache = collections.OrderedDict()
+        self._invalidations = 0
+        # Earliest expiration time of the cached live entries (None if there is none), and the number of
+        # times it was reached, that is part of the price version
+        self._next_expiration = None
+        self._expiries = 0
+
+    def _ttl(self, asset_id):
+        """Time to live of a live entry"""
+        return self.price_ttl(asset_id) if callable(self.price_ttl) else self.price_ttl
+
+    def _get(self, key, method):
+        """Returns the cached value of key, None if not cached or expired"""
+
+        entry = self._cache.get(key)
+        if entry is not None:
+            value, expiration = entry
+            if expiration is None or expiration > self.clock():
+                self._cache.move_to_end(key)
+                self.hits += 1
+                METRICS.count("pricing_cache_requests_total", method = method, status = "hit")
+                return value
+
+            del self._cache[key]
+            self.expirations += 1
+
+        self.misses += 1
+        METRICS.count("pricing_cache_requests_total", method = method, status = "miss")
+        return None
+
+    def _put(self, key, value, asset_id, timestamp):
+        """Caches a value, live entries (timestamp None) get an expiration time"""
+
+        expiration = None if timestamp is not None else self.clock() + self._ttl(asset_id)
+        if expiration is not None and (self._next_expiration is None or expiration < self._next_expiration):
+            self._next_expiration = expiration
+        self._cache[key] = (value, expiration)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last = False)
+            self.evictions += 1
+
+    def get_asset_sell_price(self, asset_id, currency, timestamp = None):
+        """Returns the sell unit price of the asset in the given currency"""
+
+        key = ("price", asset_id, currency, timestamp)
+        price = self._get(key, "get_asset_sell_price")
+        if price is None:
+            price = self.pricing_system.get_asset_sell_price(asset_id, currency, timestamp)
+            self._put(key, price, asset_id, timestamp)
+
+        return price
+
+    def get_asset_sell_prices(self, asset_ids, currency, timestamp = None):
+        """Returns the sell unit prices of the assets, the missing ones are requested in a single batch"""
+
+        prices = []
+        missing = []
+        for asset_id in asset_ids:
+            price = self._get(("price", asset_id, currency, timestamp), "get_asset_sell_prices")
+            if price is None:
+                missing.append((len(prices), asset_id))
+            prices.append(price)
+
+        if missing:
+            missing_ids = [asset_id for _, asset_id in missing]
+            fetched = as_batch_pricing_system(self.pricing_system).get_asset_sell_prices(missing_ids, currency, timestamp)
+            for (position, asset_id), price in zip(missing, fetched):
+                prices[position] = price
+                self._put(("price", asset_id, currency, timestamp), price, asset_id, timestamp)
+
+        return prices
+
+    def convert_currency_value(self, value, input_currency, output_currency, timestamp = None):
+        """Returns the value in input currency converted to output currency according to the timestamp"""
+
+        if input_currency == output_currency:
+            return value
+
+        key = ("fx", input_currency, output_currency, timestamp)
+        rate = self._get(key, "convert_currency_value")
+        if rate is None:
+            rate = self.pricing_system.convert_currency_value(1.0, input_currency, output_currency, timestamp)
+            self._put(key, rate, None, timestamp)
+
+        return value * rate
+
+    def invalidate(self, asset_id = None):
+        """Removes cached entries
+
+        Args:
+            asset_id: removes the prices of this asset id, if None every entry is removed
+        """
+
+        self._invalidations += 1
+        if asset_id is None:
+            self._cache.clear()
+            self._next_expiration = None
+            return
+
+        for key in [key for key in self._cache if key[0] == "price" and key[1] == asset_id]:
+            del self._cache[key]
+
+    @property
+    def price_version(self):
+        """Version of the prices (see ValuationCache): changes with the wrapped pricing system version,
+        on each invalidation and when a cached live entry expires (so that it is requested again),
+        None if the wrapped pricing system has no price version
+        """
+
+        version = getattr(self.pricing_system, "price_version", None)
+        if version is None:
+            return None
+
+        if self._next_expiration is not None:
+            now = self.clock()
+            if self._next_expiration <= now:
+                self._expiries += 1
+                live = [expiration for _, expiration in self._cache.values() if expiration is not None and expiration > now]
+                self._next_expiration = min(live) if live else None
+        return (version, self._invalidations, self._expiries)
+
+    def stats(self):
+        """Returns the cache counters as a dict"""
+
+        return {
+            "size": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def __getattr__(self, name):
+        # Only called for missing attributes: pricing_system is missing while the object is unpickled
+        if name == "pricing_system":
+            raise AttributeError(name)
+        return getattr(self.pricing_system, name)
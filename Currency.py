@@ -6,6 +6,121 @@ from enum import Enum, unique
 
 @unique
 class Currency(Enum):
-    """Defines unique currencies that are available"""
+    """Defines unique currencies that are available
+
+    Each currency has an integer code (its definition order) used by compact encodings
+    (columnar stores, binary files). New currencies must be added at the end to keep the codes.
+    """
     Dollars = "Dollars"
     Euros = "Euros"
+
+    @property
+    def code(self):
+        """Integer code of the currency"""
+        return _CURRENCY_CODES[self]
+
+    @staticmethod
+    def from_code(code):
+        """Returns the currency of an integer code"""
+        return _CURRENCIES[code]
+
+    @property
+    def iso_code(self):
+        """ISO 4217 code of the currency"""
+        return ISO_CODES[self]
+
+    @property
+    def minor_units(self):
+        """Number of decimals of the currency minor unit (eg: 2 for cents)"""
+        return MINOR_UNITS[self]
+
+    @staticmethod
+    def from_iso(iso_code):
+        """Returns the currency of an ISO 4217 code
+
+        Raises:
+            ValueError: if no currency has this code
+        """
+
+        currency = _ISO_CURRENCIES.get(iso_code)
+        if currency is None:
+            raise ValueError(f"Unknown currency ISO code: {iso_code}")
+        return currency
+
+
+_CURRENCIES = list(Currency)
+_CURRENCY_CODES = {currency: code for code, currency in enumerate(_CURRENCIES)}
+
+# ISO 4217 code of each currency
+ISO_CODES = {Currency.Dollars: "USD", Currency.Euros: "EUR"}
+_ISO_CURRENCIES = {iso_code: currency for currency, iso_code in ISO_CODES.items()}
+
+# ISO 4217 minor unit decimals of each currency
+MINOR_UNITS = {Currency.Dollars: 2, Currency.Euros: 2}
+
+
+class CurrencyRegistry:
+    """Dense integer indices of a set of currencies, in registration order
+
+    Currencies are Currency members or the ISO codes of Currency members (ISO_CODES), which are registered as
+    the member itself. Other currencies are rejected: the position stores, the snapshots, the transaction log
+    and the loader encode currencies with the Currency codes, so a currency that is not a Currency member could
+    be converted but not held. New currencies are added to Currency, with their ISO code and minor units.
+
+    Usage example:
+
+        registry = CurrencyRegistry([Currency.Dollars, "EUR"])
+        print(registry.index(Currency.Euros), registry.indices(["EUR", "USD"]))
+    """
+
+    def __init__(self, currencies = ()):
+        self._currencies = []
+        self._index = {}
+        for currency in currencies:
+            self.register(currency)
+
+    @staticmethod
+    def _normalize(currency):
+        """Returns the Currency member of an ISO code, or the currency itself"""
+        return _ISO_CURRENCIES.get(currency, currency) if isinstance(currency, str) else currency
+
+    def register(self, currency):
+        """Adds a currency if not registered yet and returns its index
+
+        Raises:
+            ValueError: if the currency is not a Currency member or the ISO code of one
+        """
+
+        currency = self._normalize(currency)
+        if not isinstance(currency, Currency):
+            raise ValueError(f"Unknown currency: {currency}")
+        index = self._index.get(currency)
+        if index is None:
+            index = self._index[currency] = len(self._currencies)
+            self._currencies.append(currency)
+        return index
+
+    def index(self, currency):
+        """Returns the index of a registered currency
+
+        Raises:
+            KeyError: if the currency is not registered
+        """
+
+        return self._index[self._normalize(currency)]
+
+    def indices(self, currencies):
+        """Returns the list of indices of registered currencies"""
+        return [self.index(currency) for currency in currencies]
+
+    def __getitem__(self, index):
+        return self._currencies[index]
+
+    def __contains__(self, currency):
+        return self._normalize(currency) in self._index
+
+    def __len__(self):
+        return len(self._currencies)
+
+    def __iter__(self):
+        return iter(self._currencies)
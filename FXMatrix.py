@@ -0,0 +1,141 @@
+"""Compiled currency conversion rates for vectorized multi-currency valuation
+
+An FXMatrix keeps the conversion rates of a set of currencies as arrays, so whole arrays of values are
+converted with a single vectorized multiply instead of one pricing system call per value.
+
+Rates are triangulated through a pivot currency: the rate from currency i to currency j is
+rate(i -> pivot) * rate(pivot -> j). Rates from or to the pivot are the pricing system rates themselves,
+so valuing in the pivot currency gives the same results as converting value by value.
+
+Rates are requested on first use and kept: a conversion only requests the (currency, timestamp) rates
+of its values that are not in the output currency, and only in the direction it needs. Valuing in the
+pivot currency costs one call per distinct (currency, timestamp) pair not in the pivot currency, as the
+per value conversions would. matrix() requests the rates of every currency at a timestamp.
+
+Like CachingPricingSystem, the pricing system conversion is assumed to be proportional to the value.
+
+Usage example:
+
+    fx = FXMatrix(Asset.pricing_system, [Currency.Dollars, "EUR"], pivot = Currency.Euros)
+    print(fx.matrix())
+    values = fx.convert([100, 200, 300], [Currency.Dollars, "USD", Currency.Euros], Currency.Euros)
+"""
+
+import numpy as np
+from Currency import Currency, CurrencyRegistry
+
+
+class FXMatrix:
+    """Conversion rates between a set of currencies at a set of timestamps"""
+
+    def __init__(self, pricing_system, currencies, timestamps = (None,), pivot = Currency.Dollars):
+        """Create a matrix, with no rate requested yet
+
+        Args:
+            pricing_system: pricing system used to get the rates to and from the pivot currency
+            currencies: currencies (Currency members or their ISO 4217 codes, see CurrencyRegistry) to convert from and to
+            timestamps: timestamps of the rates, None for the current rates
+            pivot: currency through which the cross rates are triangulated
+
+        Raises:
+            ValueError: if a currency is not a Currency member or the ISO code of one
+        """
+
+        self.registry = CurrencyRegistry([pivot])
+        for currency in currencies:
+            self.registry.register(currency)
+        self.pivot = self.registry[0]
+
+        self.timestamps = list(dict.fromkeys(timestamps))
+        self._timestamp_rows = {timestamp: row for row, timestamp in enumerate(self.timestamps)}
+
+        # Rates of each currency (columns) to and from the pivot, at each timestamp (rows), NaN if not requested yet
+        self.pricing_system = pricing_system
+        self.to_pivot = np.full((len(self.timestamps), len(self.registry)), np.nan)
+        self.from_pivot = np.full((len(self.timestamps), len(self.registry)), np.nan)
+        self.to_pivot[:, 0] = 1.0
+        self.from_pivot[:, 0] = 1.0
+
+    def _request(self, rates, rows, columns):
+        """Requests the missing rates of rates (to_pivot or from_pivot) at (rows, columns) and returns them"""
+
+        missing = np.isnan(rates[rows, columns])
+        if missing.any():
+            for row, column in set(zip(rows[missing].tolist(), columns[missing].tolist())):
+                currency, timestamp = self.registry[column], self.timestamps[row]
+                if rates is self.to_pivot:
+                    rates[row, column] = self.pricing_system.convert_currency_value(1.0, currency, self.pivot, timestamp)
+                else:
+                    rates[row, column] = self.pricing_system.convert_currency_value(1.0, self.pivot, currency, timestamp)
+        return rates[rows, columns]
+
+    def _rows(self, timestamps, count):
+        """Rows of the timestamps, the first timestamp is used for every value if timestamps is None
+
+        Raises:
+            KeyError: if a timestamp is not in the matrix
+        """
+
+        if timestamps is None:
+            return np.zeros(count, dtype = np.intp)
+        return np.fromiter((self._timestamp_rows[timestamp] for timestamp in timestamps), dtype = np.intp, count = count)
+
+    def matrix(self, timestamp = None):
+        """Returns the dense rate matrix at a timestamp: matrix[i, j] converts currency i to currency j
+
+        Currencies are in the registry order (the pivot first).
+
+        Raises:
+            KeyError: if the timestamp is not in the matrix
+        """
+
+        rows = np.full(len(self.registry), self._timestamp_rows[timestamp], dtype = np.intp)
+        columns = np.arange(len(self.registry), dtype = np.intp)
+        matrix = np.outer(self._request(self.to_pivot, rows, columns), self._request(self.from_pivot, rows, columns))
+        np.fill_diagonal(matrix, 1.0)
+        return matrix
+
+    def rate(self, input_currency, output_currency, timestamp = None):
+        """Returns the rate that converts input_currency values to output_currency
+
+        Raises:
+            KeyError: if a currency or the timestamp is not in the matrix
+        """
+
+        input_index = self.registry.index(input_currency)
+        output_index = self.registry.index(output_currency)
+        if input_index == output_index:
+            return 1.0
+
+        rows = np.array([self._timestamp_rows[timestamp]], dtype = np.intp)
+        to_pivot = self._request(self.to_pivot, rows, np.array([input_index], dtype = np.intp))
+        from_pivot = self._request(self.from_pivot, rows, np.array([output_index], dtype = np.intp))
+        return float(to_pivot[0] * from_pivot[0])
+
+    def convert(self, values, input_currencies, output_currency, timestamps = None):
+        """Converts an array of values to output_currency
+
+        Args:
+            values: values, each one in its input currency
+            input_currencies: currency of each value
+            output_currency: currency of the returned values
+            timestamps: timestamp of each value rate, the first matrix timestamp for every value if None
+
+        Returns:
+            numpy array with the converted values
+
+        Raises:
+            KeyError: if a currency or a timestamp is not in the matrix
+        """
+
+        values = np.asarray(values, dtype = np.float64)
+        input_indices = np.asarray(self.registry.indices(input_currencies), dtype = np.intp)
+        output_index = self.registry.index(output_currency)
+        rows = self._rows(timestamps, len(values))
+
+        rates = np.ones(len(values))
+        converted = input_indices != output_index
+        rows = rows[converted]
+        rates[converted] = (self._request(self.to_pivot, rows, input_indices[converted]) *
+                            self._request(self.from_pivot, rows, np.full(len(rows), output_index, dtype = np.intp)))
+        return values * rates
@@ -0,0 +1,415 @@
+"""Exact fixed point money arithmetic with scaled int64 arrays
+
+Floats accumulate rounding drift in the weighted average unit prices (Asset.__add__ divides on every merge)
+and Decimal makes every operation several times slower. In the fixed point mode every number is a scaled
+integer, so sums are exact and every rounding is a single, explicit half up rounding:
+    - quantities: units of 10^-QUANTITY_DECIMALS
+    - money amounts (purchase costs, values): minor units of their currency (eg: cents, see Currency.minor_units)
+    - unit prices: units of 10^-PRICE_DECIMALS of their currency
+    - conversion rates: units of 10^-RATE_DECIMALS
+
+FixedPointPositionStore keeps the holding and the total purchase cost of each position instead of its unit price:
+a purchase adds its cost (converted to the position currency with a fixed point rate), a sale removes the
+cost of the sold quantity, rounded to the minor unit once. No unit price is ever divided and multiplied back,
+so costs do not drift over millions of merges. Valuations and conversions of whole arrays are vectorized
+int64 operations (see mul_div). Assets given to and returned by the store keep float holdings and prices.
+
+Costs are exact in the sense of a ledger, not of rational numbers: the cost relieved by a sale is an amount
+booked in minor units, as an accounting system posts it, so the cost of a position is exactly the sum of its
+booked amounts. It differs from the rational average cost by at most half a minor unit per sale, which is
+the rounding a cent book makes (benchmarks/bench_fixed_point.py reports both drifts). Quantities are never
+rounded: a quantity that is not a whole number of quantity units is rejected.
+
+Usage example:
+
+    portfolio = Portfolio(FixedPointPositionStore())
+    portfolio.transactions(transactions_list)
+    prices = portfolio.get_price_snapshot(Currency.Euros)
+    cents = portfolio.assets.current_value_minor(Currency.Euros, prices)
+"""
+
+import math
+import numpy as np
+from Currency import Currency
+from Asset import Asset, AssetType
+from PositionStore import ArrayPositionStore
+
+
+QUANTITY_DECIMALS = 4
+PRICE_DECIMALS = 6
+RATE_DECIMALS = 8
+
+QUANTITY_SCALE = 10 ** QUANTITY_DECIMALS
+PRICE_SCALE = 10 ** PRICE_DECIMALS
+RATE_SCALE = 10 ** RATE_DECIMALS
+
+# Largest divisor for which the int64 products of mul_div can not overflow (its square fits in an int64)
+_MAX_DIVISOR = 3 * 10 ** 9
+_MAX_INT64 = float(np.iinfo(np.int64).max)
+_MAX_PRODUCT = int(np.iinfo(np.int64).max)
+
+
+def to_units(values, decimals):
+    """Rounds float values (scalar or array) to integer units of 10^-decimals"""
+
+    if np.isscalar(values):
+        return int(round(values * 10 ** decimals))
+    return np.rint(np.asarray(values, dtype = np.float64) * 10 ** decimals).astype(np.int64)
+
+
+def exact_units(value, decimals):
+    """Returns a float value in integer units of 10^-decimals, the value must be a whole number of units
+
+    Only the float representation error (eg: 0.1 * 10^4 = 1000.0000000000001) is rounded away.
+
+    Raises:
+        ValueError: if the value is not a whole number of units of 10^-decimals
+    """
+
+    scaled = value * 10 ** decimals
+    units = round(scaled)
+    if abs(scaled - units) > 1e-6 + 1e-12 * abs(scaled):
+        raise ValueError(f"{value} is not a multiple of 10^-{decimals}")
+    return units
+
+
+def from_units(units, decimals):
+    """Converts integer units of 10^-decimals (scalar or array) to floats"""
+
+    if np.isscalar(units):
+        return units / 10 ** decimals
+    return np.asarray(units, dtype = np.float64) / 10 ** decimals
+
+
+def mul_div(a, b, d):
+    """Returns a * b / d rounded half up, for int64 arrays a and b (broadcast) and a positive integer d
+
+    When the largest product fits in an int64 it is computed directly. Otherwise the product is split as
+    a = q * d + r and b = bq * d + br, so that no intermediate product overflows when the result fits in
+    an int64: a * b / d = q * b + r * bq + r * br / d.
+
+    Raises:
+        OverflowError: if a result does not fit in an int64
+    """
+
+    a = np.asarray(a, dtype = np.int64)
+    b = np.asarray(b, dtype = np.int64)
+    bound = _max_abs(a) * _max_abs(b)
+    if bound <= _MAX_PRODUCT - d:
+        # Every product fits in an int64
+        return (a * b + d // 2) // d
+    if bound // d >= _MAX_PRODUCT // 2 and np.any(np.abs(a.astype(np.float64)) * np.abs(b.astype(np.float64)) / d >= _MAX_INT64 / 2):
+        raise OverflowError("Fixed point result does not fit in an int64")
+
+    if d > _MAX_DIVISOR:
+        a, b = np.broadcast_arrays(a, b)
+        return np.array([(x * y + d // 2) // d for x, y in zip(a.ravel().tolist(), b.ravel().tolist())],
+                        dtype = np.int64).reshape(a.shape)
+
+    q, r = np.divmod(a, d)
+    bq, br = np.divmod(b, d)
+    return q * b + r * bq + (r * br + d // 2) // d
+
+
+def _max_abs(array):
+    """Largest absolute value of an int64 array, as a Python int (0 if empty)"""
+
+    return max(abs(int(array.max())), abs(int(array.min()))) if array.size else 0
+
+
+def _scale_divisor(input_decimals, output_decimals, extra_decimals):
+    """Returns (multiplier, divisor) that rescale a product of units from input to output decimals"""
+
+    shift = input_decimals + extra_decimals - output_decimals
+    return (1, 10 ** shift) if shift >= 0 else (10 ** -shift, 1)
+
+
+def value_minor_units(quantity_units, price_units, currency):
+    """Returns quantity * price in minor units of the price currency (scalars or arrays)"""
+
+    multiplier, divisor = _scale_divisor(QUANTITY_DECIMALS + PRICE_DECIMALS, currency.minor_units, 0)
+    if np.isscalar(quantity_units) and np.isscalar(price_units):
+        return (quantity_units * price_units * multiplier + divisor // 2) // divisor
+    return mul_div(quantity_units, np.asarray(price_units, dtype = np.int64) * multiplier, divisor)
+
+
+# (multiplier, divisor) of the products quantity units * price units, to minor units of each currency
+_VALUE_SCALES = {currency: _scale_divisor(QUANTITY_DECIMALS + PRICE_DECIMALS, currency.minor_units, 0) for currency in Currency}
+
+
+def rate_units(input_currency, output_currency, timestamp = None):
+    """Returns the pricing system conversion rate from input_currency to output_currency, in rate units"""
+
+    if input_currency == output_currency:
+        return RATE_SCALE
+    return to_units(Asset.pricing_system.convert_currency_value(1.0, input_currency, output_currency, timestamp), RATE_DECIMALS)
+
+
+def convert_minor_units(amounts, rates, input_currency, output_currency):
+    """Converts amounts in minor units of input_currency (scalar or array) to minor units of output_currency
+
+    Args:
+        amounts: amounts in minor units
+        rates: conversion rates in rate units (see rate_units), one per amount or a single one
+    """
+
+    multiplier, divisor = _scale_divisor(input_currency.minor_units, output_currency.minor_units, RATE_DECIMALS)
+    if np.isscalar(amounts) and np.isscalar(rates):
+        return (amounts * rates * multiplier + divisor // 2) // divisor
+    return mul_div(amounts, np.asarray(rates, dtype = np.int64) * multiplier, divisor)
+
+
+class FixedPointPositionStore(ArrayPositionStore):
+    """Columnar position store with int64 holdings (quantity units) and purchase costs (minor units)
+
+    The purchase cost of a position is in the minor units of the position currency. Unit prices are derived
+    (cost / holding) when a position or an Asset is read. Updates use exact Python integers and are applied
+    one transaction at a time (exact is True, see Portfolio.batch_transactions). Quantities must be whole
+    numbers of quantity units: a transaction with a finer quantity is rejected (see check), never rounded.
+    """
+
+    exact = True
+
+    _COLUMNS = [("types", 0), ("currencies", 0), ("holdings", 0), ("costs", 0), ("timestamps", np.nan)]
+
+    def __init__(self, capacity = 1024):
+        """Create an empty store
+
+        Args:
+            capacity: initial number of rows allocated, the arrays grow by doubling
+        """
+
+        self._index = {}
+        self._ids = []
+        self.types = np.zeros(capacity, dtype = np.int8)
+        self.currencies = np.zeros(capacity, dtype = np.int8)
+        self.holdings = np.zeros(capacity, dtype = np.int64)
+        self.costs = np.zeros(capacity, dtype = np.int64)
+        self.timestamps = np.full(capacity, np.nan, dtype = np.float64)
+
+    @staticmethod
+    def _quantity_units(asset):
+        """Holding of an asset in quantity units
+
+        Raises:
+            ValueError: if the holding is not a whole number of quantity units
+        """
+
+        try:
+            return exact_units(asset.holding, QUANTITY_DECIMALS)
+        except ValueError:
+            raise ValueError(f"Quantity {asset.holding} of {asset.id} is not a multiple of 10^-{QUANTITY_DECIMALS}") from None
+
+    def check(self, input_asset, output_asset = None):
+        """Checks the quantities of a transaction can be held exactly, before any of its assets is applied
+
+        Raises:
+            ValueError: if a quantity is not a whole number of quantity units
+        """
+
+        self._quantity_units(input_asset)
+        if output_asset is not None:
+            self._quantity_units(output_asset)
+
+    @classmethod
+    def _cost(cls, asset, currency):
+        """Purchase cost of an asset in minor units of currency"""
+
+        multiplier, divisor = _VALUE_SCALES[asset.currency]
+        cost = (cls._quantity_units(asset) * round(asset.unit_price * PRICE_SCALE) * multiplier + divisor // 2) // divisor
+        if asset.currency != currency:
+            cost = convert_minor_units(cost, rate_units(asset.currency, currency, asset.timestamp), asset.currency, currency)
+        return cost
+
+    def _append(self, asset):
+        """Adds a new row for the asset and returns its row number"""
+
+        row = len(self._ids)
+        if row == len(self.holdings):
+            self._grow()
+
+        self._index[asset.id] = row
+        self._ids.append(asset.id)
+        self.types[row] = asset.type.code
+        self.currencies[row] = asset.currency.code
+        self.holdings[row] = self._quantity_units(asset)
+        self.costs[row] = self._cost(asset, asset.currency)
+        self.timestamps[row] = np.nan if asset.timestamp is None else asset.timestamp
+        return row
+
+    def add(self, asset):
+        """Adds the asset to the position with the same id (creates it if not present)
+
+        The asset purchase cost, converted to the position currency, is added to the position cost.
+
+        Raises:
+            ValueError: if the asset type does not match the position type
+        """
+
+        row = self._index.get(asset.id)
+        if row is None:
+            self._append(asset)
+            return
+
+        self._check_type(row, asset)
+        self.costs[row] = int(self.costs[row]) + self._cost(asset, Currency.from_code(self.currencies[row]))
+        self.holdings[row] = int(self.holdings[row]) + self._quantity_units(asset)
+        self.timestamps[row] = np.nan if asset.timestamp is None else asset.timestamp
+
+    def remove(self, asset):
+        """Substracts the asset holding from the position with the same id, and the cost of that quantity
+
+        Raises:
+            ValueError: if the asset type does not match the position type
+        """
+
+        row = self._index[asset.id]
+        self._check_type(row, asset)
+        holding = int(self.holdings[row])
+        cost = int(self.costs[row])
+        quantity = self._quantity_units(asset)
+        if holding > 0:
+            self.costs[row] = cost - (cost * quantity + holding // 2) // holding
+        self.holdings[row] = holding - quantity
+
+    def holding(self, asset_id):
+        """Returns the holding of an asset id, None if the asset is not in the store"""
+
+        row = self._index.get(asset_id)
+        return int(self.holdings[row]) / QUANTITY_SCALE if row is not None else None
+
+    def _unit_price(self, row):
+        """Average unit price of a row, as a float"""
+
+        holding = int(self.holdings[row])
+        if holding == 0:
+            return 0.0
+        currency = Currency.from_code(self.currencies[row])
+        return int(self.costs[row]) * 10 ** (QUANTITY_DECIMALS - currency.minor_units) / holding
+
+    def get_position(self, asset_id):
+        """Returns the (type, currency, holding, unit_price, timestamp) of a position, None if not present"""
+
+        row = self._index.get(asset_id)
+        if row is None:
+            return None
+        timestamp = float(self.timestamps[row])
+        return (AssetType.from_code(self.types[row]), Currency.from_code(self.currencies[row]),
+                from_units(int(self.holdings[row]), QUANTITY_DECIMALS), self._unit_price(row),
+                None if np.isnan(timestamp) else timestamp)
+
+    def set_position(self, asset_id, asset_type, currency, holding, unit_price, timestamp):
+        """Creates or replaces a position
+
+        The cost is rounded from holding * unit_price, so positions read with get_position are restored exactly.
+        """
+
+        row = self._index.get(asset_id)
+        if row is None:
+            row = self._append(Asset(asset_type, asset_id, 0, currency, 0, timestamp))
+
+        self.types[row] = asset_type.code
+        self.currencies[row] = currency.code
+        self.holdings[row] = exact_units(holding, QUANTITY_DECIMALS)
+        self.costs[row] = to_units(holding * unit_price, currency.minor_units)
+        self.timestamps[row] = np.nan if timestamp is None else timestamp
+
+    def price_units(self, prices):
+        """Converts a price snapshot to an int64 array of price units, in the keys() order
+
+        The array can be passed instead of the snapshot to value the positions several times.
+        """
+
+        size = len(self._ids)
+        return to_units(np.fromiter((prices[asset_id] for asset_id in self._ids), dtype = np.float64, count = size),
+                        PRICE_DECIMALS)
+
+    def current_value_minor(self, currency, prices):
+        """Gets the total value of the positions in minor units of the specified currency
+
+        Args:
+            currency: Currency object
+            prices: dict asset_id -> current unit price in that currency (a price snapshot),
+                    or its price units (see price_units)
+
+        Raises:
+            OverflowError: if the total does not fit in an int64
+        """
+
+        price_units = prices if isinstance(prices, np.ndarray) else self.price_units(prices)
+        values = value_minor_units(self.holdings[:len(self._ids)], price_units, currency)
+        if _max_abs(values) * len(values) > _MAX_PRODUCT and abs(float(values.astype(np.float64).sum())) >= _MAX_INT64 / 2:
+            raise OverflowError("Fixed point total does not fit in an int64")
+        return int(values.sum())
+
+    def current_value(self, currency, prices):
+        """Gets the total value of the positions in the specified currency (see current_value_minor)"""
+
+        return from_units(self.current_value_minor(currency, prices), currency.minor_units)
+
+    def purchase_costs_minor(self, currency, rates = None):
+        """Gets the purchase cost of each position in minor units of the specified currency, in the keys() order
+
+        As in Asset.purchase_value, the costs are converted at the purchase timestamp of the positions.
+
+        Args:
+            currency: Currency object
+            rates: dict Currency -> rate to currency in rate units, used for every position of that currency,
+                   if None the rate at the purchase timestamp of each position is requested with rate_units
+
+        Returns:
+            numpy int64 array
+        """
+
+        size = len(self._ids)
+        costs = self.costs[:size].copy()
+        for code in np.unique(self.currencies[:size]).tolist():
+            position_currency = Currency.from_code(code)
+            if position_currency == currency:
+                continue
+            rows = np.flatnonzero(self.currencies[:size] == code)
+            if rates is not None:
+                row_rates = rates[position_currency]
+            else:
+                # One request per purchase timestamp of the currency
+                timestamp_rates = {}
+                row_rates = np.empty(len(rows), dtype = np.int64)
+                for i, timestamp in enumerate(self.timestamps[rows].tolist()):
+                    timestamp = None if math.isnan(timestamp) else timestamp
+                    if timestamp not in timestamp_rates:
+                        timestamp_rates[timestamp] = rate_units(position_currency, currency, timestamp)
+                    row_rates[i] = timestamp_rates[timestamp]
+            costs[rows] = convert_minor_units(costs[rows], row_rates, position_currency, currency)
+        return costs
+
+    def profits_minor(self, currency, prices, rates = None):
+        """Gets the profit of each position in minor units of the specified currency, in the keys() order
+
+        Args:
+            currency: Currency object
+            prices: dict asset_id -> current unit price in that currency (a price snapshot),
+                    or its price units (see price_units)
+            rates: see purchase_costs_minor
+
+        Returns:
+            dict asset_id -> profit in minor units
+        """
+
+        size = len(self._ids)
+        price_units = prices if isinstance(prices, np.ndarray) else self.price_units(prices)
+        profits = value_minor_units(self.holdings[:size], price_units, currency) - self.purchase_costs_minor(currency, rates)
+        return dict(zip(self._ids, profits.tolist()))
+
+    def purchase_terms(self):
+        """Gets the holdings and purchase values (in their own currency) of the positions, in the keys() order
+
+        Returns:
+            (numpy array of holdings, numpy array of purchase values, list of currencies, list of purchase timestamps)
+        """
+
+        size = len(self._ids)
+        currencies = [Currency.from_code(code) for code in self.currencies[:size].tolist()]
+        minor_scales = np.array([10 ** currency.minor_units for currency in currencies], dtype = np.float64)
+        timestamps = [None if math.isnan(timestamp) else timestamp for timestamp in self.timestamps[:size].tolist()]
+        return (from_units(self.holdings[:size], QUANTITY_DECIMALS), self.costs[:size] / minor_scales if size else np.zeros(0),
+                currencies, timestamps)
@@ -0,0 +1,336 @@
+"""Tax lot accounting of the assets of a portfolio
+
+Every purchase of an asset opens a lot (quantity, unit price, timestamp). Every sale relieves lots
+according to a policy, and the difference between the sale proceeds and the cost of the relieved lots
+is the realized profit. The cost of the lots still open gives the unrealized profit.
+
+Available relief policies:
+    - FIFO: first purchased lots first (deque, amortized O(1) per sale)
+    - LIFO: last purchased lots first (deque, amortized O(1) per sale)
+    - HIFO: highest unit price lots first (heap, O(log n) per relieved lot)
+    - SPECIFIC: lots chosen by id on each sale (dict, O(1) per relieved lot), the ids can only be omitted
+      when the asset has a single open lot. They are given to Portfolio.transaction, or in the transactions
+      of Portfolio.transactions; batches have no lot ids, so they can only sell assets with a single open lot
+
+Lot costs are kept in the currency of the first lot of each asset (other currencies are converted with
+the pricing system at the purchase timestamp), like Asset.__add__ does.
+
+Usage example:
+
+    portfolio = Portfolio(lot_policy = "FIFO")
+    portfolio.transactions(transactions_list)
+    print(portfolio.get_realized_profit("BOND1", Currency.Euros))
+"""
+
+import heapq
+import itertools
+import collections
+from Asset import Asset
+
+
+# Relative tolerance used to consider a lot fully relieved, to absorb float rounding
+_TOLERANCE = 1e-9
+
+
+def _negligible(quantity, size):
+    """True if a quantity left to sell or left in a lot is float rounding, relative to the lot size"""
+    return quantity <= _TOLERANCE * size
+
+
+class Lot:
+    """An open purchase of an asset"""
+
+    __slots__ = ("lot_id", "quantity", "unit_price", "timestamp")
+
+    def __init__(self, lot_id, quantity, unit_price, timestamp = None):
+        self.lot_id = lot_id
+        self.quantity = quantity
+        self.unit_price = unit_price
+        self.timestamp = timestamp
+
+    def __repr__(self):
+        return f"Lot({self.lot_id!r}, {self.quantity}, {self.unit_price}, {self.timestamp})"
+
+
+class FIFOLotQueue:
+    """Relieves the oldest lots first"""
+
+    # True if the sales choose the lots they relieve, the only case where check can reject a sale
+    SELECTS_LOTS = False
+
+    def __init__(self):
+        self._lots = collections.deque()
+
+    def add(self, lot):
+        self._lots.append(lot)
+
+    def _next(self):
+        return self._lots[0]
+
+    def _pop(self):
+        return self._lots.popleft()
+
+    def check(self, quantity, lot_ids = None):
+        """Raises ValueError if the quantity can not be relieved (lot ids are not used by this policy)"""
+
+    def relieve(self, quantity, lot_ids = None):
+        """Relieves quantity from the lots
+
+        Returns:
+            list of (lot, relieved quantity)
+        """
+
+        relieved = []
+        while len(self._lots) > 0:
+            lot = self._next()
+            if _negligible(quantity, lot.quantity):
+                break
+            size = lot.quantity
+            taken = min(size, quantity)
+            relieved.append((lot, taken))
+            quantity -= taken
+            lot.quantity -= taken
+            if _negligible(lot.quantity, size):
+                self._pop()
+        return relieved
+
+    def lots(self):
+        """Returns the open lots"""
+        return list(self._lots)
+
+    def __len__(self):
+        return len(self._lots)
+
+
+class LIFOLotQueue(FIFOLotQueue):
+    """Relieves the newest lots first"""
+
+    def _next(self):
+        return self._lots[-1]
+
+    def _pop(self):
+        return self._lots.pop()
+
+
+class HIFOLotQueue(FIFOLotQueue):
+    """Relieves the lots with the highest unit price first"""
+
+    def __init__(self):
+        # Heap of (-unit_price, insertion order, lot)
+        self._lots = []
+        self._count = 0
+
+    def add(self, lot):
+        heapq.heappush(self._lots, (-lot.unit_price, self._count, lot))
+        self._count += 1
+
+    def _next(self):
+        return self._lots[0][2]
+
+    def _pop(self):
+        return heapq.heappop(self._lots)[2]
+
+    def lots(self):
+        return [lot for _, _, lot in self._lots]
+
+
+class SpecificLotQueue(FIFOLotQueue):
+    """Relieves the lots chosen by id on each sale"""
+
+    SELECTS_LOTS = True
+
+    def __init__(self):
+        self._lots = {}
+
+    def add(self, lot):
+        self._lots[lot.lot_id] = lot
+
+    def check(self, quantity, lot_ids = None):
+        """Raises ValueError if the lots are not given, not open or not enough for quantity"""
+
+        if lot_ids is None:
+            if len(self._lots) > 1:
+                raise ValueError("The lots to sell must be specified")
+            lot_ids = list(self._lots)
+        missing = [lot_id for lot_id in lot_ids if lot_id not in self._lots]
+        if missing:
+            raise ValueError(f"Unknown lots: {missing}")
+        available = sum(self._lots[lot_id].quantity for lot_id in set(lot_ids))
+        if available < quantity * (1 - _TOLERANCE):
+            raise ValueError("Not enough holding in the specified lots")
+
+    def relieve(self, quantity, lot_ids = None):
+        self.check(quantity, lot_ids)
+        if lot_ids is None:
+            lot_ids = list(self._lots)
+
+        relieved = []
+        for lot_id in lot_ids:
+            lot = self._lots.get(lot_id)
+            if lot is None:
+                continue
+            if _negligible(quantity, lot.quantity):
+                break
+            size = lot.quantity
+            taken = min(size, quantity)
+            relieved.append((lot, taken))
+            quantity -= taken
+            lot.quantity -= taken
+            if _negligible(lot.quantity, size):
+                del self._lots[lot_id]
+        return relieved
+
+    def lots(self):
+        return list(self._lots.values())
+
+
+# Lot queue class of each relief policy
+LOT_POLICIES = {
+    "FIFO": FIFOLotQueue,
+    "LIFO": LIFOLotQueue,
+    "HIFO": HIFOLotQueue,
+    "SPECIFIC": SpecificLotQueue,
+}
+
+
+class LotLedger:
+    """Open lots, cost basis and realized profit of each asset id"""
+
+    def __init__(self, policy = "FIFO"):
+        """Create an empty ledger
+
+        Raises:
+            ValueError: if the policy is not one of LOT_POLICIES
+        """
+
+        if policy not in LOT_POLICIES:
+            raise ValueError("Lot policy must be one of " + ", ".join(LOT_POLICIES))
+
+        self.policy = policy
+        self._queues = {}
+        self._currencies = {}
+        self._cost_basis = {}
+        self._realized = {}
+
+    def buy(self, asset, lot_id):
+        """Opens a lot with the holding and unit price of the asset"""
+
+        if asset.holding == 0:
+            return
+
+        currency = self._currencies.setdefault(asset.id, asset.currency)
+        unit_price = asset.unit_price
+        if asset.currency != currency:
+            unit_price = Asset.pricing_system.convert_currency_value(unit_price, asset.currency, currency, asset.timestamp)
+
+        queue = self._queues.get(asset.id)
+        if queue is None:
+            queue = self._queues[asset.id] = LOT_POLICIES[self.policy]()
+        queue.add(Lot(lot_id, asset.holding, unit_price, asset.timestamp))
+        self._cost_basis[asset.id] = self._cost_basis.get(asset.id, 0) + asset.holding * unit_price
+
+    def copy_lots(self, asset_id):
+        """Returns a new queue with copies of the open lots of the asset, None if the asset has no lots"""
+
+        queue = self._queues.get(asset_id)
+        if queue is None:
+            return None
+        copy = LOT_POLICIES[self.policy]()
+        for lot in queue.lots():
+            copy.add(Lot(lot.lot_id, lot.quantity, lot.unit_price, lot.timestamp))
+        return copy
+
+    def check_sell(self, asset_id, quantity, lot_ids = None):
+        """Raises ValueError if the sale can not be done with the policy (eg: unknown specific lots)"""
+
+        queue = self._queues.get(asset_id)
+        if queue is not None:
+            queue.check(quantity, lot_ids)
+
+    def sell(self, asset_id, quantity, proceeds, lot_ids = None):
+        """Relieves quantity from the lots of the asset
+
+        Args:
+            asset_id: asset id
+            quantity: quantity sold
+            proceeds: value received for the quantity, in the currency of the asset lots (see currency)
+            lot_ids: lots to relieve, in order (SPECIFIC policy only)
+
+        Returns:
+            the realized profit of the sale
+        """
+
+        queue = self._queues.get(asset_id)
+        if queue is None:
+            return 0
+
+        cost = sum(taken * lot.unit_price for lot, taken in queue.relieve(quantity, lot_ids))
+        self._cost_basis[asset_id] -= cost
+        if len(queue) == 0:
+            self._cost_basis[asset_id] = 0
+        profit = proceeds - cost
+        self._realized[asset_id] = self._realized.get(asset_id, 0) + profit
+        return profit
+
+    def currency(self, asset_id):
+        """Returns the currency of the lot costs of the asset, None if it has no lots"""
+        return self._currencies.get(asset_id)
+
+    def lots(self, asset_id):
+        """Returns the open lots of the asset"""
+
+        queue = self._queues.get(asset_id)
+        return queue.lots() if queue is not None else []
+
+    def cost_basis(self, asset_id):
+        """Returns the cost of the open lots of the asset, in the asset lot currency"""
+        return self._cost_basis.get(asset_id, 0)
+
+    def realized_profit(self, asset_id):
+        """Returns the realized profit of the asset, in the asset lot currency"""
+        return self._realized.get(asset_id, 0)
+
+
+class LotCheck:
+    """Checks the sales of a list of transactions against the lots of a ledger, without modifying it
+
+    The purchases and sales checked so far are applied to copies of the lots of the assets they touch,
+    made on first use. Only the policies whose sales choose their lots can reject a sale, so with the
+    other policies nothing is copied.
+    """
+
+    def __init__(self, ledger):
+        self._ledger = ledger
+        self._enabled = LOT_POLICIES[ledger.policy].SELECTS_LOTS
+        self._queues = {}
+        # The lots opened by the checked purchases get negative ids, that no transaction sequence can take
+        self._lot_ids = itertools.count(-1, -1)
+
+    def _queue(self, asset_id):
+        if asset_id not in self._queues:
+            self._queues[asset_id] = self._ledger.copy_lots(asset_id)
+        return self._queues[asset_id]
+
+    def check_sell(self, asset_id, quantity, lot_ids = None):
+        """Raises ValueError if the sale can not be done after the checked transactions"""
+
+        queue = self._queue(asset_id) if self._enabled else None
+        if queue is not None:
+            queue.check(quantity, lot_ids)
+
+    def sell(self, asset_id, quantity, lot_ids = None):
+        """Relieves a checked sale from the copied lots"""
+
+        queue = self._queue(asset_id) if self._enabled else None
+        if queue is not None:
+            queue.relieve(quantity, lot_ids)
+
+    def buy(self, asset):
+        """Opens a lot for a checked purchase in the copied lots"""
+
+        if not self._enabled or asset.holding == 0:
+            return
+        queue = self._queue(asset.id)
+        if queue is None:
+            queue = self._queues[asset.id] = LOT_POLICIES[self._ledger.policy]()
+        queue.add(Lot(next(self._lot_ids), asset.holding, asset.unit_price, asset.timestamp))
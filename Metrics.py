@@ -0,0 +1,234 @@
+"""Opt-in instrumentation of the valuation and replay hot paths
+
+The METRICS registry is disabled by default: instrumented code only checks METRICS.enabled, so the
+cost of the instrumentation is a single attribute lookup per instrumented call.
+Once enabled, it collects:
+    - call counts and latency histograms of the methods decorated with timed()
+    - pricing system call counts and latencies by method (InstrumentedPricingSystem)
+    - pricing cache hits and misses by method (CachingPricingSystem)
+    - replayed rows, to get the replay rows/sec
+
+Latencies are kept in fixed histograms (doubling buckets from 1 microsecond), so the memory used does
+not depend on the number of calls, and p50/p99 are estimated from the buckets.
+Metrics can be read as a dict (snapshot) or in the Prometheus text format (prometheus).
+
+Usage example:
+
+    METRICS.enabled = True
+    portfolio.transactions(transactions_list)
+    print(portfolio.get_current_value(Currency.Euros))
+    print(METRICS.snapshot())
+    print(METRICS.prometheus())
+"""
+
+import time
+import bisect
+import functools
+
+
+# Upper bounds in seconds of the latency histogram buckets, the last bucket (+Inf) takes the rest
+LATENCY_BUCKETS = tuple(1e-6 * 2 ** exponent for exponent in range(27))
+
+# Throughputs reported by the snapshot: name -> (rows counter, methods whose time is spent on the rows)
+THROUGHPUTS = {
+    "replay_rows_per_second": ("replay_rows_total", ["Portfolio.transactions", "Portfolio.batch_transactions"]),
+}
+
+
+class Histogram:
+    """Latency histogram with the LATENCY_BUCKETS buckets"""
+
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        """Adds a latency"""
+
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q):
+        """Returns an estimation of the q quantile (0 <= q <= 1), interpolated in its bucket, None if empty"""
+
+        if self.count == 0:
+            return None
+
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if count > 0 and cumulative + count >= rank:
+                lower = LATENCY_BUCKETS[index - 1] if index > 0 else 0.0
+                if index == len(LATENCY_BUCKETS):
+                    return lower
+                return lower + (LATENCY_BUCKETS[index] - lower) * max(rank - cumulative, 0) / count
+            cumulative += count
+        return LATENCY_BUCKETS[-1]
+
+
+def _key(name, labels):
+    """Registry key of a metric: (name, sorted label items)"""
+    return (name, tuple(sorted(labels.items())))
+
+
+def _format_key(key, extra_labels = ()):
+    """Prometheus name of a metric with its labels"""
+
+    name, labels = key
+    labels = list(labels) + list(extra_labels)
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{label}="{value}"' for label, value in labels) + "}"
+
+
+class Metrics:
+    """Registry of counters and latency histograms"""
+
+    def __init__(self, enabled = False):
+        self.enabled = enabled
+        self.counters = {}
+        self.histograms = {}
+
+    def reset(self):
+        """Removes every collected metric"""
+
+        self.counters.clear()
+        self.histograms.clear()
+
+    def count(self, name, value = 1, **labels):
+        """Adds value to a counter, if enabled"""
+
+        if self.enabled:
+            key = _key(name, labels)
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        """Adds a latency to a histogram, if enabled"""
+
+        if self.enabled:
+            key = _key(name, labels)
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def _method_time(self, method):
+        histogram = self.histograms.get(_key("call_seconds", {"method": method}))
+        return histogram.sum if histogram is not None else 0.0
+
+    def throughputs(self):
+        """Returns the THROUGHPUTS rates (rows/sec), None if no time was spent on the rows"""
+
+        rates = {}
+        for name, (counter, methods) in THROUGHPUTS.items():
+            seconds = sum(self._method_time(method) for method in methods)
+            rates[name] = self.counters.get(_key(counter, {}), 0) / seconds if seconds > 0 else None
+        return rates
+
+    def snapshot(self):
+        """Returns the metrics as a dict
+
+        Returns:
+            {"counters": {metric: value}, "histograms": {metric: {"count", "sum", "p50", "p99"}},
+             "throughputs": {name: rows/sec}}, metrics being named with their labels (Prometheus style)
+        """
+
+        return {
+            "counters": {_format_key(key): value for key, value in self.counters.items()},
+            "histograms": {_format_key(key): {"count": histogram.count, "sum": histogram.sum,
+                                              "p50": histogram.quantile(0.5), "p99": histogram.quantile(0.99)}
+                           for key, histogram in self.histograms.items()},
+            "throughputs": self.throughputs(),
+        }
+
+    def prometheus(self):
+        """Returns the metrics in the Prometheus text exposition format"""
+
+        lines = []
+        for name in sorted({key[0] for key in self.counters}):
+            lines.append(f"# TYPE {name} counter")
+            lines += [f"{_format_key(key)} {value}" for key, value in self.counters.items() if key[0] == name]
+
+        for name in sorted({key[0] for key in self.histograms}):
+            lines.append(f"# TYPE {name} histogram")
+            for key, histogram in self.histograms.items():
+                if key[0] != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(LATENCY_BUCKETS) + ["+Inf"], histogram.counts):
+                    cumulative += count
+                    bucket_key = (name + "_bucket", key[1])
+                    lines.append(f"{_format_key(bucket_key, [('le', bound if bound == '+Inf' else f'{bound:g}')])} {cumulative}")
+                lines.append(f"{_format_key((name + '_sum', key[1]))} {histogram.sum}")
+                lines.append(f"{_format_key((name + '_count', key[1]))} {histogram.count}")
+
+        for name, rate in self.throughputs().items():
+            if rate is not None:
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {rate}")
+
+        return "\n".join(lines) + "\n"
+
+
+# Registry used by the instrumented modules
+METRICS = Metrics()
+
+
+def timed(method):
+    """Decorator that records the calls and latency of a function in the call_seconds{method} histogram"""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return function(*args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                METRICS.observe("call_seconds", time.perf_counter() - start, method = method)
+        return wrapper
+    return decorator
+
+
+class InstrumentedPricingSystem:
+    """Pricing system decorator that records the calls and latency of each pricing system method
+
+    Calls are recorded in the pricing_call_seconds{method} histogram of METRICS, if enabled.
+    While METRICS is disabled, methods are the wrapped pricing system bound methods. Once enabled,
+    the timing wrapper of a method is built on its first access and kept in the instance.
+    """
+
+    def __init__(self, pricing_system):
+        self.pricing_system = pricing_system
+
+    def __getattr__(self, name):
+        # Only called for missing attributes: pricing_system is missing while the object is unpickled
+        if name == "pricing_system":
+            raise AttributeError(name)
+        attribute = getattr(self.pricing_system, name)
+        if not callable(attribute) or not METRICS.enabled:
+            return attribute
+
+        @functools.wraps(attribute)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return attribute(*args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                return attribute(*args, **kwargs)
+            finally:
+                METRICS.observe("pricing_call_seconds", time.perf_counter() - start, method = name)
+
+        self.__dict__[name] = wrapper
+        return wrapper
+
+    def __getstate__(self):
+        """Pickles the wrapped pricing system only, the cached wrappers are rebuilt on use"""
+        return {"pricing_system": self.pricing_system}
@@ -4,11 +4,15 @@ Defines a system to convert currencies and to get sell/buy prices of assets
 """
 
 
+import time
 from Currency import Currency
 
 class MockPricingSystem():
     """This is just a Mock Class of the pricing system"""
 
+    # The mock prices and rates never change
+    price_version = 0
+
     def convert_currency_value(self, value, input_currency, output_currency, timestamp = None):
         """ Returns the value in input currency converted as output currency according to the timestamp
             The value returned is the value in output currency that has the same acquisition capacity
@@ -31,3 +35,32 @@ class MockPricingSystem():
         
         return 4.5 if currency == Currency.Euros else 5.2
 
+
+
+class LatencyMockPricingSystem(MockPricingSystem):
+    """Mock pricing system that waits before answering each request, to simulate a remote pricing service
+
+    The latency is a number of seconds or a function returning it (eg: random.Random(seed).expovariate).
+    """
+
+    def __init__(self, latency = 0.001):
+        self.latency = latency
+        self.requests = 0
+
+    def _wait(self):
+        self.requests += 1
+        latency = self.latency() if callable(self.latency) else self.latency
+        if latency > 0:
+            time.sleep(latency)
+
+    def convert_currency_value(self, value, input_currency, output_currency, timestamp = None):
+        """Returns the mock conversion after the latency"""
+
+        self._wait()
+        return super(LatencyMockPricingSystem, self).convert_currency_value(value, input_currency, output_currency, timestamp)
+
+    def get_asset_sell_price(self, asset_id, currency, timestamp = None):
+        """Returns the mock sell price after the latency"""
+
+        self._wait()
+        return super(LatencyMockPricingSystem, self).get_asset_sell_price(asset_id, currency, timestamp)
@@ -1,7 +1,25 @@
 """Defines a Portfolio class as a collection of Assets."""
 
+import math
+import numpy as np
 from Currency import Currency
-from Asset import BondAsset, StockAsset, CashAsset, AssetType, Asset
+from Asset import BondAsset, StockAsset, CashAsset, AssetType, Asset, ASSET_CLASSES
+from PositionStore import DictPositionStore
+from TransactionBatch import TransactionBatch, TransactionError, replay_legs
+from TransactionValidation import ATOMIC, POLICIES, ValidationError, validate_transactions
+from PricingSystem import get_price_snapshot, get_price_matrix
+from AsyncPricingSystem import RequestPolicy, as_async_pricing_system
+import PortfolioSnapshot
+from PositionHistory import PositionHistory
+from LotLedger import LotLedger
+from FXMatrix import FXMatrix
+from Metrics import METRICS, timed
+from ValuationCache import ValuationCache
+
+
+# Seconds between the timestamps of a value series for each frequency name
+SERIES_FREQUENCIES = {"H": 3600, "D": 86400, "W": 7 * 86400}
+
 
 class Portfolio:
     """
@@ -9,10 +27,35 @@ class Portfolio:
     A transaction is defined as an asset coming in the portfolio and an asset coming out. 
     Initial investments are defined as a transaction with only an input asset.
 
+    The assets are kept in a position store (see PositionStore), by default a dict of Asset objects.
+    The portfolio counts the transactions applied (sequence), so that its state can be saved in a snapshot
+    and restored later, replaying only the transactions after the snapshot.
+
+    Valuations without an explicit price snapshot are memoized (see ValuationCache): the positions must only
+    be changed through the transaction methods, that mark the asset ids they touch and notify them to the
+    subscribed listeners.
     """
 
-    def __init__(self):
-        self.assets = {}
+    def __init__(self, position_store = None, track_history = False, lot_policy = None):
+        """Create an empty portfolio
+
+        Args:
+            position_store: empty store that keeps the portfolio positions,
+                            DictPositionStore if None (use ArrayPositionStore for large books)
+            track_history: keep a time indexed history of the positions (PositionHistory) to value
+                           the portfolio at past dates (value_as_of, profit_as_of)
+            lot_policy: if not None, track tax lots (LotLedger) relieved with this policy
+                        (FIFO, LIFO, HIFO or SPECIFIC) to split realized and unrealized profits
+        """
+
+        self.assets = position_store if position_store is not None else DictPositionStore()
+        self.sequence = 0
+        # History file offset saved in the snapshot the portfolio was restored from (see load_snapshot)
+        self.snapshot_offset = None
+        self.history = PositionHistory() if track_history else None
+        self.lots = LotLedger(lot_policy) if lot_policy is not None else None
+        self.valuations = ValuationCache()
+        self._listeners = []
 
 
     def _add(self, input_asset):
@@ -20,10 +63,7 @@ class Portfolio:
     
         # If the asset is allready in the portfilio, add it the exixting one
         # else, add it to the porfolio
-        if input_asset.id in self.assets:
-            self.assets[input_asset.id] += input_asset
-        else:
-            self.assets[input_asset.id] = input_asset
+        self.assets.add(input_asset)
 
     
     def _remove(self, output_asset):
@@ -36,60 +76,479 @@ class Portfolio:
         
         if output_asset == None or output_asset.holding == 0:
             return
-        if (output_asset.id not in self.assets) or (self.assets[output_asset.id].holding < output_asset.holding):
+        holding = self.assets.holding(output_asset.id)
+        if (holding is None) or (holding < output_asset.holding):
             raise ValueError("No short potitions are allowed")
 
-        self.assets[output_asset.id] -= output_asset
+        self.assets.remove(output_asset)
         return
 
+    @timed("Portfolio.transactions")
     def transactions(self, transaction_list):
         """Adds a list of transactions to the portfolio
-        Each transaction in the list is a tuple (input_asset, output_asset)
+        Each transaction in the list is a tuple (input_asset, output_asset), or (input_asset, output_asset, lot_ids)
+        to choose the lots relieved by the output asset with the SPECIFIC lot policy (see transaction)
 
         """
 
+        sequence = self.sequence
         for transaction in transaction_list:
-            self.transaction(transaction[0], transaction[1])
+            self.transaction(*transaction)
+        METRICS.count("replay_rows_total", self.sequence - sequence)
+        return
+
+    @timed("Portfolio.batch_transactions")
+    def batch_transactions(self, batch):
+        """Adds a TransactionBatch to the portfolio in one vectorized pass
+
+        Gives the same positions as transactions() on the same tuples, but the batch is applied
+        atomically: if a transaction is rejected the portfolio is left unchanged.
+
+        Raises:
+            TransactionError (ValueError): with the row of the first rejected transaction
+                                           (no short positions are allowed, and the rules of the portfolio
+                                           history, lots and position store, see TransactionValidation)
+        """
+
+        positions = replay_legs(batch.legs(), self.assets)
+
+        # The history, the lots and exact stores need each transaction, so the batch is applied one by one,
+        # once their rules are checked for every row
+        if self.history is not None or self.lots is not None or self.assets.exact:
+            # Positions keep their type, so the output assets have the type of their final position
+            types = {position[0]: position[1] for position in positions}
+            transaction_list = [self._batch_row(batch, row, types) for row in range(len(batch))]
+            violations = validate_transactions(transaction_list, self.assets, self.history, self.lots)[1]
+            if violations:
+                violation = violations[0]
+                raise TransactionError(f"{violation.message}: {violation.asset_id} (transaction {violation.row})", violation.row)
+            for transaction in transaction_list:
+                self.transaction(*transaction)
+            METRICS.count("replay_rows_total", len(batch))
+            return
+
+        for position in positions:
+            self.assets.set_position(*position)
+        self.notify_changed([position[0] for position in positions])
+        self.sequence += len(batch)
+        METRICS.count("replay_rows_total", len(batch))
         return
 
-    def transaction(self, input_asset, output_asset = None):
+    @timed("Portfolio.validated_transactions")
+    def validated_transactions(self, transaction_list, policy = ATOMIC):
+        """Validates a list of transactions in one pass, then applies it (see TransactionValidation)
+
+        The valid transactions are applied as a single TransactionBatch. With the SKIP policy, the skipped
+        transactions still count in the portfolio sequence, so the sequence stays the number of transactions
+        of the history consumed (see load_snapshot).
+
+        Args:
+            transaction_list: iterable of (input_asset, output_asset) transactions
+            policy: ATOMIC (apply the list only if it has no violation) or SKIP (skip the rejected transactions)
+
+        Returns:
+            list of Violation of the skipped transactions (empty with the ATOMIC policy)
+
+        Raises:
+            ValidationError (ValueError): with the ATOMIC policy, if a transaction is rejected,
+                                          with every violation. The portfolio is left unchanged
+            ValueError: if the policy is not valid
+        """
+
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown validation policy {policy}")
+
+        transaction_list = list(transaction_list)
+        valid_rows, violations = validate_transactions(transaction_list, self.assets, self.history, self.lots)
+        if violations and policy == ATOMIC:
+            raise ValidationError(violations)
+
+        if valid_rows:
+            self.batch_transactions(TransactionBatch.from_transactions(transaction_list[row] for row in valid_rows))
+        self.sequence += len(violations)
+        return violations
+
+    def subscribe(self, listener):
+        """Registers a function called with the list of asset ids touched by each transaction or batch"""
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        """Removes a listener registered with subscribe"""
+        self._listeners.remove(listener)
+
+    def notify_changed(self, asset_ids):
+        """Invalidates the memoized valuations of the asset ids and notifies the listeners
+
+        Called by the transaction methods. Code that updates the positions through the position store
+        directly (eg: ShardedReplayer) must call it with the asset ids it updated.
+        """
+
+        self.valuations.touch(asset_ids)
+        for listener in self._listeners:
+            listener(asset_ids)
+
+    def _batch_row(self, batch, row, types):
+        """Builds the (input_asset, output_asset) transaction of a batch row, types maps asset ids to their type"""
+
+        timestamp = float(batch.input_timestamps[row])
+        input_asset = ASSET_CLASSES[batch.input_types[row]](batch.input_ids[row], float(batch.input_holdings[row]),
+                                                            batch.input_currencies[row], float(batch.input_unit_prices[row]),
+                                                            None if math.isnan(timestamp) else timestamp)
+        output_asset = None
+        if batch.output_ids[row] is not None and batch.output_holdings[row] != 0:
+            output_asset = Asset(types[batch.output_ids[row]], batch.output_ids[row], float(batch.output_holdings[row]))
+        return input_asset, output_asset
+
+    def transaction(self, input_asset, output_asset = None, lot_ids = None):
         """Adds and removes an asset in a transaction
         
         ouput_asset can be None, representing an investment
 
+        When lots are tracked, the input asset opens a lot (with the transaction sequence number as id)
+        and the output asset relieves lots (lot_ids selects them with the SPECIFIC policy).
+        The sale proceeds are the input asset purchase value.
+
         Raises:
             ValueError: if output_asset to be removed is greater than portfolio holding
                         (no short positions are allowed)
         """
 
+        if self.history is not None:
+            timestamp = self.history.transaction_timestamp(input_asset.timestamp)
+        sold = output_asset is not None and output_asset.holding != 0
+        if self.lots is not None and sold:
+            self.lots.check_sell(output_asset.id, output_asset.holding, lot_ids)
+        if self.assets.exact:
+            self.assets.check(input_asset, output_asset)
+
+        # A rejected output leaves the portfolio unchanged, a rejected input leaves the output removed
         self._remove(output_asset)
-        self._add(input_asset)
+        try:
+            self._add(input_asset)
+        except Exception:
+            if sold and (self.valuations or self._listeners):
+                self.notify_changed([output_asset.id])
+            raise
+        if self.valuations or self._listeners:
+            self.notify_changed([input_asset.id] if output_asset is None else [input_asset.id, output_asset.id])
+
+        if self.lots is not None:
+            if sold:
+                proceeds = input_asset.purchase_value(self.lots.currency(output_asset.id) or input_asset.currency)
+                self.lots.sell(output_asset.id, output_asset.holding, proceeds, lot_ids)
+            self.lots.buy(input_asset, self.sequence)
+
+        self.sequence += 1
+
+        if self.history is not None:
+            if output_asset is not None and output_asset.holding != 0:
+                self.history.record(timestamp, output_asset.id, self.assets.get_position(output_asset.id))
+            self.history.record(timestamp, input_asset.id, self.assets.get_position(input_asset.id))
         return
 
+    def save_snapshot(self, path, offset = None):
+        """Saves the positions and the number of applied transactions in a binary snapshot file
+
+        Args:
+            path: snapshot file path
+            offset: byte offset of the record after the last applied transaction in the transaction history file
+                    (TransactionLoader.LoaderStats.offset), None if not known
+        """
+
+        positions = [(asset_id,) + self.assets.get_position(asset_id) for asset_id in self.get_asset_ids()]
+        PortfolioSnapshot.write_snapshot(path, self.sequence, positions, offset)
+
+    @classmethod
+    def load_snapshot(cls, path, position_store = None):
+        """Restores a portfolio saved with save_snapshot
+
+        The transactions after the snapshot are the ones after the first portfolio.sequence transactions
+        of the history. If the snapshot was saved with a history file offset, it is kept in the restored
+        portfolio snapshot_offset and the history is read from there, otherwise the applied transactions
+        are skipped (eg: TransactionLoader.load_transactions(path, skip = portfolio.sequence,
+        offset = portfolio.snapshot_offset)).
+
+        Args:
+            path: snapshot file path
+            position_store: empty store for the restored positions, DictPositionStore if None
+
+        Raises:
+            ValueError: if the file is not a valid snapshot
+        """
+
+        sequence, positions, offset = PortfolioSnapshot.read_snapshot(path)
+        portfolio = cls(position_store)
+        for position in positions:
+            portfolio.assets.set_position(*position)
+        portfolio.sequence = sequence
+        portfolio.snapshot_offset = offset
+        return portfolio
+
     def get_asset_ids(self):
         """Return all ids of the portfolio assets"""
 
         return self.assets.keys()
 
-    def get_current_value(self, currency):
-        """Get the total portfolio value in the specified currency"""
+    @timed("Portfolio.get_price_snapshot")
+    def get_price_snapshot(self, currency):
+        """Gets the current unit price of every portfolio asset in the specified currency
+
+        The prices are requested to the pricing system in a single batch call.
+        The returned dict (asset_id -> price) can be passed to the valuation methods to reuse it.
+        """
+
+        return get_price_snapshot(Asset.pricing_system, self.get_asset_ids(), currency)
+
+    @timed("Portfolio.get_current_value")
+    def get_current_value(self, currency, prices = None):
+        """Get the total portfolio value in the specified currency
+
+        prices is a price snapshot (see get_price_snapshot). If None, the memoized valuation of the current
+        price version is used (only the assets changed since the last call are re-valued), or a new
+        snapshot is requested if the pricing system has no price version.
+        """
+
+        if prices is None:
+            value = self.valuations.current_value(self, currency, Asset.pricing_system)
+            if value is not None:
+                return value
+            prices = self.get_price_snapshot(currency)
+
+        return self.assets.current_value(currency, prices)
+    
+    def get_asset_profit(self, asset_id, currency, prices = None):
+        """Gets the profit of a specifief asset id int the specified currency
+
+        prices is a price snapshot (see get_price_snapshot). If None, the memoized valuation is used as in
+        get_current_value, or the asset price is requested if the pricing system has no price version.
+        """
+
+        if asset_id not in self.assets:
+            return None
+
+        if prices is None:
+            profit = self.valuations.asset_profit(self, asset_id, currency, Asset.pricing_system)
+            if profit is not None:
+                return profit
+
+        current_unit_price = prices[asset_id] if prices is not None else None
+        return self.assets[asset_id].profit(currency, current_unit_price)
+
+    @timed("Portfolio.get_fx_matrix")
+    def get_fx_matrix(self, currency):
+        """Gets the conversion rates from the currency of every portfolio asset to the specified currency,
+        at every purchase timestamp (see FXMatrix)
+
+        The specified currency is the pivot, so the rates are the pricing system rates. Rates are requested
+        on first use, only for the (currency, timestamp) pairs of the positions not in the specified currency.
+        The returned FXMatrix can be passed to get_asset_profits to reuse it.
+        """
 
+        _, _, currencies, timestamps = self.assets.purchase_terms()
+        return FXMatrix(Asset.pricing_system, currencies, timestamps, pivot = currency)
+
+    @timed("Portfolio.get_asset_profits")
+    def get_asset_profits(self, currency, prices = None, fx = None):
+        """Gets the profit of every asset in the specified currency, as a dict asset_id -> profit
+
+        The purchase values are converted with one vectorized multiply.
+
+        Args:
+            currency: Currency object
+            prices: price snapshot (see get_price_snapshot), if None a new one is requested
+            fx: FXMatrix of the portfolio (see get_fx_matrix), if None a new one is built
+        """
+
+        if prices is None:
+            prices = self.get_price_snapshot(currency)
+        if fx is None:
+            fx = self.get_fx_matrix(currency)
+
+        asset_ids = list(self.get_asset_ids())
+        holdings, values, currencies, timestamps = self.assets.purchase_terms()
+        purchase_values = fx.convert(values, currencies, currency, timestamps)
+        unit_prices = np.fromiter((prices[asset_id] for asset_id in asset_ids), dtype = np.float64, count = len(asset_ids))
+        return dict(zip(asset_ids, (holdings * unit_prices - purchase_values).tolist()))
+
+    @timed("Portfolio.value_as_of")
+    def value_as_of(self, timestamp, currency):
+        """Get the portfolio value at a past timestamp in the specified currency
+
+        Uses the holdings after the transactions up to timestamp and the prices at timestamp.
+
+        Raises:
+            ValueError: if the portfolio does not track its history
+        """
+
+        if self.history is None:
+            raise ValueError("The portfolio does not track its history")
+
+        holdings = {}
+        for asset_id in self.history.asset_ids():
+            position = self.history.position_as_of(asset_id, timestamp)
+            if position is not None:
+                holdings[asset_id] = position[2]
+
+        prices = get_price_snapshot(Asset.pricing_system, holdings.keys(), currency, timestamp)
         value = 0
-        for asset_id, asset in self.assets.items():
-            value += asset.current_value(currency)
-        
+        for asset_id, holding in holdings.items():
+            value += holding * prices[asset_id]
+
         return value
-    
-    def get_asset_profit(self, asset_id, currency):
-        """Gets the profit of a specifief asset id int the specified currency"""
 
+    @timed("Portfolio.value_series")
+    def value_series(self, start, end, freq, currency):
+        """Get the portfolio value at regular timestamps between start and end (both included)
+
+        The holdings of every asset at every timestamp (binary searches on the history) are multiplied by
+        the matrix of prices of the assets at the timestamps, requested in a single batch.
+
+        Args:
+            start: first timestamp (seconds since epoch)
+            end: last timestamp (seconds since epoch)
+            freq: seconds between timestamps, or one of "H" (hour), "D" (day), "W" (week)
+            currency: Currency object
+
+        Returns:
+            (timestamps, values) NumPy arrays
+
+        Raises:
+            ValueError: if the portfolio does not track its history or freq is not valid
+        """
+
+        if self.history is None:
+            raise ValueError("The portfolio does not track its history")
+
+        step = SERIES_FREQUENCIES.get(freq, freq)
+        if isinstance(step, str) or step <= 0:
+            raise ValueError("freq must be a positive number of seconds or one of " + ", ".join(SERIES_FREQUENCIES))
+
+        timestamps = start + step * np.arange(int(math.floor((end - start) / step)) + 1 if end >= start else 0)
+
+        # Only the assets held at some timestamp of the range are priced
+        asset_ids = []
+        holdings = []
+        for asset_id in self.history.asset_ids():
+            asset_holdings = self.history.holdings_at(asset_id, timestamps)
+            if asset_holdings.any():
+                asset_ids.append(asset_id)
+                holdings.append(asset_holdings)
+
+        if not asset_ids:
+            return timestamps, np.zeros(len(timestamps))
+
+        prices = get_price_matrix(Asset.pricing_system, asset_ids, timestamps, currency)
+        return timestamps, np.einsum("ij,ij->j", np.vstack(holdings), prices)
+
+    def profit_as_of(self, asset_id, timestamp, currency):
+        """Gets the profit of an asset id at a past timestamp in the specified currency
+
+        Returns None if the asset was not in the portfolio at timestamp.
+
+        Raises:
+            ValueError: if the portfolio does not track its history
+        """
+
+        if self.history is None:
+            raise ValueError("The portfolio does not track its history")
+
+        position = self.history.position_as_of(asset_id, timestamp)
+        if position is None:
+            return None
+
+        asset_type, asset_currency, holding, unit_price, purchase_timestamp = position
+        asset = Asset(asset_type, asset_id, holding, asset_currency, unit_price, purchase_timestamp)
+        return asset.profit(currency, Asset.pricing_system.get_asset_sell_price(asset_id, currency, timestamp))
+
+    def _from_lot_currency(self, asset_id, profit, currency):
+        """Converts a profit in the lot currency of the asset to currency"""
+
+        lot_currency = self.lots.currency(asset_id)
+        if lot_currency is None or lot_currency == currency:
+            return profit
+        return Asset.pricing_system.convert_currency_value(profit, lot_currency, currency)
+
+    def get_realized_profit(self, asset_id, currency):
+        """Gets the profit realized by the sales of an asset id in the specified currency
+
+        Raises:
+            ValueError: if the portfolio does not track lots
+        """
+
+        if self.lots is None:
+            raise ValueError("The portfolio does not track lots")
+
+        return self._from_lot_currency(asset_id, self.lots.realized_profit(asset_id), currency)
+
+    def get_unrealized_profit(self, asset_id, currency, prices = None):
+        """Gets the profit of the open lots of an asset id in the specified currency
+
+        prices is a price snapshot (see get_price_snapshot), if None the asset price is requested.
+        Returns None if the asset is not in the portfolio.
+
+        Raises:
+            ValueError: if the portfolio does not track lots
+        """
+
+        if self.lots is None:
+            raise ValueError("The portfolio does not track lots")
         if asset_id not in self.assets:
             return None
-        
-        return self.assets[asset_id].profit(currency)
+
+        current_unit_price = prices[asset_id] if prices is not None else None
+        current_value = self.assets[asset_id].current_value(currency, current_unit_price)
+        return current_value - self._from_lot_currency(asset_id, self.lots.cost_basis(asset_id), currency)
+
+    async def get_current_value_async(self, currency, pricing_system = None, policy = None):
+        """Get the total portfolio value in the specified currency, requesting the prices concurrently
+
+        Args:
+            currency: Currency object
+            pricing_system: asynchronous pricing system, Asset.pricing_system (run in an executor) if None
+            policy: RequestPolicy with the concurrency limit, timeout and retries (default policy if None)
+        """
+
+        pricing_system = as_async_pricing_system(pricing_system if pricing_system is not None else Asset.pricing_system)
+        policy = policy if policy is not None else RequestPolicy()
+
+        assets = list(self.assets.values())
+        prices = await policy.gather([(pricing_system.get_asset_sell_price, (asset.id, currency)) for asset in assets])
+        value = 0
+        for asset, price in zip(assets, prices):
+            value += asset.current_value(currency, price)
+
+        return value
+
+    async def profits_async(self, currency, pricing_system = None, policy = None):
+        """Gets the profit of every asset in the specified currency, requesting prices and conversions concurrently
+
+        Args:
+            currency: Currency object
+            pricing_system: asynchronous pricing system, Asset.pricing_system (run in an executor) if None
+            policy: RequestPolicy with the concurrency limit, timeout and retries (default policy if None)
+
+        Returns:
+            dict asset_id -> profit
+        """
+
+        pricing_system = as_async_pricing_system(pricing_system if pricing_system is not None else Asset.pricing_system)
+        policy = policy if policy is not None else RequestPolicy()
+
+        # Price and purchase value conversion requests are all sent together
+        assets = list(self.assets.values())
+        requests = [(pricing_system.get_asset_sell_price, (asset.id, currency)) for asset in assets]
+        converted = [asset for asset in assets if asset.currency != currency]
+        requests += [(pricing_system.convert_currency_value, (asset.purchase_value(), asset.currency, currency, asset.timestamp))
+                     for asset in converted]
+        results = await policy.gather(requests)
+
+        purchase_values = {asset.id: asset.purchase_value() for asset in assets}
+        purchase_values.update(zip((asset.id for asset in converted), results[len(assets):]))
+        return {asset.id: asset.current_value(currency, price) - purchase_values[asset.id]
+                for asset, price in zip(assets, results[:len(assets)])}
 
     def __iter__(self):
-        return (asset for asset_id, asset in self.assets.items())
+        return iter(self.assets.values())
     
         
 if __name__ == "__main__":
@@ -111,8 +570,9 @@ if __name__ == "__main__":
     # Register transaction history of the portfolio
     portfolio.transactions(transactions_list)
 
-    # Get the current value and assets ot the portfolio
-    current_value = portfolio.get_current_value(currency)
+    # Get the current value and assets ot the portfolio, with a single price snapshot
+    prices = portfolio.get_price_snapshot(currency)
+    current_value = portfolio.get_current_value(currency, prices)
     
     # Print portfolio info, value and individual profits
     print("\r\n#########################################################\r\n")
@@ -121,8 +581,8 @@ if __name__ == "__main__":
         asset_id = asset.id
         asset_type = asset.type
         asset_holding = asset.holding
-        asset_profit = asset.profit(currency)
-        asset_value = asset.current_value(currency)
+        asset_profit = asset.profit(currency, prices[asset_id])
+        asset_value = asset.current_value(currency, prices[asset_id])
         print(f"   - Asset id: {asset_id}, Asset type: {asset_type.name}, Asset holding: {asset_holding}, ", end = "" )
         print(f"Current Value: {asset_value: .3f} {currency.name}, Asset profit: {asset_profit: .3f} {currency.name}")
 
@@ -0,0 +1,185 @@
+"""Firm level aggregation of many portfolios with a cross-book exposure index
+
+A PortfolioAggregate keeps an inverted index asset_id -> {portfolio_id: holding} over a set of portfolios,
+and the total holding of each asset id per asset currency. The index is updated incrementally, as a listener
+of each portfolio (see Portfolio.subscribe), with the asset ids touched by each transaction or batch.
+The totals are updated by holding deltas, and summed again from the holders (math.fsum) once the deltas of
+an asset reach its number of holders, so they do not drift and an update stays O(1) amortized.
+
+Firm wide exposures, top N concentrations and per currency totals are computed in one pass over the
+distinct asset ids, with a single price snapshot: every distinct asset is priced once, whatever the
+number of portfolios holding it.
+
+Usage example:
+
+    aggregate = PortfolioAggregate({"client1": portfolio1, "client2": portfolio2})
+    portfolio1.transaction(StockAsset("SA1", 10, Currency.Euros, 2), CashAsset("EU", 20))
+    prices = aggregate.get_price_snapshot(Currency.Euros)
+    print(aggregate.exposures(Currency.Euros, prices))
+    print(aggregate.top_concentrations(10, Currency.Euros, prices))
+"""
+
+import math
+import heapq
+import collections
+from Asset import Asset
+from PricingSystem import get_price_snapshot
+
+
+class PortfolioAggregate:
+    """Set of portfolios, indexed by the asset ids they hold"""
+
+    def __init__(self, portfolios = None):
+        """Create an aggregate
+
+        Args:
+            portfolios: dict portfolio_id -> Portfolio to add
+        """
+
+        self.portfolios = {}
+        self._listeners = {}
+        # asset_id -> {portfolio_id: (holding, currency)}
+        self._holders = {}
+        # asset_id -> {currency: total holding}
+        self._totals = {}
+        # asset_id -> number of deltas added to its totals since they were summed from the holders
+        self._deltas = {}
+
+        for portfolio_id, portfolio in (portfolios or {}).items():
+            self.add(portfolio_id, portfolio)
+
+    def add(self, portfolio_id, portfolio):
+        """Adds a portfolio, indexes its positions and tracks its transactions
+
+        Raises:
+            ValueError: if the portfolio id is already in the aggregate
+        """
+
+        if portfolio_id in self.portfolios:
+            raise ValueError(f"Portfolio {portfolio_id} is already in the aggregate")
+
+        self.portfolios[portfolio_id] = portfolio
+        self._update(portfolio_id, list(portfolio.get_asset_ids()))
+        listener = self._listeners[portfolio_id] = lambda asset_ids: self._update(portfolio_id, asset_ids)
+        portfolio.subscribe(listener)
+
+    def remove(self, portfolio_id):
+        """Removes a portfolio and its positions from the index
+
+        Raises:
+            KeyError: if the portfolio id is not in the aggregate
+        """
+
+        portfolio = self.portfolios[portfolio_id]
+        portfolio.unsubscribe(self._listeners.pop(portfolio_id))
+        for asset_id in list(portfolio.get_asset_ids()):
+            self._set_holding(portfolio_id, asset_id, None)
+        del self.portfolios[portfolio_id]
+
+    def _update(self, portfolio_id, asset_ids):
+        """Portfolio listener: re-indexes the positions of the touched asset ids"""
+
+        assets = self.portfolios[portfolio_id].assets
+        for asset_id in asset_ids:
+            position = assets.get_position(asset_id)
+            self._set_holding(portfolio_id, asset_id, (position[2], position[1]) if position is not None else None)
+
+    def _set_holding(self, portfolio_id, asset_id, entry):
+        """Replaces the (holding, currency) of an asset in a portfolio (None removes it) and updates the totals"""
+
+        holders = self._holders.setdefault(asset_id, {})
+        totals = self._totals.setdefault(asset_id, collections.Counter())
+
+        old_entry = holders.pop(portfolio_id, None)
+        if old_entry is not None:
+            totals[old_entry[1]] -= old_entry[0]
+        if entry is not None:
+            holders[portfolio_id] = entry
+            totals[entry[1]] += entry[0]
+
+        if not holders:
+            del self._holders[asset_id]
+            del self._totals[asset_id]
+            self._deltas.pop(asset_id, None)
+            return
+
+        deltas = self._deltas[asset_id] = self._deltas.get(asset_id, 0) + 1
+        if deltas >= len(holders):
+            self._totals[asset_id] = self._sum_holders(holders)
+            self._deltas[asset_id] = 0
+
+    @staticmethod
+    def _sum_holders(holders):
+        """Returns the total holding per currency of the holders of an asset, as a Counter"""
+
+        holdings = collections.defaultdict(list)
+        for holding, currency in holders.values():
+            holdings[currency].append(holding)
+        return collections.Counter({currency: math.fsum(values) for currency, values in holdings.items()})
+
+    def asset_ids(self):
+        """Returns the distinct asset ids held by the portfolios"""
+        return self._holders.keys()
+
+    def holders(self, asset_id):
+        """Returns the holdings of an asset: dict portfolio_id -> holding, empty if no portfolio holds it"""
+
+        return {portfolio_id: holding for portfolio_id, (holding, _) in self._holders.get(asset_id, {}).items()}
+
+    def holding(self, asset_id):
+        """Returns the firm wide holding of an asset"""
+
+        return sum(self._totals.get(asset_id, {}).values())
+
+    def get_price_snapshot(self, currency):
+        """Gets the current unit price of every distinct asset in the specified currency, in a single batch request"""
+
+        return get_price_snapshot(Asset.pricing_system, self.asset_ids(), currency)
+
+    def exposures(self, currency, prices = None):
+        """Gets the firm wide value of each asset
+
+        Args:
+            currency: valuation Currency
+            prices: price snapshot of the distinct assets (see get_price_snapshot), requested if None
+
+        Returns:
+            dict asset_id -> value in currency
+        """
+
+        if prices is None:
+            prices = self.get_price_snapshot(currency)
+        return {asset_id: sum(totals.values()) * prices[asset_id] for asset_id, totals in self._totals.items()}
+
+    def total_value(self, currency, prices = None):
+        """Gets the firm wide value of the portfolios in the specified currency"""
+
+        return sum(self.exposures(currency, prices).values())
+
+    def top_concentrations(self, n, currency, prices = None):
+        """Gets the n assets with the largest firm wide absolute values
+
+        Returns:
+            list of (asset_id, value, share of the firm wide value), largest first
+        """
+
+        exposures = self.exposures(currency, prices)
+        total = sum(exposures.values())
+        top = heapq.nlargest(n, exposures.items(), key = lambda item: abs(item[1]))
+        return [(asset_id, value, value / total if total else 0) for asset_id, value in top]
+
+    def currency_totals(self, currency, prices = None):
+        """Gets the firm wide value of the positions in each asset currency
+
+        Returns:
+            dict Currency -> value of the positions in that currency, valued in currency
+        """
+
+        if prices is None:
+            prices = self.get_price_snapshot(currency)
+
+        values = collections.Counter()
+        for asset_id, totals in self._totals.items():
+            for asset_currency, holding in totals.items():
+                values[asset_currency] += holding * prices[asset_id]
+        return dict(values)
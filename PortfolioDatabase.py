@@ -0,0 +1,240 @@
+"""Persistent portfolios on a local SQLite database
+
+A PortfolioDatabase keeps the transaction history and the positions of any number of portfolios, identified
+by a portfolio id, so a portfolio is restored from its stored positions instead of replaying its whole history.
+Writes are bulk executemany inserts, each write call in a single database transaction.
+
+Tables:
+    - portfolios: portfolio id and sequence (number of transactions applied to the stored positions)
+    - transactions: one row per transaction, numbered by sequence within its portfolio. Transactions
+      without timestamp take the timestamp of the previous one (or -inf) as effective timestamp,
+      like PositionHistory
+    - positions: one row per (portfolio id, asset id), as Portfolio.assets.get_position
+
+Indexes on (portfolio id, asset id, effective timestamp), for the input and the output asset of the transactions,
+on (portfolio id, effective timestamp) and on the position asset ids keep the queries (positions of an asset
+across all portfolios, holdings as of a date) inside SQLite, without loading the tables into Python.
+
+Usage example:
+
+    with PortfolioDatabase("portfolios.db") as database:
+        portfolio = database.load_portfolio("client1")
+        portfolio.transactions(new_transactions)
+        database.append_transactions("client1", new_transactions)
+        database.save_portfolio("client1", portfolio)
+        print(database.positions_for_asset("BOND1"))
+        print(database.holdings_as_of("client1", 1581634800))
+"""
+
+import sqlite3
+from Currency import Currency
+from Asset import AssetType, ASSET_CLASSES
+from Portfolio import Portfolio
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS portfolios (
+    portfolio_id TEXT PRIMARY KEY,
+    sequence INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    portfolio_id TEXT NOT NULL,
+    sequence INTEGER NOT NULL,
+    timestamp REAL,
+    effective_timestamp REAL NOT NULL,
+    input_id TEXT NOT NULL,
+    input_type TEXT NOT NULL,
+    input_currency TEXT NOT NULL,
+    input_quantity REAL NOT NULL,
+    input_unit_price REAL NOT NULL,
+    output_id TEXT,
+    output_type TEXT,
+    output_quantity REAL,
+    PRIMARY KEY (portfolio_id, sequence)
+);
+CREATE INDEX IF NOT EXISTS transactions_input ON transactions (portfolio_id, input_id, effective_timestamp);
+CREATE INDEX IF NOT EXISTS transactions_output ON transactions (portfolio_id, output_id, effective_timestamp);
+CREATE INDEX IF NOT EXISTS transactions_timestamp ON transactions (portfolio_id, effective_timestamp);
+CREATE TABLE IF NOT EXISTS positions (
+    portfolio_id TEXT NOT NULL,
+    asset_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    holding REAL NOT NULL,
+    unit_price REAL NOT NULL,
+    timestamp REAL,
+    PRIMARY KEY (portfolio_id, asset_id)
+);
+CREATE INDEX IF NOT EXISTS positions_asset ON positions (asset_id);
+"""
+
+_INSERT_TRANSACTION = "INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+_LAST_TRANSACTION = """
+SELECT sequence, effective_timestamp FROM transactions WHERE portfolio_id = ? ORDER BY sequence DESC LIMIT 1
+"""
+
+_SELECT_TRANSACTIONS = """
+SELECT timestamp, input_id, input_type, input_currency, input_quantity, input_unit_price, output_id, output_type, output_quantity
+FROM transactions WHERE portfolio_id = ? AND sequence >= ? ORDER BY sequence
+"""
+
+_POSITIONS_FOR_ASSET = """
+SELECT portfolio_id, type, currency, holding, unit_price, timestamp FROM positions WHERE asset_id = ?
+"""
+
+_HOLDINGS_AS_OF = """
+SELECT asset_id, SUM(quantity) FROM (
+    SELECT input_id AS asset_id, input_quantity AS quantity FROM transactions
+    WHERE portfolio_id = ? AND effective_timestamp <= ?
+    UNION ALL
+    SELECT output_id, -output_quantity FROM transactions
+    WHERE portfolio_id = ? AND effective_timestamp <= ? AND output_id IS NOT NULL
+) GROUP BY asset_id
+"""
+
+_HOLDING_AS_OF = """
+SELECT (SELECT TOTAL(input_quantity) FROM transactions
+        WHERE portfolio_id = ? AND input_id = ? AND effective_timestamp <= ?)
+     - (SELECT TOTAL(output_quantity) FROM transactions
+        WHERE portfolio_id = ? AND output_id = ? AND effective_timestamp <= ?)
+"""
+
+
+class PortfolioDatabase:
+    """Transaction histories and positions of portfolios, stored in a SQLite database"""
+
+    def __init__(self, path):
+        """Opens (or creates) a database
+
+        Args:
+            path: SQLite database file path (":memory:" for an in memory database)
+        """
+
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.executescript(_SCHEMA)
+
+    def close(self):
+        """Closes the database connection"""
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.close()
+
+    def portfolio_ids(self):
+        """Returns the ids of the portfolios with saved positions"""
+
+        return [row[0] for row in self.connection.execute("SELECT portfolio_id FROM portfolios ORDER BY portfolio_id")]
+
+    def transaction_count(self, portfolio_id):
+        """Returns the number of stored transactions of a portfolio"""
+
+        row = self.connection.execute(_LAST_TRANSACTION, (portfolio_id,)).fetchone()
+        return row[0] + 1 if row is not None else 0
+
+    def append_transactions(self, portfolio_id, transaction_list):
+        """Appends (input_asset, output_asset) transactions to the history of a portfolio
+
+        The transactions are inserted with a single executemany, in one database transaction.
+
+        Returns:
+            the number of transactions appended
+        """
+
+        row = self.connection.execute(_LAST_TRANSACTION, (portfolio_id,)).fetchone()
+        sequence, last_timestamp = (row[0] + 1, row[1]) if row is not None else (0, float("-inf"))
+
+        rows = []
+        for input_asset, output_asset in transaction_list:
+            if input_asset.timestamp is not None:
+                last_timestamp = input_asset.timestamp
+            rows.append((portfolio_id, sequence, input_asset.timestamp, last_timestamp,
+                         input_asset.id, input_asset.type.value, input_asset.currency.value,
+                         input_asset.holding, input_asset.unit_price,
+                         output_asset.id if output_asset is not None else None,
+                         output_asset.type.value if output_asset is not None else None,
+                         output_asset.holding if output_asset is not None else None))
+            sequence += 1
+
+        with self.connection:
+            self.connection.executemany(_INSERT_TRANSACTION, rows)
+        return len(rows)
+
+    def transactions(self, portfolio_id, start = 0):
+        """Yields the stored transactions of a portfolio from sequence start, as (input_asset, output_asset) tuples"""
+
+        for (timestamp, input_id, input_type, input_currency, input_quantity, input_unit_price,
+             output_id, output_type, output_quantity) in self.connection.execute(_SELECT_TRANSACTIONS, (portfolio_id, start)):
+            input_asset = ASSET_CLASSES[AssetType(input_type)](input_id, input_quantity, Currency(input_currency),
+                                                               input_unit_price, timestamp)
+            output_asset = None
+            if output_id is not None:
+                output_asset = ASSET_CLASSES[AssetType(output_type)](output_id, output_quantity)
+            yield (input_asset, output_asset)
+
+    def save_portfolio(self, portfolio_id, portfolio):
+        """Replaces the stored positions and sequence of a portfolio, in one database transaction"""
+
+        rows = [(portfolio_id, asset_id, asset_type.value, currency.value, holding, unit_price, timestamp)
+                for asset_id, (asset_type, currency, holding, unit_price, timestamp)
+                in ((asset_id, portfolio.assets.get_position(asset_id)) for asset_id in portfolio.get_asset_ids())]
+
+        with self.connection:
+            self.connection.execute("DELETE FROM positions WHERE portfolio_id = ?", (portfolio_id,))
+            self.connection.executemany("INSERT INTO positions VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self.connection.execute("INSERT OR REPLACE INTO portfolios VALUES (?, ?)", (portfolio_id, portfolio.sequence))
+
+    def load_portfolio(self, portfolio_id, position_store = None):
+        """Restores a portfolio from its stored positions, then applies the stored transactions after them
+
+        Unknown portfolio ids give an empty portfolio.
+
+        Args:
+            portfolio_id: id of the portfolio
+            position_store: empty store for the restored positions, DictPositionStore if None
+
+        Raises:
+            ValueError: if a stored transaction is rejected (see Portfolio.transaction)
+        """
+
+        portfolio = Portfolio(position_store)
+        row = self.connection.execute("SELECT sequence FROM portfolios WHERE portfolio_id = ?", (portfolio_id,)).fetchone()
+        if row is not None:
+            for asset_id, asset_type, currency, holding, unit_price, timestamp in self.connection.execute(
+                    "SELECT asset_id, type, currency, holding, unit_price, timestamp FROM positions WHERE portfolio_id = ?",
+                    (portfolio_id,)):
+                portfolio.assets.set_position(asset_id, AssetType(asset_type), Currency(currency), holding, unit_price, timestamp)
+            portfolio.sequence = row[0]
+
+        portfolio.transactions(self.transactions(portfolio_id, portfolio.sequence))
+        return portfolio
+
+    def positions_for_asset(self, asset_id):
+        """Returns the saved positions of an asset in every portfolio
+
+        Returns:
+            dict portfolio_id -> (type, currency, holding, unit_price, timestamp)
+        """
+
+        return {portfolio_id: (AssetType(asset_type), Currency(currency), holding, unit_price, timestamp)
+                for portfolio_id, asset_type, currency, holding, unit_price, timestamp
+                in self.connection.execute(_POSITIONS_FOR_ASSET, (asset_id,))}
+
+    def holdings_as_of(self, portfolio_id, timestamp):
+        """Returns the holdings of a portfolio after its stored transactions up to timestamp (included)
+
+        Returns:
+            dict asset_id -> holding, for the assets traded up to timestamp
+        """
+
+        return dict(self.connection.execute(_HOLDINGS_AS_OF, (portfolio_id, timestamp, portfolio_id, timestamp)))
+
+    def holding_as_of(self, portfolio_id, asset_id, timestamp):
+        """Returns the holding of an asset in a portfolio after its stored transactions up to timestamp (included)"""
+
+        return self.connection.execute(_HOLDING_AS_OF, (portfolio_id, asset_id, timestamp,
+                                                        portfolio_id, asset_id, timestamp)).fetchone()[0]
@@ -0,0 +1,144 @@
+"""Long lived portfolio_info daemon on a local Unix socket
+
+Every portfolio_info.py run pays the interpreter startup, the imports, the pricing system setup and a full
+replay of the history before printing anything. A PortfolioServer does that work once: it keeps the modules
+imported, a single warm pricing system cache, and the portfolios already replayed. portfolio_info.py --server
+becomes a thin client that sends its arguments and prints the reply.
+
+A loaded portfolio is reused while its history file keeps the same size and modification time, otherwise it
+is replayed again. Runs with --checkpoint or --database always load the portfolio, since they update their
+storage. Requests are handled one at a time, as they share the pricing system.
+
+Protocol: the client sends one JSON line with its parsed arguments (see portfolio_info.request_server) and the
+server replies one JSON object, {"output": info text, "log": skipped transactions report} or {"error": message}.
+
+Usage:
+    From the console, go to the directory where this file is located ($ROOT_DIR) and start the daemon
+
+        python PortfolioServer.py <socket_path>
+
+    then run the client
+
+        python portfolio_info.py transactions_example.json DOL --server <socket_path>
+
+Usage example:
+
+    server = PortfolioServer("/tmp/portfolio.sock")
+    threading.Thread(target = server.serve_forever).start()
+    ...
+    server.shutdown()
+    server.server_close()
+"""
+
+import io
+import os
+import sys
+import json
+import signal
+import argparse
+import collections
+import socketserver
+from Asset import Asset
+import TransactionLoader
+import portfolio_info
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Reads one JSON request line and writes the JSON reply"""
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            # Connection closed with no request (eg: a readiness check)
+            return
+        try:
+            fields = json.loads(line)
+            output, log = self.server.run(argparse.Namespace(**fields))
+            reply = {"output": output, "log": log}
+        except Exception as error:
+            reply = {"error": f"{type(error).__name__}: {error}"}
+        self.wfile.write(json.dumps(reply).encode("utf-8"))
+
+
+class PortfolioServer(socketserver.UnixStreamServer):
+    """Serves portfolio_info requests with warm pricing caches and loaded portfolios"""
+
+    def __init__(self, socket_path, max_portfolios = 1024):
+        """Binds the socket (a stale socket file is replaced) and sets up the pricing system
+
+        Args:
+            socket_path: Unix socket path
+            max_portfolios: number of loaded portfolios kept, the least recently used are dropped first
+        """
+
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        super(PortfolioServer, self).__init__(socket_path, _RequestHandler)
+        self.socket_path = socket_path
+        self.pricing_system = portfolio_info.create_pricing_system()
+        self.max_portfolios = max_portfolios
+        # history file path -> ((size, modification time, skip_invalid), Portfolio, skipped transactions report)
+        self._portfolios = collections.OrderedDict()
+
+    def _cached_portfolio(self, arguments, stats):
+        """Returns the loaded portfolio of a history file and its skipped transactions report,
+        replaying it if the file changed"""
+
+        status = os.stat(arguments.transaction_history_file)
+        signature = (status.st_size, status.st_mtime_ns, arguments.skip_invalid)
+        entry = self._portfolios.get(arguments.transaction_history_file)
+        if entry is not None and entry[0] == signature:
+            self._portfolios.move_to_end(arguments.transaction_history_file)
+            return entry[1], entry[2]
+
+        log = io.StringIO()
+        portfolio = portfolio_info.load_portfolio(arguments, stats, log)
+        self._portfolios[arguments.transaction_history_file] = (signature, portfolio, log.getvalue())
+        self._portfolios.move_to_end(arguments.transaction_history_file)
+        while len(self._portfolios) > self.max_portfolios:
+            self._portfolios.popitem(last = False)
+        return portfolio, log.getvalue()
+
+    def run(self, arguments):
+        """Builds the info of a portfolio_info request
+
+        Returns:
+            (info text, skipped transactions report), the report of a reused portfolio is the one of its load
+        """
+
+        Asset.pricing_system = self.pricing_system
+        stats = TransactionLoader.LoaderStats()
+        if arguments.checkpoint is not None or arguments.database is not None:
+            log = io.StringIO()
+            portfolio = portfolio_info.load_portfolio(arguments, stats, log)
+            log = log.getvalue()
+        else:
+            portfolio, log = self._cached_portfolio(arguments, stats)
+        stats.stop()
+        return portfolio_info.report(portfolio, arguments.currency, stats if arguments.stats else None), log
+
+    def server_close(self):
+        """Closes the socket and removes the socket file"""
+
+        super(PortfolioServer, self).server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+if __name__ == "__main__":
+
+    if len(sys.argv) < 2:
+        print("Error: Expecting 1 parameter ")
+        print(" - Usage: python PortfolioServer.py <socket_path>")
+        exit()
+
+    server = PortfolioServer(sys.argv[1])
+    # Stopping the daemon with SIGTERM also removes the socket file
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"Serving on {sys.argv[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
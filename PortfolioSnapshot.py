@@ -0,0 +1,98 @@
+"""Compact binary snapshots of a portfolio state
+
+A snapshot stores the positions of a portfolio (asset id, type, currency, holding, unit price and timestamp)
+and the sequence number of the last transaction applied, so that a portfolio can be restored and only
+the transactions after the checkpoint replayed. It can also store the byte offset of the next record in
+the transaction history file, so the replay seeks there instead of reading the records already applied.
+
+File layout (little endian):
+    - header: magic "PFSNAP", format version (uint16), sequence number (uint64), position count (uint32),
+      history file offset (int64, -1 if not known; not in version 1 files, which are still read)
+    - one record per position: id length (uint16), utf-8 id, type code (uint8), currency code (uint8),
+      holding, unit price and timestamp (float64, NaN if the timestamp is None)
+
+Type and currency codes are the AssetType and Currency codes.
+"""
+
+import os
+import math
+import struct
+from Currency import Currency
+from Asset import AssetType
+
+
+MAGIC = b"PFSNAP"
+VERSION = 2
+
+_HEADER = struct.Struct("<6sHQI")
+_OFFSET = struct.Struct("<q")
+_ID_LENGTH = struct.Struct("<H")
+_POSITION = struct.Struct("<BBddd")
+
+
+def write_snapshot(path, sequence, positions, offset = None):
+    """Writes a snapshot file, atomically replacing any previous one
+
+    Args:
+        path: snapshot file path
+        sequence: number of transactions applied to the portfolio
+        positions: list of (asset_id, type, currency, holding, unit_price, timestamp)
+        offset: byte offset of the next record in the transaction history file, None if not known
+    """
+
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(_HEADER.pack(MAGIC, VERSION, sequence, len(positions)))
+        file.write(_OFFSET.pack(offset if offset is not None else -1))
+        for asset_id, asset_type, currency, holding, unit_price, timestamp in positions:
+            encoded_id = asset_id.encode("utf-8")
+            file.write(_ID_LENGTH.pack(len(encoded_id)))
+            file.write(encoded_id)
+            file.write(_POSITION.pack(asset_type.code, currency.code, holding, unit_price,
+                                      math.nan if timestamp is None else timestamp))
+
+    os.replace(temporary_path, path)
+
+
+def read_snapshot(path):
+    """Reads a snapshot file
+
+    Returns:
+        (sequence, positions, offset) with positions as a list of (asset_id, type, currency, holding, unit_price, timestamp)
+        and offset the history file offset, None if not known
+
+    Raises:
+        ValueError: if the file is not a valid snapshot
+    """
+
+    with open(path, "rb") as file:
+        data = file.read()
+
+    if len(data) < _HEADER.size:
+        raise ValueError("Invalid portfolio snapshot")
+    magic, version, sequence, count = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version not in (1, VERSION):
+        raise ValueError("Invalid portfolio snapshot")
+
+    positions = []
+    offset = _HEADER.size
+    history_offset = None
+    try:
+        if version >= 2:
+            (history_offset,) = _OFFSET.unpack_from(data, offset)
+            offset += _OFFSET.size
+            if history_offset < 0:
+                history_offset = None
+        for _ in range(count):
+            (length,) = _ID_LENGTH.unpack_from(data, offset)
+            offset += _ID_LENGTH.size
+            asset_id = data[offset:offset + length].decode("utf-8")
+            offset += length
+            type_code, currency_code, holding, unit_price, timestamp = _POSITION.unpack_from(data, offset)
+            offset += _POSITION.size
+            positions.append((asset_id, AssetType.from_code(type_code), Currency.from_code(currency_code), holding, unit_price,
+                              None if math.isnan(timestamp) else timestamp))
+    except (struct.error, IndexError, UnicodeDecodeError):
+        raise ValueError("Invalid portfolio snapshot")
+
+    return sequence, positions, history_offset
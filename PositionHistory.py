@@ -0,0 +1,84 @@
+"""Time indexed history of the positions of a portfolio
+
+For each asset id, the history keeps a sorted list of the timestamps where its position changed,
+and the position (type, currency, holding, unit price, purchase timestamp) after each change.
+The position of an asset at any timestamp is found with a binary search, so historical queries
+do not replay the transactions.
+
+Transactions must be recorded in timestamp order. Transactions without timestamp take the timestamp of
+the previous one (or -inf for the first ones, meaning they happened before any dated transaction).
+"""
+
+import bisect
+import numpy as np
+
+
+class PositionHistory:
+    """Per asset sorted index of position changes"""
+
+    def __init__(self):
+        self._timestamps = {}
+        self._positions = {}
+        self.last_timestamp = float("-inf")
+
+    def transaction_timestamp(self, timestamp):
+        """Returns the timestamp used to record a transaction with the given timestamp
+
+        Raises:
+            ValueError: if timestamp is before the last recorded one
+        """
+
+        if timestamp is None:
+            return self.last_timestamp
+        if timestamp < self.last_timestamp:
+            raise ValueError("Transactions must be recorded in timestamp order")
+        return timestamp
+
+    def record(self, timestamp, asset_id, position):
+        """Records the position of an asset after a change at timestamp
+
+        Args:
+            timestamp: value returned by transaction_timestamp
+            asset_id: asset id
+            position: (type, currency, holding, unit_price, timestamp) tuple
+        """
+
+        timestamps = self._timestamps.setdefault(asset_id, [])
+        positions = self._positions.setdefault(asset_id, [])
+        if timestamps and timestamps[-1] == timestamp:
+            positions[-1] = position
+        else:
+            timestamps.append(timestamp)
+            positions.append(position)
+        self.last_timestamp = timestamp
+
+    def position_as_of(self, asset_id, timestamp):
+        """Returns the position of the asset after the changes up to timestamp (included), None if there was none"""
+
+        timestamps = self._timestamps.get(asset_id)
+        if not timestamps:
+            return None
+
+        index = bisect.bisect_right(timestamps, timestamp)
+        return self._positions[asset_id][index - 1] if index > 0 else None
+
+    def holdings_at(self, asset_id, timestamps):
+        """Returns the holdings of the asset at each of the sorted timestamps (NumPy array), in one binary search pass"""
+
+        timestamps = np.asarray(timestamps, dtype = np.float64)
+        changes = self._timestamps.get(asset_id)
+        if not changes:
+            return np.zeros(len(timestamps))
+
+        holdings = np.fromiter((position[2] for position in self._positions[asset_id]), dtype = np.float64, count = len(changes))
+        indexes = np.searchsorted(np.asarray(changes, dtype = np.float64), timestamps, side = "right") - 1
+        return np.where(indexes >= 0, holdings[np.maximum(indexes, 0)], 0.0)
+
+    def changes(self, asset_id):
+        """Returns the (timestamps, positions) lists of the changes of an asset"""
+
+        return self._timestamps.get(asset_id, []), self._positions.get(asset_id, [])
+
+    def asset_ids(self):
+        """Returns the ids of the assets with recorded changes"""
+        return self._timestamps.keys()
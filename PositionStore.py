@@ -0,0 +1,283 @@
+"""Position stores used by a Portfolio to keep its assets
+
+Two stores are available:
+    - DictPositionStore: a dict of Asset objects indexed by asset id (default).
+      Every update builds a new Asset through the Asset add/substract operators.
+    - ArrayPositionStore: a columnar store that keeps ids, types, currencies, holdings, unit prices
+      and timestamps in parallel NumPy arrays with an id -> row index. Updates are done in place,
+      with no Asset allocated per transaction, which suits portfolios with a large number of assets.
+
+Both stores behave as a read only mapping from asset id to Asset and share the same update interface
+(add, remove, holding, get_position, set_position, current_value, purchase_terms).
+
+Usage example:
+
+    portfolio = Portfolio(ArrayPositionStore())
+"""
+
+import math
+import numpy as np
+from Currency import Currency
+from Asset import Asset, AssetType, ASSET_CLASSES
+
+
+class DictPositionStore(dict):
+    """Keeps one Asset object per asset id"""
+
+    # True for stores whose positions must be updated one transaction at a time to stay exact
+    # (see FixedPoint): batches are then validated in one pass but applied transaction by transaction,
+    # and each transaction is first passed to the store check method
+    exact = False
+
+    def add(self, asset):
+        """Adds the asset to the position with the same id (creates it if not present)
+
+        Raises:
+            ValueError: if the asset type does not match the position type
+        """
+
+        if asset.id in self:
+            self[asset.id] += asset
+        else:
+            self[asset.id] = asset
+
+    def remove(self, asset):
+        """Substracts the asset holding from the position with the same id
+
+        Raises:
+            ValueError: if the asset type does not match the position type
+        """
+
+        self[asset.id] -= asset
+
+    def holding(self, asset_id):
+        """Returns the holding of an asset id, None if the asset is not in the store"""
+
+        asset = self.get(asset_id)
+        return asset.holding if asset is not None else None
+
+    def get_position(self, asset_id):
+        """Returns the (type, currency, holding, unit_price, timestamp) of a position, None if not present"""
+
+        asset = self.get(asset_id)
+        if asset is None:
+            return None
+        return (asset.type, asset.currency, asset.holding, asset.unit_price, asset.timestamp)
+
+    def set_position(self, asset_id, asset_type, currency, holding, unit_price, timestamp):
+        """Creates or replaces a position"""
+
+        self[asset_id] = ASSET_CLASSES[asset_type](asset_id, holding, currency, unit_price, timestamp)
+
+    def current_value(self, currency, prices):
+        """Gets the total value of the positions in the specified currency
+
+        Args:
+            currency: Currency object
+            prices: dict asset_id -> current unit price in that currency (a price snapshot)
+        """
+
+        value = 0
+        for asset_id, asset in self.items():
+            value += asset.current_value(currency, prices[asset_id])
+
+        return value
+
+    def purchase_terms(self):
+        """Gets the holdings and purchase values (in their own currency) of the positions, in the keys() order
+
+        Returns:
+            (numpy array of holdings, numpy array of purchase values, list of currencies, list of purchase timestamps)
+        """
+
+        holdings = np.fromiter((asset.holding for asset in self.values()), dtype = np.float64, count = len(self))
+        unit_prices = np.fromiter((asset.unit_price for asset in self.values()), dtype = np.float64, count = len(self))
+        return holdings, holdings * unit_prices, [asset.currency for asset in self.values()], [asset.timestamp for asset in self.values()]
+
+
+class ArrayPositionStore:
+    """Keeps the positions in parallel NumPy arrays, one row per asset id
+
+    Rows are never deleted, so row order is the order in which the asset ids were first added.
+    """
+
+    exact = False
+
+    # Name and fill value of the arrays that hold one entry per row
+    _COLUMNS = [("types", 0), ("currencies", 0), ("holdings", 0), ("unit_prices", 0), ("timestamps", np.nan)]
+
+    def __init__(self, capacity = 1024):
+        """Create an empty store
+
+        Args:
+            capacity: initial number of rows allocated, the arrays grow by doubling
+        """
+
+        self._index = {}
+        self._ids = []
+        self.types = np.zeros(capacity, dtype = np.int8)
+        self.currencies = np.zeros(capacity, dtype = np.int8)
+        self.holdings = np.zeros(capacity, dtype = np.float64)
+        self.unit_prices = np.zeros(capacity, dtype = np.float64)
+        self.timestamps = np.full(capacity, np.nan, dtype = np.float64)
+
+    def _grow(self):
+        """Doubles the capacity of the arrays"""
+
+        capacity = 2 * max(len(self.holdings), 1)
+        for name, fill in self._COLUMNS:
+            old = getattr(self, name)
+            new = np.full(capacity, fill, dtype = old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _append(self, asset):
+        """Adds a new row for the asset and returns its row number"""
+
+        row = len(self._ids)
+        if row == len(self.holdings):
+            self._grow()
+
+        self._index[asset.id] = row
+        self._ids.append(asset.id)
+        self.types[row] = asset.type.code
+        self.currencies[row] = asset.currency.code
+        self.holdings[row] = asset.holding
+        self.unit_prices[row] = asset.unit_price
+        self.timestamps[row] = np.nan if asset.timestamp is None else asset.timestamp
+        return row
+
+    def _check_type(self, row, asset):
+        """Raises ValueError if the asset type is not the row type"""
+
+        if AssetType.from_code(self.types[row]) != asset.type:
+            raise ValueError("Assest must be of the same type and id")
+
+    def add(self, asset):
+        """Adds the asset to the position with the same id (creates it if not present)
+
+        Same semantics as Asset.__add__: the position keeps its currency, the asset purchase value
+        is converted to it and the unit price is updated to the weighted average.
+
+        Raises:
+            ValueError: if the asset type does not match the position type
+        """
+
+        row = self._index.get(asset.id)
+        if row is None:
+            self._append(asset)
+            return
+
+        self._check_type(row, asset)
+        currency = Currency.from_code(self.currencies[row])
+        purchase_value = asset.holding * asset.unit_price
+        if asset.currency != currency:
+            purchase_value = Asset.pricing_system.convert_currency_value(purchase_value, asset.currency, currency, asset.timestamp)
+
+        holding = float(self.holdings[row])
+        total_holding = holding + asset.holding
+        self.unit_prices[row] = (holding * float(self.unit_prices[row]) + purchase_value) / total_holding
+        self.holdings[row] = total_holding
+        self.timestamps[row] = np.nan if asset.timestamp is None else asset.timestamp
+
+    def remove(self, asset):
+        """Substracts the asset holding from the position with the same id
+
+        Raises:
+            ValueError: if the asset type does not match the position type
+        """
+
+        row = self._index[asset.id]
+        self._check_type(row, asset)
+        self.holdings[row] -= asset.holding
+
+    def holding(self, asset_id):
+        """Returns the holding of an asset id, None if the asset is not in the store"""
+
+        row = self._index.get(asset_id)
+        return float(self.holdings[row]) if row is not None else None
+
+    def get_position(self, asset_id):
+        """Returns the (type, currency, holding, unit_price, timestamp) of a position, None if not present"""
+
+        row = self._index.get(asset_id)
+        if row is None:
+            return None
+        timestamp = float(self.timestamps[row])
+        return (AssetType.from_code(self.types[row]), Currency.from_code(self.currencies[row]), float(self.holdings[row]),
+                float(self.unit_prices[row]), None if np.isnan(timestamp) else timestamp)
+
+    def set_position(self, asset_id, asset_type, currency, holding, unit_price, timestamp):
+        """Creates or replaces a position"""
+
+        row = self._index.get(asset_id)
+        if row is None:
+            self._append(Asset(asset_type, asset_id, holding, currency, unit_price, timestamp))
+            return
+
+        self.types[row] = asset_type.code
+        self.currencies[row] = currency.code
+        self.holdings[row] = holding
+        self.unit_prices[row] = unit_price
+        self.timestamps[row] = np.nan if timestamp is None else timestamp
+
+    def current_value(self, currency, prices):
+        """Gets the total value of the positions in the specified currency
+
+        Args:
+            currency: Currency object
+            prices: dict asset_id -> current unit price in that currency (a price snapshot)
+        """
+
+        unit_prices = np.fromiter((prices[asset_id] for asset_id in self._ids), dtype = np.float64, count = len(self._ids))
+        return float(np.dot(self.holdings[:len(self._ids)], unit_prices))
+
+    def purchase_terms(self):
+        """Gets the holdings and purchase values (in their own currency) of the positions, in the keys() order
+
+        Returns:
+            (numpy array of holdings, numpy array of purchase values, list of currencies, list of purchase timestamps)
+        """
+
+        size = len(self._ids)
+        holdings = self.holdings[:size].copy()
+        values = holdings * self.unit_prices[:size]
+        currencies = [Currency.from_code(code) for code in self.currencies[:size].tolist()]
+        timestamps = [None if math.isnan(timestamp) else timestamp for timestamp in self.timestamps[:size].tolist()]
+        return holdings, values, currencies, timestamps
+
+    def __getitem__(self, asset_id):
+        """Returns an asset of the class of its type (see ASSET_CLASSES) built from the stored position
+
+        Raises:
+            KeyError: if the asset id is not in the store
+        """
+
+        position = self.get_position(asset_id)
+        if position is None:
+            raise KeyError(asset_id)
+
+        asset_type, currency, holding, unit_price, timestamp = position
+        return ASSET_CLASSES[asset_type](asset_id, holding, currency, unit_price, timestamp)
+
+    def get(self, asset_id, default = None):
+        """Returns the Asset of the asset id, default if not present"""
+        return self[asset_id] if asset_id in self._index else default
+
+    def __contains__(self, asset_id):
+        return asset_id in self._index
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def keys(self):
+        return self._index.keys()
+
+    def values(self):
+        return (self[asset_id] for asset_id in self._ids)
+
+    def items(self):
+        return ((asset_id, self[asset_id]) for asset_id in self._ids)
@@ -0,0 +1,81 @@
+"""Helpers around the pricing system protocol
+
+A pricing system provides:
+    - convert_currency_value(value, input_currency, output_currency, timestamp = None)
+    - get_asset_sell_price(asset_id, currency, timestamp = None)
+and optionally the batch methods:
+    - get_asset_sell_prices(asset_ids, currency, timestamp = None): list of prices in the asset_ids order
+    - get_asset_price_matrix(asset_ids, timestamps, currency): prices of the asset_ids (rows) at the
+      timestamps (columns), as a 2D array
+
+Pricing systems without the batch methods (like MockPricingSystem) are wrapped in a BatchPricingAdapter,
+that answers the batches with one single call per asset (and timestamp).
+
+Usage example:
+
+    prices = get_price_snapshot(Asset.pricing_system, ["BOND1", "DOL"], Currency.Euros)
+"""
+
+import numpy as np
+
+
+class BatchPricingAdapter:
+    """Adds the missing batch methods to a pricing system
+
+    Batch methods of the wrapped pricing system are used when available.
+    Any other attribute is taken from the wrapped pricing system.
+    """
+
+    def __init__(self, pricing_system):
+        self.pricing_system = pricing_system
+
+    def get_asset_sell_prices(self, asset_ids, currency, timestamp = None):
+        """Returns the sell unit prices of the assets in the given currency (one call per asset if not supported)"""
+
+        if hasattr(self.pricing_system, "get_asset_sell_prices"):
+            return self.pricing_system.get_asset_sell_prices(asset_ids, currency, timestamp)
+        return [self.pricing_system.get_asset_sell_price(asset_id, currency, timestamp) for asset_id in asset_ids]
+
+    def get_asset_price_matrix(self, asset_ids, timestamps, currency):
+        """Returns the sell unit prices of the assets (rows) at the timestamps (columns) in the given currency
+
+        If not supported by the wrapped pricing system, prices are requested one timestamp at a time.
+        """
+
+        if hasattr(self.pricing_system, "get_asset_price_matrix"):
+            return self.pricing_system.get_asset_price_matrix(asset_ids, timestamps, currency)
+
+        matrix = np.empty((len(asset_ids), len(timestamps)))
+        for column, timestamp in enumerate(timestamps):
+            matrix[:, column] = self.get_asset_sell_prices(asset_ids, currency, float(timestamp))
+        return matrix
+
+    def __getattr__(self, name):
+        # Only called for missing attributes: pricing_system is missing while the object is unpickled
+        if name == "pricing_system":
+            raise AttributeError(name)
+        return getattr(self.pricing_system, name)
+
+
+def as_batch_pricing_system(pricing_system):
+    """Returns the pricing system if it has the batch methods, else wraps it in a BatchPricingAdapter"""
+
+    if hasattr(pricing_system, "get_asset_sell_prices") and hasattr(pricing_system, "get_asset_price_matrix"):
+        return pricing_system
+    return BatchPricingAdapter(pricing_system)
+
+
+def get_price_snapshot(pricing_system, asset_ids, currency, timestamp = None):
+    """Returns a dict asset_id -> sell unit price, fetched with a single batch request"""
+
+    asset_ids = list(asset_ids)
+    prices = as_batch_pricing_system(pricing_system).get_asset_sell_prices(asset_ids, currency, timestamp)
+    return dict(zip(asset_ids, prices))
+
+
+def get_price_matrix(pricing_system, asset_ids, timestamps, currency):
+    """Returns the prices of the asset_ids (rows) at the timestamps (columns), fetched with a single batch request"""
+
+    asset_ids = list(asset_ids)
+    matrix = as_batch_pricing_system(pricing_system).get_asset_price_matrix(asset_ids, timestamps, currency)
+    return np.asarray(matrix, dtype = np.float64).reshape(len(asset_ids), len(timestamps))
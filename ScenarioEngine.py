@@ -0,0 +1,183 @@
+"""Vectorized what-if revaluation of a portfolio under price and FX shock scenarios
+
+A ScenarioEngine takes the positions of a portfolio and a base price vector once, then values the portfolio
+under a whole matrix of scenarios with a single matrix product, instead of swapping Asset.pricing_system
+and calling Portfolio.get_current_value once per scenario.
+
+Scenarios are rows of relative shocks:
+    - price_shocks (scenarios x assets, columns in asset_ids order): the price of an asset becomes
+      base price * (1 + shock)
+    - fx_shocks (scenarios x currencies, columns in currencies order): the rate from an asset currency
+      to the valuation currency becomes base rate * (1 + shock), the valuation currency column is ignored
+
+So the value of a scenario is sum(holding * base price * (1 + price shock) * (1 + fx shock of the asset currency)),
+computed for every scenario at once as (1 + price_shocks) @ weights, with weights[asset, currency] the base value
+of the asset in the column of its currency. Very large scenario sets can be split in chunks of scenarios and
+evaluated in a process pool.
+
+Usage example:
+
+    engine = ScenarioEngine(portfolio, Currency.Euros)
+    price_shocks = np.zeros((2, len(engine.asset_ids)))
+    price_shocks[1, engine.asset_ids.index("STOCK1")] = -0.2     # STOCK1 down 20%
+    fx_shocks = engine.fx_shock_matrix([{}, {Currency.Dollars: 0.1}])
+    result = engine.evaluate(price_shocks, fx_shocks)
+    print(result.values, result.pnl)
+"""
+
+import collections
+import concurrent.futures
+import numpy as np
+from Currency import CurrencyRegistry
+from Metrics import timed
+
+
+# Scenarios per process pool task
+DEFAULT_CHUNK_SIZE = 1 << 12
+
+# Valuation of each scenario
+#   - values: numpy array of the portfolio value of each scenario
+#   - pnl: numpy array of the value of each scenario minus the base value
+ScenarioResult = collections.namedtuple("ScenarioResult", ["values", "pnl"])
+
+
+def _evaluate_chunk(weights, price_shocks, fx_shocks):
+    """Values a chunk of scenarios (see ScenarioEngine.evaluate)
+
+    Args:
+        weights: assets x currencies matrix of the base values
+        price_shocks: scenarios x assets relative price shocks, or None
+        fx_shocks: scenarios x currencies relative FX shocks, or None
+    """
+
+    if price_shocks is not None:
+        currency_values = (1 + price_shocks) @ weights
+    else:
+        currency_values = np.broadcast_to(weights.sum(axis = 0), (len(fx_shocks), weights.shape[1]))
+
+    if fx_shocks is not None:
+        return np.einsum("ij,ij->i", currency_values, 1 + fx_shocks)
+    return currency_values.sum(axis = 1)
+
+
+class ScenarioEngine:
+    """Values a portfolio under matrices of price and FX shocks
+
+    Attributes:
+        asset_ids: asset ids, in the order of the price shock columns
+        currencies: CurrencyRegistry of the asset currencies, in the order of the FX shock columns
+        base_prices: numpy array of the base unit price of each asset in the valuation currency
+        base_value: value of the portfolio with no shock
+    """
+
+    def __init__(self, portfolio, currency, prices = None):
+        """Takes the portfolio positions and base prices
+
+        Args:
+            portfolio: Portfolio to value, later transactions are not taken into account
+            currency: valuation Currency
+            prices: base price snapshot (see Portfolio.get_price_snapshot), requested if None
+        """
+
+        self.currency = currency
+        self.asset_ids = list(portfolio.get_asset_ids())
+        if prices is None:
+            prices = portfolio.get_price_snapshot(currency)
+
+        holdings, _, asset_currencies, _ = portfolio.assets.purchase_terms()
+        self.base_prices = np.fromiter((prices[asset_id] for asset_id in self.asset_ids), dtype = np.float64,
+                                       count = len(self.asset_ids))
+
+        self.currencies = CurrencyRegistry(asset_currencies)
+        self._currency_indices = np.asarray(self.currencies.indices(asset_currencies), dtype = np.intp)
+        self._valuation_index = self.currencies.index(currency) if currency in self.currencies else None
+
+        self.weights = np.zeros((len(self.asset_ids), len(self.currencies)))
+        self.weights[np.arange(len(self.asset_ids)), self._currency_indices] = holdings * self.base_prices
+        self.base_value = float(self.weights.sum())
+
+    def price_shock_matrix(self, scenarios):
+        """Builds a price shock matrix from a list of dicts asset_id -> relative shock, one per scenario
+
+        Raises:
+            ValueError: if an asset id is not in the portfolio
+        """
+
+        columns = {asset_id: column for column, asset_id in enumerate(self.asset_ids)}
+        shocks = np.zeros((len(scenarios), len(self.asset_ids)))
+        for row, scenario in enumerate(scenarios):
+            for asset_id, shock in scenario.items():
+                if asset_id not in columns:
+                    raise ValueError(f"Asset {asset_id} is not in the portfolio")
+                shocks[row, columns[asset_id]] = shock
+        return shocks
+
+    def fx_shock_matrix(self, scenarios):
+        """Builds a FX shock matrix from a list of dicts currency -> relative shock, one per scenario
+
+        Currencies are Currency members or ISO 4217 codes, currencies no asset is denominated in are ignored.
+        """
+
+        shocks = np.zeros((len(scenarios), len(self.currencies)))
+        for row, scenario in enumerate(scenarios):
+            for currency, shock in scenario.items():
+                if currency in self.currencies:
+                    shocks[row, self.currencies.index(currency)] = shock
+        return shocks
+
+    def _check(self, shocks, columns, name):
+        """Returns the shocks as a 2D float array
+
+        Raises:
+            ValueError: if the shocks do not have one column per asset or currency
+        """
+
+        if shocks is None:
+            return None
+        shocks = np.asarray(shocks, dtype = np.float64)
+        if shocks.ndim != 2 or shocks.shape[1] != columns:
+            raise ValueError(f"Expecting {name} with {columns} columns, got shape {shocks.shape}")
+        return shocks
+
+    @timed("ScenarioEngine.evaluate")
+    def evaluate(self, price_shocks = None, fx_shocks = None, max_workers = None, chunk_size = DEFAULT_CHUNK_SIZE):
+        """Values the portfolio under each scenario
+
+        Args:
+            price_shocks: scenarios x assets matrix of relative price shocks (columns in asset_ids order), or None
+            fx_shocks: scenarios x currencies matrix of relative FX shocks (columns in currencies order), or None
+            max_workers: if not None, chunks of scenarios are evaluated in a pool of max_workers processes
+            chunk_size: scenarios per process pool task
+
+        Returns:
+            ScenarioResult
+
+        Raises:
+            ValueError: if a matrix has the wrong number of columns, if both are None,
+                        or if they have different numbers of scenarios
+        """
+
+        price_shocks = self._check(price_shocks, len(self.asset_ids), "price shocks")
+        fx_shocks = self._check(fx_shocks, len(self.currencies), "FX shocks")
+        if price_shocks is None and fx_shocks is None:
+            raise ValueError("Expecting price shocks or FX shocks")
+        if price_shocks is not None and fx_shocks is not None and len(price_shocks) != len(fx_shocks):
+            raise ValueError("Price shocks and FX shocks have different numbers of scenarios")
+
+        if fx_shocks is not None and self._valuation_index is not None:
+            fx_shocks = fx_shocks.copy()
+            fx_shocks[:, self._valuation_index] = 0
+
+        count = len(price_shocks) if price_shocks is not None else len(fx_shocks)
+        if max_workers is None or count <= chunk_size:
+            values = _evaluate_chunk(self.weights, price_shocks, fx_shocks)
+        else:
+            starts = range(0, count, chunk_size)
+            with concurrent.futures.ProcessPoolExecutor(max_workers = max_workers) as executor:
+                futures = [executor.submit(_evaluate_chunk, self.weights,
+                                           price_shocks[start:start + chunk_size] if price_shocks is not None else None,
+                                           fx_shocks[start:start + chunk_size] if fx_shocks is not None else None)
+                           for start in starts]
+                values = np.concatenate([future.result() for future in futures])
+
+        return ScenarioResult(values, values - self.base_value)
@@ -0,0 +1,139 @@
+"""Parallel replay of transaction batches, sharded by asset id
+
+The legs of a batch (see TransactionBatch.legs) only interact through the asset id they apply to, cash ids
+included: each leg is assigned to a shard by a hash of its asset id, and every shard is replayed with
+replay_legs in a worker process. A shard keeps the legs of its assets in their global order, so the
+no short rule is checked exactly as in Portfolio.batch_transactions. The positions of the shards are
+merged into the portfolio only if no shard rejected a transaction, and the rejected transaction reported
+is the first one by global sequence among all the shards.
+
+Usage example:
+
+    with ShardedReplayer(max_workers = 64) as replayer:
+        for batch in log.batches():
+            replayer.replay(portfolio, batch)
+"""
+
+import os
+import zlib
+import concurrent.futures
+import numpy as np
+from Asset import Asset
+from TransactionBatch import TransactionLegs, TransactionError, replay_legs
+
+
+class _ShardPositions(dict):
+    """Positions of the asset ids of a shard before the batch: asset_id -> position tuple"""
+
+    def get_position(self, asset_id):
+        return self.get(asset_id)
+
+
+def shard_legs(legs, shard_count):
+    """Splits transaction legs by asset id
+
+    Returns:
+        list of shard_count TransactionLegs, the legs of an asset id are all in the same shard and keep their order
+    """
+
+    index = {}
+    codes = np.fromiter((index.setdefault(asset_id, len(index)) for asset_id in legs.asset_ids),
+                        dtype = np.int64, count = len(legs.asset_ids))
+    id_shards = np.array([zlib.crc32(asset_id.encode("utf-8")) % shard_count for asset_id in index], dtype = np.int64)
+    leg_shards = id_shards[codes] if len(codes) > 0 else codes
+
+    shards = []
+    for shard in range(shard_count):
+        mask = leg_shards == shard
+        shards.append(TransactionLegs(*(field[mask] for field in legs)))
+    return shards
+
+
+def _init_worker(pricing_system):
+    """Sets the pricing system of a worker process"""
+
+    Asset.pricing_system = pricing_system
+
+
+def _replay_shard(legs, positions):
+    """Worker task: replays the legs of a shard
+
+    Returns:
+        (positions, None) or (None, (sequence, row, message)) if a transaction is rejected
+    """
+
+    try:
+        return replay_legs(legs, positions), None
+    except TransactionError as error:
+        return None, (error.sequence, error.row, str(error))
+
+
+class ShardedReplayer:
+    """Replays transaction batches in a pool of worker processes, one task per shard of asset ids"""
+
+    def __init__(self, shard_count = None, max_workers = None, pricing_system = None, mp_context = None):
+        """Create a replayer and start its process pool
+
+        Args:
+            shard_count: number of shards of a batch, the number of workers if None
+            max_workers: number of worker processes, the number of CPUs if None
+            pricing_system: pricing system of the workers (must be picklable), Asset.pricing_system if None
+            mp_context: multiprocessing context of the pool (eg: multiprocessing.get_context("spawn")),
+                        the platform default if None
+        """
+
+        self.max_workers = max_workers if max_workers is not None else os.cpu_count()
+        self.shard_count = shard_count if shard_count is not None else self.max_workers
+        pricing_system = pricing_system if pricing_system is not None else Asset.pricing_system
+        self._executor = concurrent.futures.ProcessPoolExecutor(max_workers = self.max_workers, mp_context = mp_context,
+                                                                initializer = _init_worker, initargs = (pricing_system,))
+
+    def replay(self, portfolio, batch):
+        """Adds a TransactionBatch to the portfolio, with the same result as Portfolio.batch_transactions
+
+        Portfolios that track their history or lots, or keep their positions in an exact store, need each
+        transaction, so their batches are applied with Portfolio.batch_transactions.
+
+        Raises:
+            TransactionError (ValueError): with the row of the first rejected transaction (by global sequence),
+                                           the portfolio is left unchanged
+        """
+
+        if portfolio.history is not None or portfolio.lots is not None or portfolio.assets.exact:
+            portfolio.batch_transactions(batch)
+            return
+
+        futures = []
+        for legs in shard_legs(batch.legs(), self.shard_count):
+            if len(legs.asset_ids) == 0:
+                continue
+            positions = _ShardPositions()
+            for asset_id in set(legs.asset_ids):
+                position = portfolio.assets.get_position(asset_id)
+                if position is not None:
+                    positions[asset_id] = position
+            futures.append(self._executor.submit(_replay_shard, legs, positions))
+
+        results = [future.result() for future in futures]
+        errors = [error for _, error in results if error is not None]
+        if errors:
+            sequence, row, message = min(errors)
+            raise TransactionError(message, row, sequence)
+
+        touched = []
+        for positions, _ in results:
+            for position in positions:
+                portfolio.assets.set_position(*position)
+                touched.append(position[0])
+        portfolio.sequence += len(batch)
+        portfolio.notify_changed(touched)
+
+    def close(self):
+        """Stops the worker processes"""
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.close()
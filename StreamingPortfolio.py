@@ -0,0 +1,211 @@
+"""Event driven valuation of a portfolio from a feed of price ticks and trades
+
+A StreamingPortfolio keeps the current value and the profit of each asset of a portfolio in one currency
+up to date as price ticks and trades arrive, instead of requesting every price again:
+    - a price tick re-values its asset and updates the total by the value delta (O(1) per tick)
+    - a trade is applied to the portfolio and only re-values the asset ids it touches
+      (trades applied directly to the portfolio are tracked too, as a portfolio listener)
+After each update, a PortfolioEvent is published to the subscribed consumers. A trade of a feed rejected by
+the portfolio is published as a "rejected" event, and the feed goes on.
+
+Feeds are iterables of PriceTick and (input_asset, output_asset) items:
+    - QueueFeed: an in process queue, filled by a producer thread
+    - LineFeed: NDJSON lines read from a file object (eg: socket.makefile()), standing in for a market data service
+
+Usage example:
+
+    stream = StreamingPortfolio(portfolio, Currency.Euros)
+    stream.subscribe(lambda event: print(event.total))
+    feed = QueueFeed()
+    threading.Thread(target = stream.run, args = (feed,)).start()
+    feed.put_tick(PriceTick("BOND1", Currency.Euros, 4.7))
+    feed.close()
+"""
+
+import json
+import queue
+import collections
+from Currency import Currency
+from Asset import Asset
+import TransactionLoader
+
+
+# New sell unit price of an asset. The timestamp is informative (None if not known)
+PriceTick = collections.namedtuple("PriceTick", ["asset_id", "currency", "price", "timestamp"], defaults = (None,))
+
+# Change published after each tick or trade, or trade of a feed rejected by the portfolio
+#   - kind: "tick", "trade" or "rejected"
+#   - asset_id: asset re-valued (the input asset of a rejected trade)
+#   - value, profit: new value and profit of the asset (None if it is not in the portfolio)
+#   - total: new total value of the portfolio
+#   - error: message of a rejected trade, None for the other kinds
+PortfolioEvent = collections.namedtuple("PortfolioEvent", ["kind", "asset_id", "value", "profit", "total", "error"],
+                                        defaults = (None,))
+
+
+class QueueFeed:
+    """In process feed of price ticks and trades, iterated until closed"""
+
+    _CLOSED = object()
+
+    def __init__(self, max_size = 0):
+        self._queue = queue.Queue(max_size)
+
+    def put_tick(self, tick):
+        """Adds a PriceTick to the feed"""
+        self._queue.put(tick)
+
+    def put_trade(self, input_asset, output_asset = None):
+        """Adds a trade to the feed"""
+        self._queue.put((input_asset, output_asset))
+
+    def close(self):
+        """Ends the iteration of the feed once the items already added are consumed"""
+        self._queue.put(self._CLOSED)
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is self._CLOSED:
+                return
+            yield item
+
+
+class LineFeed:
+    """Feed of NDJSON lines read from a file object
+
+    Each line is a price tick {"tick": {"asset_id", "currency", "price", "timestamp"}} (currency is a Currency value)
+    or a trade {"input": {...}, "output": {...}} in the TransactionLoader record format.
+    """
+
+    def __init__(self, file):
+        self.file = file
+
+    def __iter__(self):
+        for line in self.file:
+            if isinstance(line, bytes):
+                line = line.decode("utf-8")
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            tick = record.get("tick")
+            if tick is not None:
+                yield PriceTick(tick["asset_id"], Currency(tick["currency"]), tick["price"], tick.get("timestamp"))
+            else:
+                yield TransactionLoader.record_to_transaction(record)
+
+
+class StreamingPortfolio:
+    """Incrementally valued portfolio"""
+
+    def __init__(self, portfolio, currency, prices = None):
+        """Values the portfolio once and starts tracking its changes
+
+        Args:
+            portfolio: Portfolio to value
+            currency: valuation Currency
+            prices: initial price snapshot (see Portfolio.get_price_snapshot), requested if None
+        """
+
+        self.portfolio = portfolio
+        self.currency = currency
+        self.prices = dict(prices) if prices is not None else portfolio.get_price_snapshot(currency)
+        self.values = {}
+        self.purchase_values = {}
+        self.total = 0
+        self._consumers = []
+
+        for asset in portfolio:
+            self.values[asset.id] = asset.current_value(currency, self.prices[asset.id])
+            self.purchase_values[asset.id] = asset.purchase_value(currency)
+            self.total += self.values[asset.id]
+
+        portfolio.subscribe(self._on_change)
+
+    def subscribe(self, consumer):
+        """Registers a function called with each PortfolioEvent"""
+        self._consumers.append(consumer)
+
+    def close(self):
+        """Stops tracking the portfolio changes"""
+        self.portfolio.unsubscribe(self._on_change)
+
+    def profit(self, asset_id):
+        """Returns the current profit of an asset, None if it is not in the portfolio"""
+
+        if asset_id not in self.values:
+            return None
+        return self.values[asset_id] - self.purchase_values[asset_id]
+
+    def _publish(self, kind, asset_id):
+        event = PortfolioEvent(kind, asset_id, self.values[asset_id], self.profit(asset_id), self.total)
+        for consumer in self._consumers:
+            consumer(event)
+
+    def on_tick(self, tick):
+        """Re-values the asset of a price tick, ticks of assets not in the portfolio only update the price"""
+
+        price = tick.price
+        if tick.currency != self.currency:
+            price = Asset.pricing_system.convert_currency_value(price, tick.currency, self.currency, tick.timestamp)
+        self.prices[tick.asset_id] = price
+
+        old_value = self.values.get(tick.asset_id)
+        if old_value is None:
+            return
+
+        value = self.portfolio.assets.holding(tick.asset_id) * price
+        self.values[tick.asset_id] = value
+        self.total += value - old_value
+        self._publish("tick", tick.asset_id)
+
+    def on_trade(self, input_asset, output_asset = None):
+        """Applies a trade to the portfolio (the touched assets are re-valued by the portfolio listener)
+
+        Raises:
+            ValueError: if the portfolio rejects the trade (see Portfolio.transaction)
+        """
+
+        self.portfolio.transaction(input_asset, output_asset)
+
+    def _on_change(self, asset_ids):
+        """Portfolio listener: re-values the touched asset ids, pricing the ones never seen"""
+
+        for asset_id in asset_ids:
+            asset = self.portfolio.assets.get(asset_id)
+            if asset is None:
+                continue
+            if asset_id not in self.prices:
+                self.prices[asset_id] = Asset.pricing_system.get_asset_sell_price(asset_id, self.currency)
+
+            value = asset.current_value(self.currency, self.prices[asset_id])
+            self.total += value - self.values.get(asset_id, 0)
+            self.values[asset_id] = value
+            self.purchase_values[asset_id] = asset.purchase_value(self.currency)
+            self._publish("trade", asset_id)
+
+    def process(self, item):
+        """Applies a feed item: a PriceTick or an (input_asset, output_asset) trade"""
+
+        if isinstance(item, PriceTick):
+            self.on_tick(item)
+        else:
+            self.on_trade(*item)
+
+    def run(self, feed):
+        """Applies every item of a feed, until the feed ends
+
+        A trade rejected by the portfolio (ValueError, see Portfolio.transaction) is published as a "rejected"
+        event and the feed goes on.
+        """
+
+        for item in feed:
+            try:
+                self.process(item)
+            except ValueError as error:
+                if isinstance(item, PriceTick):
+                    raise
+                asset_id = item[0].id
+                event = PortfolioEvent("rejected", asset_id, self.values.get(asset_id), self.profit(asset_id), self.total, str(error))
+                for consumer in self._consumers:
+                    consumer(event)
@@ -0,0 +1,300 @@
+"""Columnar batches of transactions and their vectorized replay
+
+A TransactionBatch keeps a list of transactions as parallel arrays (one entry per transaction):
+input asset ids, holdings, unit prices, currencies, timestamps and types, and output asset ids and holdings.
+An output id of None (or an output holding of 0) represents an investment.
+
+The batch is replayed in one vectorized pass (see replay_legs) instead of one Portfolio.transaction call
+per tuple: every transaction is split into legs (the output leg is applied before the input leg),
+legs are grouped by asset id and ordered by transaction, the no short rule is checked with a cumulative
+sum of the holdings of each asset (restarted on each asset, so a large position does not blur a small one)
+and the weighted average unit prices are solved as a linear recurrence.
+Output legs are matched by asset id only.
+
+Usage example:
+
+    batch = TransactionBatch.from_transactions(transactions_list)
+    portfolio.batch_transactions(batch)
+"""
+
+import collections
+import numpy as np
+from Asset import Asset
+
+
+# Groups of legs longer than this are scanned one at a time, the shorter ones one rank at a time
+_SCAN_LENGTH = 64
+
+
+class TransactionError(ValueError):
+    """A transaction of a batch can not be applied
+
+    Attributes:
+        row: index of the transaction in the batch
+        sequence: sequence of the rejected leg (see TransactionLegs), None if not known
+    """
+
+    def __init__(self, message, row, sequence = None):
+        super(TransactionError, self).__init__(message)
+        self.row = row
+        self.sequence = sequence
+
+
+# One entry per transaction leg. sequence is 2 * row for output legs and 2 * row + 1 for input legs.
+# Output legs have negative quantities and no unit price, currency, type or timestamp.
+TransactionLegs = collections.namedtuple("TransactionLegs",
+                                         ["asset_ids", "quantities", "unit_prices", "currencies", "types", "timestamps", "sequence"])
+
+
+class TransactionBatch:
+    """Transactions stored as parallel arrays"""
+
+    def __init__(self, input_ids, input_holdings, input_unit_prices, input_currencies, input_timestamps,
+                 output_ids, output_holdings, input_types):
+        """Create a batch of transactions
+
+        Args:
+            input_ids: input asset ids
+            input_holdings: input asset holdings
+            input_unit_prices: input asset unit prices
+            input_currencies: input asset currencies (Currency objects)
+            input_timestamps: input asset timestamps (None or NaN if not known)
+            output_ids: output asset ids (None for investments)
+            output_holdings: output asset holdings (0 for investments)
+            input_types: input asset types (AssetType objects)
+
+        Raises:
+            ValueError: if the arrays lengths do not match
+        """
+
+        self.input_ids = np.asarray(input_ids, dtype = object)
+        self.input_holdings = np.asarray(input_holdings, dtype = np.float64)
+        self.input_unit_prices = np.asarray(input_unit_prices, dtype = np.float64)
+        self.input_currencies = np.asarray(input_currencies, dtype = object)
+        self.input_timestamps = np.array(input_timestamps, dtype = np.float64)
+        self.output_ids = np.asarray(output_ids, dtype = object)
+        self.output_holdings = np.asarray(output_holdings, dtype = np.float64)
+        self.input_types = np.asarray(input_types, dtype = object)
+
+        lengths = {len(array) for array in [self.input_ids, self.input_holdings, self.input_unit_prices, self.input_currencies,
+                                            self.input_timestamps, self.output_ids, self.output_holdings, self.input_types]}
+        if len(lengths) > 1:
+            raise ValueError("All the batch arrays must have the same length")
+
+    @classmethod
+    def from_transactions(cls, transaction_list):
+        """Builds a batch from (input_asset, output_asset) tuples"""
+
+        columns = [[], [], [], [], [], [], [], []]
+        for input_asset, output_asset in transaction_list:
+            columns[0].append(input_asset.id)
+            columns[1].append(input_asset.holding)
+            columns[2].append(input_asset.unit_price)
+            columns[3].append(input_asset.currency)
+            columns[4].append(input_asset.timestamp)
+            columns[5].append(output_asset.id if output_asset is not None else None)
+            columns[6].append(output_asset.holding if output_asset is not None else 0)
+            columns[7].append(input_asset.type)
+
+        return cls(*columns)
+
+    def __len__(self):
+        return len(self.input_ids)
+
+    def legs(self):
+        """Splits the transactions into input and output legs (TransactionLegs)"""
+
+        rows = np.arange(len(self), dtype = np.int64)
+        has_output = (self.output_holdings != 0) & (self.output_ids != None)
+        output_rows = rows[has_output]
+        output_count = len(output_rows)
+
+        return TransactionLegs(
+            asset_ids = np.concatenate([self.output_ids[has_output], self.input_ids]),
+            quantities = np.concatenate([-self.output_holdings[has_output], self.input_holdings]),
+            unit_prices = np.concatenate([np.zeros(output_count), self.input_unit_prices]),
+            currencies = np.concatenate([np.full(output_count, None, dtype = object), self.input_currencies]),
+            types = np.concatenate([np.full(output_count, None, dtype = object), self.input_types]),
+            timestamps = np.concatenate([np.full(output_count, np.nan), self.input_timestamps]),
+            sequence = np.concatenate([2 * output_rows, 2 * rows + 1]))
+
+
+def _group_bounds(codes):
+    """Returns the start and end (exclusive) index of each run of equal sorted codes"""
+
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    ends = np.r_[starts[1:], len(codes)]
+    return starts, ends
+
+
+def _rank_steps(starts, ends):
+    """Yields, for k = 1, 2, ..., the index of the k-th element of every group with more than k elements
+
+    Only the groups of at most _SCAN_LENGTH elements are scanned this way (one vectorized step per rank),
+    the longer ones are returned by _long_groups.
+    """
+
+    lengths = ends - starts
+    short = lengths <= _SCAN_LENGTH
+    order = np.argsort(-lengths[short], kind = "stable")
+    short_starts = starts[short][order]
+    short_lengths = lengths[short][order]
+    for k in range(1, short_lengths[0] if len(short_lengths) else 0):
+        yield short_starts[:np.searchsorted(-short_lengths, -k)] + k
+
+
+def _long_groups(starts, ends):
+    """Returns the groups with more than _SCAN_LENGTH elements"""
+
+    return np.flatnonzero(ends - starts > _SCAN_LENGTH)
+
+
+def _grouped_cumsum(values, initial, starts, ends):
+    """Cumulative sum of values restarting from initial (one value per group) at each group start
+
+    The sums of each group are accumulated in the same order as a loop over its elements, so the result
+    does not depend on the other groups.
+    """
+
+    sums = values.copy()
+    sums[starts] += initial
+    for index in _rank_steps(starts, ends):
+        sums[index] += sums[index - 1]
+    for group in _long_groups(starts, ends):
+        start, end = starts[group], ends[group]
+        sums[start:end] = np.cumsum(sums[start:end])
+    return sums
+
+
+def _grouped_recurrence(a, b, initial, starts, ends):
+    """Last value of x_k = a_k * x_(k-1) + b_k on each group, with x_(-1) the initial value of the group
+
+    With a in [0, 1] the recurrence is stable: the long groups are solved as
+    x = x_(-1) * prod(a) + sum_j b_j * prod_(i > j) a_i, with suffix products that can only shrink.
+    """
+
+    values = a[starts] * initial + b[starts]
+    x = np.empty_like(a)
+    x[starts] = values
+    for index in _rank_steps(starts, ends):
+        x[index] = a[index] * x[index - 1] + b[index]
+    values = x[ends - 1]
+    for group in _long_groups(starts, ends):
+        start, end = starts[group], ends[group]
+        suffix = np.cumprod(a[start:end][::-1])[::-1]
+        values[group] = initial[group] * suffix[0] + np.dot(b[start:end - 1], suffix[1:]) + b[end - 1]
+    return values
+
+
+def _first_error(errors):
+    """Raises the TransactionError of the (sequence, message) pair with the lowest sequence"""
+
+    if errors:
+        sequence, message = min(errors, key = lambda error: error[0])
+        row = int(sequence) // 2
+        raise TransactionError(f"{message} (transaction {row})", row, int(sequence))
+
+
+def replay_legs(legs, positions):
+    """Replays transaction legs on top of the current positions
+
+    Args:
+        legs: TransactionLegs to replay
+        positions: position store (or any object with get_position) holding the positions before the legs
+
+    Returns:
+        list of (asset_id, type, currency, holding, unit_price, timestamp) with the final position
+        of each asset id found in the legs
+
+    Raises:
+        TransactionError: for the first transaction (by row) that is rejected, either because it would
+                          leave a short position or because its input type does not match the position type.
+                          Positions are not modified by this function.
+    """
+
+    if len(legs.asset_ids) == 0:
+        return []
+
+    # Group the legs by asset id, keeping the transaction order inside each group
+    index = {}
+    codes = np.fromiter((index.setdefault(asset_id, len(index)) for asset_id in legs.asset_ids),
+                        dtype = np.int64, count = len(legs.asset_ids))
+    unique_ids = list(index)
+    order = np.lexsort((legs.sequence, codes))
+    codes = codes[order]
+    quantities = legs.quantities[order]
+    sequence = legs.sequence[order]
+    is_input = (sequence % 2) == 1
+    starts, ends = _group_bounds(codes)
+
+    # Positions before the batch
+    asset_count = len(unique_ids)
+    initial = [positions.get_position(asset_id) for asset_id in unique_ids]
+    exists = np.array([position is not None for position in initial])
+    position_types = np.array([position[0] if position else None for position in initial], dtype = object)
+    position_currencies = np.array([position[1] if position else None for position in initial], dtype = object)
+    initial_holdings = np.array([position[2] if position else 0.0 for position in initial], dtype = np.float64)
+    initial_unit_prices = np.array([position[3] if position else 0.0 for position in initial], dtype = np.float64)
+    initial_timestamps = np.array([position[4] if position else None for position in initial], dtype = np.float64)
+
+    # Holding before and after each leg, summed per asset in transaction order as Portfolio.transaction does
+    holdings_after = _grouped_cumsum(quantities, initial_holdings[codes[starts]], starts, ends)
+    holdings_before = np.empty_like(holdings_after)
+    holdings_before[1:] = holdings_after[:-1]
+    holdings_before[starts] = initial_holdings[codes[starts]]
+
+    errors = []
+    short = (~is_input) & (holdings_after < 0)
+    if short.any():
+        first = np.argmin(np.where(short, sequence, np.iinfo(np.int64).max))
+        errors.append((sequence[first], f"No short potitions are allowed: {unique_ids[codes[first]]}"))
+
+    # Input legs: type and currency of new positions come from their first input leg
+    inputs = order[is_input]
+    input_codes = codes[is_input]
+    input_quantities = quantities[is_input]
+    input_holdings_before = holdings_before[is_input]
+    input_starts, input_ends = _group_bounds(input_codes)
+    input_groups = input_codes[input_starts]
+    input_types = legs.types[inputs]
+    input_currencies = legs.currencies[inputs]
+
+    new = input_groups[~exists[input_groups]]
+    new_starts = input_starts[~exists[input_groups]]
+    position_types[new] = input_types[new_starts]
+    position_currencies[new] = input_currencies[new_starts]
+
+    mismatch = input_types != position_types[input_codes]
+    if mismatch.any():
+        first = np.argmin(np.where(mismatch, sequence[is_input], np.iinfo(np.int64).max))
+        errors.append((sequence[is_input][first], f"Assest to add must be of the same type and id: {unique_ids[input_codes[first]]}"))
+
+    _first_error(errors)
+
+    # Purchase value of each input leg in its position currency
+    input_unit_prices = legs.unit_prices[inputs]
+    input_timestamps = legs.timestamps[inputs]
+    values = input_quantities * input_unit_prices
+    for leg in np.flatnonzero(input_currencies != position_currencies[input_codes]):
+        timestamp = None if np.isnan(input_timestamps[leg]) else float(input_timestamps[leg])
+        values[leg] = Asset.pricing_system.convert_currency_value(values[leg], input_currencies[leg],
+                                                                  position_currencies[input_codes[leg]], timestamp)
+
+    # Weighted average unit price: u_k = a_k * u_(k-1) + b_k on each input leg, where a_k is the share of the
+    # holding before the leg. A zero a_k (position bought from zero holding) discards everything before it.
+    totals = input_holdings_before + input_quantities
+    empty = totals == 0
+    a = np.clip(np.where(empty, 0.0, input_holdings_before / np.where(empty, 1.0, totals)), 0.0, 1.0)
+    b = np.where(empty, input_unit_prices, values / np.where(empty, 1.0, totals))
+    b[new_starts] = input_unit_prices[new_starts]    # New positions take the unit price of their first input leg
+    unit_prices = initial_unit_prices.copy()
+    unit_prices[input_groups] = _grouped_recurrence(a, b, initial_unit_prices[input_groups], input_starts, input_ends)
+
+    # Final holdings and timestamps (the timestamp is the one of the last input leg)
+    final_holdings = holdings_after[ends - 1]
+    final_timestamps = initial_timestamps.copy()
+    final_timestamps[input_groups] = input_timestamps[input_ends - 1]
+
+    return [(unique_ids[group], position_types[group], position_currencies[group], float(final_holdings[group]),
+             float(unit_prices[group]), None if np.isnan(final_timestamps[group]) else float(final_timestamps[group]))
+            for group in range(asset_count)]
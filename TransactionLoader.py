@@ -0,0 +1,260 @@
+"""Streaming loader for portfolio transaction history files
+
+A transaction history file contains one record per transaction. Two layouts are supported:
+    - NDJSON: one JSON object per line
+    - JSON array: a single top-level array of JSON objects
+
+Records are read one at a time (the JSON array is parsed in chunks), so the memory used
+by the loader does not depend on the size of the file.
+
+The loader tracks the byte offset after each record read (LoaderStats.offset). A load can start at such an
+offset (eg: the one saved in a portfolio snapshot), seeking past the records already applied instead of
+reading them again.
+
+Each record has an input asset and an optional output asset:
+
+    {"input":  {"type": "BOND", "id": "BOND1", "holding": 50, "currency": "Dollars", "unit_price": 3.2, "timestamp": 1581634800},
+     "output": {"type": "CASH", "id": "DOL", "holding": 160}}
+
+    - type: asset type value (CASH, BOND, STOCK)
+    - currency: currency value (Dollars, Euros), defaults to Dollars
+    - unit_price: defaults to 0
+    - timestamp: seconds since epoch or a "dd/mm/YYYY" date, optional
+
+Usage example:
+
+    portfolio = Portfolio()
+    portfolio.transactions(load_transactions("transactions.json"))
+"""
+
+import io
+import json
+import time
+import itertools
+import datetime
+from Currency import Currency
+from Asset import AssetType, ASSET_CLASSES
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+_WHITESPACE = " \t\r\n"
+
+
+def parse_timestamp(value):
+    """Converts a record timestamp into seconds since epoch (None is kept as None)"""
+
+    if value is None or isinstance(value, (int, float)):
+        return value
+
+    return time.mktime(datetime.datetime.strptime(value, "%d/%m/%Y").timetuple())
+
+
+def record_to_asset(record):
+    """Builds an asset from its record (a dict), None records return None
+
+    Raises:
+        ValueError: if the asset type or currency are unknown
+    """
+
+    if record is None:
+        return None
+
+    asset_class = ASSET_CLASSES[AssetType(record["type"])]
+    return asset_class(record["id"],
+                       record["holding"],
+                       Currency(record.get("currency", Currency.Dollars.value)),
+                       record.get("unit_price", 0),
+                       parse_timestamp(record.get("timestamp")))
+
+
+def record_to_transaction(record):
+    """Converts a transaction record into a (input_asset, output_asset) tuple"""
+
+    return (record_to_asset(record["input"]), record_to_asset(record.get("output")))
+
+
+def _iter_ndjson(file, first_line = "", skip = 0, offset = 0):
+    """Yields (record, byte offset after the record) for each non empty line, the first skip records are not parsed
+
+    file is a text or a binary file, offset the byte offset of first_line.
+    """
+
+    for line in itertools.chain([first_line], file):
+        offset += len(line) if isinstance(line, bytes) else len(line.encode("utf-8"))
+        if line.strip():
+            if skip > 0:
+                skip -= 1
+                continue
+            yield json.loads(line), offset
+
+
+def _iter_json_array(file, buffer, chunk_size, offset = 0):
+    """Yields (element, byte offset after the element) for the elements of a top level JSON array,
+    reading the file in chunks
+
+    buffer holds the already read text, starting right after the opening bracket, at the byte offset offset.
+    Only one chunk plus the record being decoded are kept in memory.
+    """
+
+    decoder = json.JSONDecoder()
+    position = 0
+    # Text of the buffer before counted is included in offset
+    counted = 0
+    ascii = buffer.isascii()
+    end_of_file = False
+
+    def byte_length(start, end):
+        return end - start if ascii else len(buffer[start:end].encode("utf-8"))
+
+    while True:
+        # Skip separators between records
+        while position < len(buffer) and (buffer[position] in _WHITESPACE or buffer[position] == ","):
+            position += 1
+
+        if position < len(buffer) and buffer[position] == "]":
+            return
+
+        if position < len(buffer):
+            try:
+                record, next_position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The record may be split between chunks, read more data and retry
+                if end_of_file:
+                    raise
+                record = None
+
+            # A record ending exactly at the buffer end may still be incomplete (eg: a number)
+            if record is not None and (next_position < len(buffer) or end_of_file):
+                offset += byte_length(counted, next_position)
+                counted = position = next_position
+                yield record, offset
+                continue
+
+        if end_of_file:
+            raise ValueError("Unterminated JSON array in transaction history")
+
+        chunk = file.read(chunk_size)
+        end_of_file = not chunk
+        offset += byte_length(counted, position)
+        buffer = buffer[position:] + chunk
+        ascii = buffer.isascii()
+        position = counted = 0
+
+
+def _iter_file_records(file, chunk_size = DEFAULT_CHUNK_SIZE, skip = 0):
+    """Yields (record, byte offset after the record) for the transaction records of an open text file"""
+
+    # Find the first non whitespace character
+    first = file.read(1)
+    offset = 0
+    while first and first in _WHITESPACE:
+        first = file.read(1)
+        offset += 1
+    if not first:
+        return
+
+    if first == "[":
+        yield from itertools.islice(_iter_json_array(file, "", chunk_size, offset + 1), skip, None)
+    else:
+        yield from _iter_ndjson(file, first + file.readline(), skip, offset)
+
+
+def iter_records(file, chunk_size = DEFAULT_CHUNK_SIZE, skip = 0):
+    """Yields the transaction records (dicts) of an open text file, one at a time
+
+    The layout (NDJSON or JSON array) is detected from the first non whitespace character.
+    The first skip records are not returned (NDJSON lines are skipped without being parsed).
+    """
+
+    for record, _ in _iter_file_records(file, chunk_size, skip):
+        yield record
+
+
+def _is_json_array(file):
+    """Returns True if the binary file holds a JSON array, False for NDJSON (the file position is moved)"""
+
+    first = file.read(1)
+    while first and first.decode("ascii", "replace") in _WHITESPACE:
+        first = file.read(1)
+    return first == b"["
+
+
+def load_transactions(path, chunk_size = DEFAULT_CHUNK_SIZE, stats = None, skip = 0, offset = None):
+    """Lazily yields the (input_asset, output_asset) transactions stored in a file
+
+    Args:
+        path: path to a NDJSON or JSON array transaction history file
+        chunk_size: number of characters read at a time when parsing a JSON array
+        stats: optional LoaderStats object updated while the transactions are consumed
+        skip: number of transactions at the start of the file that are skipped
+              (eg: the ones already applied to a portfolio restored from a snapshot)
+        offset: byte offset where the records to load start (a LoaderStats.offset of a previous load),
+                the file is read from there and skip is not used. The records before it are not read.
+    """
+
+    if stats is not None and offset is not None:
+        stats.offset = offset
+
+    # Read with no newline translation, so the text read matches the bytes of the offsets
+    with io.TextIOWrapper(open(path, "rb"), encoding = "utf-8", newline = "") as file:
+        if offset is None:
+            records = _iter_file_records(file, chunk_size, skip)
+        elif _is_json_array(file.buffer):
+            file.buffer.seek(offset)
+            records = _iter_json_array(file, "", chunk_size, offset)
+        else:
+            file.buffer.seek(offset)
+            records = _iter_ndjson(file.buffer, b"", 0, offset)
+
+        for record, record_end in records:
+            if stats is not None:
+                stats.rows += 1
+                stats.offset = record_end
+            yield record_to_transaction(record)
+
+
+class LoaderStats:
+    """Throughput and memory statistics of a transaction history load"""
+
+    def __init__(self):
+        self.rows = 0
+        # Byte offset in the file after the last record loaded (None before the first one)
+        self.offset = None
+        self.start_time = time.perf_counter()
+        self.end_time = None
+
+    def stop(self):
+        """Stops the load timer"""
+        self.end_time = time.perf_counter()
+
+    def elapsed(self):
+        """Elapsed load time in seconds"""
+        end_time = self.end_time if self.end_time is not None else time.perf_counter()
+        return end_time - self.start_time
+
+    def rows_per_second(self):
+        """Number of loaded rows per second"""
+        elapsed = self.elapsed()
+        return self.rows / elapsed if elapsed > 0 else float("inf")
+
+    @staticmethod
+    def peak_memory():
+        """Peak resident memory of the process in bytes, None if it can not be determined"""
+
+        try:
+            import resource
+        except ImportError:
+            return None
+
+        # ru_maxrss is given in kilobytes on Linux and in bytes on macOS
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+    def __str__(self):
+        """String output"""
+
+        peak = self.peak_memory()
+        peak_text = f"{peak / (1024 * 1024): .1f} MB" if peak is not None else " unknown"
+        return (f"Rows: {self.rows}, Time: {self.elapsed(): .3f} s, "
+                f"Rows/sec: {self.rows_per_second(): .0f}, Peak memory:{peak_text}")
@@ -0,0 +1,291 @@
+"""Compact binary transaction logs with memory mapped replay
+
+A transaction log stores a transaction history as fixed width records, so it can be memory mapped and
+read as NumPy column views with no parsing: a history is replayed with TransactionBatch chunks built
+straight from the mapped columns, without building one Python tuple per transaction.
+
+File layout (little endian):
+    - header (32 bytes): magic "PFTLOG", format version (uint16), record count (uint64),
+      id table offset (uint64), 8 reserved bytes
+    - one 56 bytes record per transaction (RECORD_DTYPE): sequence number (uint64), input timestamp
+      (float64, NaN if None), input quantity, input unit price and output quantity (float64),
+      input id index (uint32), output id index (int32, -1 for investments), input type code (uint8),
+      input currency code (uint8), output type code (uint8) and 5 padding bytes
+    - id table: id count (uint32), then per id its length (uint16) and utf-8 id
+
+Asset ids are interned in the id table, records refer to them by index. Type and currency codes are the
+AssetType and Currency codes. Output legs only have an id, a type and a quantity.
+
+Usage:
+    Convert a JSON (NDJSON or array) transaction history to a transaction log:
+
+        python TransactionLog.py <transaction_history_file.json> <transaction_log_file>
+
+Usage example:
+
+    convert_json("history.json", "history.pftlog")
+    portfolio = Portfolio()
+    replay_log(portfolio, TransactionLog("history.pftlog"))
+"""
+
+import os
+import sys
+import math
+import struct
+import numpy as np
+from Currency import Currency
+from Asset import AssetType, ASSET_CLASSES
+from TransactionBatch import TransactionBatch
+import TransactionLoader
+
+
+MAGIC = b"PFTLOG"
+VERSION = 1
+
+# Transactions per TransactionBatch of a replay
+DEFAULT_CHUNK_SIZE = 1 << 18
+
+_HEADER = struct.Struct("<6sHQQ8x")
+_ID_COUNT = struct.Struct("<I")
+_ID_LENGTH = struct.Struct("<H")
+
+RECORD_DTYPE = np.dtype([
+    ("sequence", "<u8"),
+    ("timestamp", "<f8"),
+    ("input_quantity", "<f8"),
+    ("input_unit_price", "<f8"),
+    ("output_quantity", "<f8"),
+    ("input_id", "<u4"),
+    ("output_id", "<i4"),
+    ("input_type", "u1"),
+    ("input_currency", "u1"),
+    ("output_type", "u1"),
+    ("padding", "V5"),
+])
+
+# Objects of the type and currency codes, indexed by code
+_TYPES = np.array(list(AssetType), dtype = object)
+_CURRENCIES = np.array(list(Currency), dtype = object)
+
+
+class TransactionLogWriter:
+    """Writes a transaction log, one transaction at a time
+
+    The log is written to a temporary file that replaces path on close, so readers never see a partial log.
+    """
+
+    def __init__(self, path, buffer_size = 1 << 16):
+        """Create a writer
+
+        Args:
+            path: transaction log file path
+            buffer_size: records buffered before each write
+        """
+
+        self.path = path
+        self._file = open(path + ".tmp", "wb")
+        self._file.write(_HEADER.pack(MAGIC, VERSION, 0, 0))
+        self._ids = {}
+        self._buffer = np.zeros(buffer_size, dtype = RECORD_DTYPE)
+        self._buffered = 0
+        self.count = 0
+
+    def _id_index(self, asset_id):
+        index = self._ids.get(asset_id)
+        if index is None:
+            index = self._ids[asset_id] = len(self._ids)
+        return index
+
+    def _flush(self):
+        self._file.write(self._buffer[:self._buffered].tobytes())
+        self._buffered = 0
+
+    def write(self, input_asset, output_asset = None):
+        """Appends a transaction"""
+
+        record = self._buffer[self._buffered]
+        record["sequence"] = self.count
+        record["timestamp"] = math.nan if input_asset.timestamp is None else input_asset.timestamp
+        record["input_quantity"] = input_asset.holding
+        record["input_unit_price"] = input_asset.unit_price
+        record["output_quantity"] = output_asset.holding if output_asset is not None else 0
+        record["input_id"] = self._id_index(input_asset.id)
+        record["output_id"] = self._id_index(output_asset.id) if output_asset is not None else -1
+        record["input_type"] = input_asset.type.code
+        record["input_currency"] = input_asset.currency.code
+        record["output_type"] = output_asset.type.code if output_asset is not None else 0
+
+        self.count += 1
+        self._buffered += 1
+        if self._buffered == len(self._buffer):
+            self._flush()
+
+    def write_transactions(self, transaction_list):
+        """Appends (input_asset, output_asset) transactions"""
+
+        for input_asset, output_asset in transaction_list:
+            self.write(input_asset, output_asset)
+
+    def close(self):
+        """Writes the id table and the header, and moves the log to its path"""
+
+        self._flush()
+        id_table_offset = self._file.tell()
+        self._file.write(_ID_COUNT.pack(len(self._ids)))
+        for asset_id in self._ids:
+            encoded_id = asset_id.encode("utf-8")
+            self._file.write(_ID_LENGTH.pack(len(encoded_id)))
+            self._file.write(encoded_id)
+
+        self._file.seek(0)
+        self._file.write(_HEADER.pack(MAGIC, VERSION, self.count, id_table_offset))
+        self._file.close()
+        os.replace(self.path + ".tmp", self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        if exception_type is None:
+            self.close()
+        else:
+            self._file.close()
+            os.remove(self.path + ".tmp")
+
+
+def convert_json(json_path, log_path, chunk_size = TransactionLoader.DEFAULT_CHUNK_SIZE):
+    """Converts a JSON transaction history (see TransactionLoader) to a transaction log
+
+    Returns:
+        the number of transactions written
+    """
+
+    with TransactionLogWriter(log_path) as writer:
+        writer.write_transactions(TransactionLoader.load_transactions(json_path, chunk_size))
+    return writer.count
+
+
+def is_transaction_log(path):
+    """Returns True if the file starts with the transaction log magic"""
+
+    with open(path, "rb") as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+class TransactionLog:
+    """Memory mapped transaction log
+
+    Attributes:
+        records: memory mapped NumPy array of RECORD_DTYPE records
+        ids: NumPy object array of the asset ids, indexed by id index
+    """
+
+    def __init__(self, path):
+        """Maps a transaction log file
+
+        Raises:
+            ValueError: if the file is not a valid transaction log
+        """
+
+        with open(path, "rb") as file:
+            header = file.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                raise ValueError("Invalid transaction log")
+            magic, version, count, id_table_offset = _HEADER.unpack(header)
+            if magic != MAGIC or version != VERSION or id_table_offset != _HEADER.size + count * RECORD_DTYPE.itemsize:
+                raise ValueError("Invalid transaction log")
+
+            file.seek(id_table_offset)
+            data = file.read()
+
+        try:
+            (id_count,) = _ID_COUNT.unpack_from(data, 0)
+            offset = _ID_COUNT.size
+            ids = []
+            for _ in range(id_count):
+                (length,) = _ID_LENGTH.unpack_from(data, offset)
+                offset += _ID_LENGTH.size
+                ids.append(sys.intern(data[offset:offset + length].decode("utf-8")))
+                offset += length
+        except (struct.error, UnicodeDecodeError):
+            raise ValueError("Invalid transaction log")
+
+        # The output id -1 (investments) maps to the last entry, None
+        self.ids = np.array(ids + [None], dtype = object)
+        self.records = (np.memmap(path, dtype = RECORD_DTYPE, mode = "r", offset = _HEADER.size, shape = (count,))
+                        if count > 0 else np.zeros(0, dtype = RECORD_DTYPE))
+
+    def __len__(self):
+        return len(self.records)
+
+    def batch(self, start = 0, stop = None):
+        """Returns the transactions start to stop (exclusive) as a TransactionBatch built from the mapped columns"""
+
+        records = self.records[start:stop]
+        return TransactionBatch(
+            input_ids = self.ids[records["input_id"]],
+            input_holdings = records["input_quantity"],
+            input_unit_prices = records["input_unit_price"],
+            input_currencies = _CURRENCIES[records["input_currency"]],
+            input_timestamps = records["timestamp"],
+            output_ids = self.ids[records["output_id"]],
+            output_holdings = records["output_quantity"],
+            input_types = _TYPES[records["input_type"]])
+
+    def batches(self, chunk_size = DEFAULT_CHUNK_SIZE, start = 0):
+        """Yields the transactions from start as TransactionBatch chunks"""
+
+        for chunk_start in range(start, len(self), chunk_size):
+            yield self.batch(chunk_start, chunk_start + chunk_size)
+
+    def transactions(self, start = 0, chunk_size = DEFAULT_CHUNK_SIZE):
+        """Yields the transactions from start as (input_asset, output_asset) tuples, for Portfolio.transactions
+
+        The records are converted to Python values chunk_size at a time, so memory does not grow with the log.
+        """
+
+        for chunk_start in range(start, len(self), chunk_size):
+            for record in self.records[chunk_start:chunk_start + chunk_size].tolist():
+                (_, timestamp, input_quantity, input_unit_price, output_quantity, input_id, output_id,
+                 input_type, input_currency, output_type, _) = record
+                input_asset = ASSET_CLASSES[_TYPES[input_type]](self.ids[input_id], input_quantity, _CURRENCIES[input_currency],
+                                                                input_unit_price, None if math.isnan(timestamp) else timestamp)
+                output_asset = None
+                if output_id >= 0:
+                    output_asset = ASSET_CLASSES[_TYPES[output_type]](self.ids[output_id], output_quantity)
+                yield (input_asset, output_asset)
+
+
+def replay_log(portfolio, log, chunk_size = DEFAULT_CHUNK_SIZE, replayer = None):
+    """Applies the log transactions after the portfolio sequence (see Portfolio.load_snapshot) in batches
+
+    Each chunk is applied atomically (see Portfolio.batch_transactions).
+
+    Args:
+        portfolio: Portfolio to update
+        log: TransactionLog
+        chunk_size: transactions per batch
+        replayer: ShardedReplayer used to replay the batches in parallel, if None they are replayed in process
+
+    Returns:
+        the number of transactions applied
+    """
+
+    start = portfolio.sequence
+    for batch in log.batches(chunk_size, start):
+        if replayer is not None:
+            replayer.replay(portfolio, batch)
+        else:
+            portfolio.batch_transactions(batch)
+    return max(len(log) - start, 0)
+
+
+if __name__ == "__main__":
+
+    if len(sys.argv) < 3:
+        print("Error: Expecting 2 parameters ")
+        print(" - Usage: python TransactionLog.py <transaction_history_file.json> <transaction_log_file>")
+        exit()
+
+    count = convert_json(sys.argv[1], sys.argv[2])
+    print(f"{count} transactions written to {sys.argv[2]}")
@@ -0,0 +1,138 @@
+"""Validation of a whole list of transactions before applying it
+
+Portfolio.transactions stops at the first rejected transaction, with the transactions before it applied.
+For bulk loads, validate_transactions pre-scans the whole list in one pass with the running holding and
+type of each asset id, and collects every violation with its row, so the list is then applied with one
+of the policies:
+    - ATOMIC: the list is applied only if it has no violation, otherwise a ValidationError with every
+      violation is raised and the portfolio is left unchanged
+    - SKIP: the rows with a violation are skipped and the others applied
+
+Rejected rows are not applied to the running holdings, so the violations after a rejected row are the ones
+the SKIP policy gives. Checked rules are the ones of Portfolio.transaction: no short positions, the input
+and output assets must have the type of their position and, depending on the portfolio:
+    - position history: the transactions must be in timestamp order
+    - exact position store: the quantities must be whole numbers of quantity units
+    - tax lots: the lots to relieve must be found (lots can not be specified in a list, so with the SPECIFIC
+      policy an asset can only be sold while it has a single open lot)
+
+Usage example:
+
+    violations = portfolio.validated_transactions(TransactionLoader.load_transactions("history.json"), SKIP)
+    for violation in violations:
+        print(violation.row, violation.asset_id, violation.message)
+"""
+
+import collections
+from LotLedger import LotCheck
+
+
+ATOMIC = "ATOMIC"
+SKIP = "SKIP"
+POLICIES = (ATOMIC, SKIP)
+
+# Rejected transaction
+#   - row: index of the transaction in the list
+#   - asset_id: id of the asset that violates a rule
+#   - message: rule violated
+Violation = collections.namedtuple("Violation", ["row", "asset_id", "message"])
+
+
+class ValidationError(ValueError):
+    """A list of transactions has violations
+
+    Attributes:
+        violations: list of Violation, by row
+    """
+
+    def __init__(self, violations):
+        first = violations[0]
+        super(ValidationError, self).__init__(f"{len(violations)} rejected transactions, first: "
+                                              f"{first.message}: {first.asset_id} (transaction {first.row})")
+        self.violations = violations
+
+
+def validate_transactions(transaction_list, positions, history = None, lots = None):
+    """Checks a list of transactions against the current positions, without modifying them
+
+    Args:
+        transaction_list: list of (input_asset, output_asset) transactions
+        positions: position store (or any object with get_position) holding the positions before the list
+        history: PositionHistory the transactions are recorded in, None if not tracked
+        lots: LotLedger the transactions open and relieve lots in, None if not tracked
+
+    Returns:
+        (list of the valid rows, list of Violation), both by row
+    """
+
+    # asset_id -> [type, holding], after the valid rows scanned so far
+    running = {}
+
+    def state(asset_id):
+        entry = running.get(asset_id)
+        if entry is None:
+            position = positions.get_position(asset_id)
+            entry = running[asset_id] = [position[0], position[2]] if position is not None else [None, None]
+        return entry
+
+    exact = getattr(positions, "exact", False)
+    last_timestamp = history.last_timestamp if history is not None else None
+    lot_check = LotCheck(lots) if lots is not None else None
+
+    valid_rows = []
+    violations = []
+    for row, (input_asset, output_asset) in enumerate(transaction_list):
+        sold = output_asset is not None and output_asset.holding != 0
+        output_state = state(output_asset.id) if sold else None
+        input_state = state(input_asset.id)
+
+        if sold and (output_state[1] is None or output_state[1] < output_asset.holding):
+            violations.append(Violation(row, output_asset.id, "No short potitions are allowed"))
+            continue
+        if sold and output_state[0] != output_asset.type:
+            violations.append(Violation(row, output_asset.id, "Assest to substract must be of the same type and id"))
+            continue
+        if input_state[0] is not None and input_state[0] != input_asset.type:
+            violations.append(Violation(row, input_asset.id, "Assest to add must be of the same type and id"))
+            continue
+        timestamp = input_asset.timestamp
+        if history is not None and timestamp is not None and timestamp < last_timestamp:
+            violations.append(Violation(row, input_asset.id, "Transactions must be recorded in timestamp order"))
+            continue
+        message = _check_quantities(positions, input_asset, output_asset if sold else None) if exact else None
+        if message is not None:
+            violations.append(Violation(row, message[0], message[1]))
+            continue
+        if sold and lot_check is not None:
+            try:
+                lot_check.check_sell(output_asset.id, output_asset.holding)
+            except ValueError as error:
+                violations.append(Violation(row, output_asset.id, str(error)))
+                continue
+
+        if history is not None and timestamp is not None:
+            last_timestamp = timestamp
+        if lot_check is not None:
+            if sold:
+                lot_check.sell(output_asset.id, output_asset.holding)
+            lot_check.buy(input_asset)
+        if sold:
+            output_state[1] -= output_asset.holding
+        input_state[0] = input_asset.type
+        input_state[1] = input_asset.holding if input_state[1] is None else input_state[1] + input_asset.holding
+        valid_rows.append(row)
+
+    return valid_rows, violations
+
+
+def _check_quantities(positions, input_asset, output_asset):
+    """Returns (asset_id, message) for the first quantity an exact store can not hold, None if both can be held"""
+
+    for asset in (output_asset, input_asset):
+        if asset is None:
+            continue
+        try:
+            positions.check(asset)
+        except ValueError as error:
+            return asset.id, str(error)
+    return None
@@ -0,0 +1,124 @@
+"""Memoized portfolio valuations with dirty tracking
+
+A ValuationCache keeps, for each (currency, pricing system, price version), the price snapshot of the portfolio
+assets, the value and profit of each asset and the total value. Transactions mark the asset ids they touch
+as dirty: the next valuation only re-prices and re-values the dirty assets and updates the total by their
+value deltas, so polling an unchanged (or barely changed) portfolio does not re-price the whole book.
+The total is summed again from the asset values (math.fsum) once the deltas applied reach the number of
+assets, so the rounding of the deltas does not accumulate and the amortized cost of an update stays O(1).
+
+Memoization relies on the price_version attribute of the pricing system, which must change whenever its
+prices or conversion rates change. Pricing systems without price_version are never memoized.
+
+Usage example:
+
+    Asset.pricing_system = CachingPricingSystem(PricingSystem())
+    value = portfolio.get_current_value(Currency.Euros)    # prices the whole book
+    portfolio.transaction(StockAsset("SA1", 10, Currency.Euros, 2), CashAsset("EU", 20))
+    value = portfolio.get_current_value(Currency.Euros)    # only re-prices SA1 and EU
+"""
+
+import math
+from PricingSystem import get_price_snapshot
+
+
+class Valuation:
+    """Memoized valuation of a portfolio in one currency, at one price version"""
+
+    __slots__ = ("prices", "values", "profits", "total", "dirty", "deltas")
+
+    def __init__(self):
+        self.prices = {}
+        self.values = {}
+        self.profits = {}
+        self.total = 0
+        self.dirty = set()
+        # Number of deltas added to the total since it was summed from the values
+        self.deltas = 0
+
+
+class ValuationCache:
+    """Valuations of a portfolio, indexed by (currency, pricing system, price version)"""
+
+    def __init__(self):
+        self._valuations = {}
+
+    def touch(self, asset_ids):
+        """Marks the asset ids whose positions changed"""
+
+        for valuation in self._valuations.values():
+            valuation.dirty.update(asset_ids)
+
+    def clear(self):
+        """Removes every valuation"""
+        self._valuations.clear()
+
+    def __len__(self):
+        return len(self._valuations)
+
+    def valuation(self, portfolio, currency, pricing_system):
+        """Returns the up to date Valuation of the portfolio, None if the pricing system has no price_version
+
+        Valuations of the currency at other price versions are discarded.
+        """
+
+        version = getattr(pricing_system, "price_version", None)
+        if version is None:
+            return None
+
+        key = (currency, pricing_system, version)
+        valuation = self._valuations.get(key)
+        if valuation is None:
+            for old_key in [old_key for old_key in self._valuations if old_key[0] == currency]:
+                del self._valuations[old_key]
+            valuation = self._valuations[key] = Valuation()
+            asset_ids = list(portfolio.get_asset_ids())
+            valuation.prices = get_price_snapshot(pricing_system, asset_ids, currency)
+            valuation.values = {asset_id: portfolio.assets.holding(asset_id) * valuation.prices[asset_id] for asset_id in asset_ids}
+            valuation.total = math.fsum(valuation.values.values())
+
+        elif valuation.dirty:
+            self._update(valuation, portfolio, currency, pricing_system)
+        return valuation
+
+    def _update(self, valuation, portfolio, currency, pricing_system):
+        """Re-values the dirty assets, pricing the ones not priced yet in a single batch"""
+
+        missing = [asset_id for asset_id in valuation.dirty if asset_id not in valuation.prices and asset_id in portfolio.assets]
+        if missing:
+            valuation.prices.update(get_price_snapshot(pricing_system, missing, currency))
+
+        for asset_id in valuation.dirty:
+            valuation.profits.pop(asset_id, None)
+            old_value = valuation.values.pop(asset_id, 0)
+            holding = portfolio.assets.holding(asset_id)
+            if holding is None:
+                valuation.total -= old_value
+                continue
+            value = holding * valuation.prices[asset_id]
+            valuation.values[asset_id] = value
+            valuation.total += value - old_value
+
+        valuation.deltas += len(valuation.dirty)
+        if valuation.deltas >= len(valuation.values):
+            valuation.total = math.fsum(valuation.values.values())
+            valuation.deltas = 0
+        valuation.dirty.clear()
+
+    def current_value(self, portfolio, currency, pricing_system):
+        """Returns the memoized total value of the portfolio, None if the pricing system has no price_version"""
+
+        valuation = self.valuation(portfolio, currency, pricing_system)
+        return valuation.total if valuation is not None else None
+
+    def asset_profit(self, portfolio, asset_id, currency, pricing_system):
+        """Returns the memoized profit of an asset in the portfolio, None if the pricing system has no price_version"""
+
+        valuation = self.valuation(portfolio, currency, pricing_system)
+        if valuation is None:
+            return None
+
+        profit = valuation.profits.get(asset_id)
+        if profit is None:
+            profit = valuation.profits[asset_id] = portfolio.assets[asset_id].profit(currency, valuation.prices[asset_id])
+        return profit
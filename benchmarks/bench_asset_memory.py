@@ -0,0 +1,59 @@
+"""Memory benchmark of the slotted Asset classes against the previous __dict__ based ones
+
+Usage:
+    python benchmarks/bench_asset_memory.py [asset_count] [distinct_ids]
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import time
+import tracemalloc
+from Currency import Currency
+from Asset import AssetType, StockAsset
+
+
+class LegacyAsset:
+    """The previous Asset representation: a per instance __dict__ and no interned ids"""
+
+    def __init__(self, asset_type, id, holding, currency = Currency.Dollars, unit_price = 0, timestamp = None):
+        if holding < 0:
+            raise ValueError("holding must be a non negative value")
+        if unit_price < 0:
+            raise ValueError("holding must be a non negative value")
+
+        self.type = asset_type
+        self.id = id
+        self.currency = currency
+        self.holding = holding
+        self.unit_price = unit_price
+        self.timestamp = timestamp
+
+
+def measure(build, count, distinct_ids):
+    """Builds count assets and returns (bytes per asset, seconds)"""
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    assets = [build(f"STOCK{i % distinct_ids}", float(i), 1.5, float(i)) for i in range(count)]
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del assets
+    return size / count, elapsed
+
+
+if __name__ == "__main__":
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    distinct_ids = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    legacy = measure(lambda id, holding, price, timestamp: LegacyAsset(AssetType.Stock, id, holding, Currency.Dollars, price, timestamp),
+                     count, distinct_ids)
+    slotted = measure(lambda id, holding, price, timestamp: StockAsset(id, holding, Currency.Dollars, price, timestamp),
+                      count, distinct_ids)
+
+    print(f"Assets: {count}, Distinct ids: {distinct_ids}")
+    print(f"__dict__ assets: {legacy[0]: .1f} bytes/asset, {legacy[1]: .3f} s")
+    print(f"Slotted assets:  {slotted[0]: .1f} bytes/asset, {slotted[1]: .3f} s")
@@ -0,0 +1,68 @@
+"""Benchmark of the vectorized batch ingestion against the per tuple transaction loop
+
+Usage:
+    python benchmarks/bench_batch_ingestion.py [transaction_count] [asset_count]
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import time
+import random
+from Currency import Currency
+from Asset import Asset, CashAsset, StockAsset
+import MockPricingSystem
+from Portfolio import Portfolio
+from TransactionBatch import TransactionBatch
+
+
+def generate_transactions(count, asset_count, seed = 0):
+    """Seeded random buy/sell transactions that never go short"""
+
+    generator = random.Random(seed)
+    holdings = [0] * asset_count
+    transactions = [(CashAsset("DOL", 1e12, Currency.Dollars, 1, 0.0), None)]
+    for i in range(count):
+        asset = generator.randrange(asset_count)
+        if holdings[asset] > 0 and generator.random() < 0.4:
+            quantity = generator.randint(1, holdings[asset])
+            holdings[asset] -= quantity
+            transactions.append((CashAsset("DOL", quantity * 5, Currency.Dollars, 1, float(i)), StockAsset(f"S{asset}", quantity)))
+        else:
+            quantity = generator.randint(1, 100)
+            holdings[asset] += quantity
+            currency = Currency.Dollars if generator.random() < 0.8 else Currency.Euros
+            transactions.append((StockAsset(f"S{asset}", quantity, currency, generator.uniform(1, 10), float(i)), CashAsset("DOL", quantity)))
+    return transactions
+
+
+def timed(function):
+    """Runs function and returns (result, elapsed seconds)"""
+
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    asset_count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    Asset.pricing_system = MockPricingSystem.MockPricingSystem()
+    transactions = generate_transactions(count, asset_count)
+
+    loop_portfolio = Portfolio()
+    _, loop_time = timed(lambda: loop_portfolio.transactions(transactions))
+
+    batch, build_time = timed(lambda: TransactionBatch.from_transactions(transactions))
+    batch_portfolio = Portfolio()
+    _, batch_time = timed(lambda: batch_portfolio.batch_transactions(batch))
+
+    difference = abs(loop_portfolio.get_current_value(Currency.Dollars) - batch_portfolio.get_current_value(Currency.Dollars))
+    print(f"Transactions: {len(transactions)}, Assets: {asset_count}")
+    print(f"Per tuple loop:      {loop_time: .3f} s ({len(transactions) / loop_time: .0f} rows/sec)")
+    print(f"Batch (from arrays): {batch_time: .3f} s ({len(transactions) / batch_time: .0f} rows/sec)")
+    print(f"Batch build from tuples: {build_time: .3f} s")
+    print(f"Value difference: {difference: .3e}")
@@ -0,0 +1,109 @@
+"""Benchmark of the fixed point money mode against floats and Decimal
+
+Replays the same seeded synthetic history (single currency, prices in cents) in a float portfolio, in a
+portfolio of Decimal holdings and prices, and in a FixedPointPositionStore portfolio, then values each one.
+The purchase cost of every position is compared with two exact replays (fractions.Fraction) to report the
+rounding drift of each mode: a rational one, and a cent book one where the cost removed by each sale is
+rounded half up to the cent, as the fixed point mode does.
+
+Usage:
+    python benchmarks/bench_fixed_point.py [transaction_count] [asset_count]
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import math
+import time
+import decimal
+import fractions
+from Currency import Currency
+from Asset import Asset
+import MockPricingSystem
+from Portfolio import Portfolio
+from FixedPoint import FixedPointPositionStore
+import synthetic
+
+
+def timed(function):
+    """Runs function and returns (result, elapsed seconds)"""
+
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def best_time(function, repeat = 50):
+    """Runs function repeat times and returns the smallest elapsed seconds"""
+
+    return min(timed(function)[1] for _ in range(repeat))
+
+
+def rounded(asset, number):
+    """Copy of an asset with its holding and unit price rounded to cents, as numbers built by number(str)"""
+
+    if asset is None:
+        return None
+    return type(asset)(asset.id, number(f"{asset.holding:.2f}"), asset.currency, number(f"{asset.unit_price:.2f}"), asset.timestamp)
+
+
+def exact_costs(transactions, cents = False):
+    """Purchase cost of each position with exact rational arithmetic, rounding sold costs to the cent if cents"""
+
+    holdings, costs = {}, {}
+    for input_asset, output_asset in transactions:
+        if output_asset is not None:
+            holding = holdings[output_asset.id]
+            sold_cost = costs[output_asset.id] * output_asset.holding / holding
+            costs[output_asset.id] -= math.floor(sold_cost * 100 + fractions.Fraction(1, 2)) / fractions.Fraction(100) if cents else sold_cost
+            holdings[output_asset.id] = holding - output_asset.holding
+        holdings[input_asset.id] = holdings.get(input_asset.id, 0) + input_asset.holding
+        costs[input_asset.id] = costs.get(input_asset.id, 0) + input_asset.holding * input_asset.unit_price
+    return costs
+
+
+if __name__ == "__main__":
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    asset_count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    Asset.pricing_system = MockPricingSystem.MockPricingSystem()
+    generated = list(synthetic.generate_transactions(count, asset_count, foreign_ratio = 0, initial_cash = 1e9))
+    float_transactions = [(rounded(input_asset, float), rounded(output_asset, float)) for input_asset, output_asset in generated]
+    decimal_transactions = [(rounded(input_asset, decimal.Decimal), rounded(output_asset, decimal.Decimal))
+                            for input_asset, output_asset in generated]
+    fraction_transactions = [(rounded(input_asset, fractions.Fraction), rounded(output_asset, fractions.Fraction))
+                             for input_asset, output_asset in generated]
+    references = [exact_costs(fraction_transactions), exact_costs(fraction_transactions, cents = True)]
+
+    portfolios = {"float": Portfolio(), "Decimal": Portfolio(), "fixed point": Portfolio(FixedPointPositionStore())}
+    transactions = {"float": float_transactions, "Decimal": decimal_transactions, "fixed point": float_transactions}
+
+    print(f"Transactions: {count}, Assets: {asset_count}")
+    for mode, portfolio in portfolios.items():
+        _, replay_time = timed(lambda: portfolio.transactions(transactions[mode]))
+
+        prices = portfolio.get_price_snapshot(Currency.Dollars)
+        if mode == "Decimal":
+            prices = {asset_id: decimal.Decimal(repr(price)) for asset_id, price in prices.items()}
+            value_time = best_time(lambda: sum(asset.holding * prices[asset.id] for asset in portfolio))
+        elif mode == "fixed point":
+            value_time = best_time(lambda: portfolio.assets.current_value_minor(Currency.Dollars, prices))
+            price_units = portfolio.assets.price_units(prices)
+            units_value_time = best_time(lambda: portfolio.assets.current_value_minor(Currency.Dollars, price_units))
+        else:
+            value_time = best_time(lambda: portfolio.get_current_value(Currency.Dollars, prices))
+
+        if mode == "fixed point":
+            costs = {asset_id: fractions.Fraction(int(portfolio.assets.costs[portfolio.assets._index[asset_id]]), 100)
+                     for asset_id in references[0]}
+        else:
+            costs = {asset_id: fractions.Fraction(portfolio.assets.holding(asset_id)) * fractions.Fraction(portfolio.assets[asset_id].unit_price)
+                     for asset_id in references[0]}
+        drifts = [float(max(abs(costs[asset_id] - cost) for asset_id, cost in reference.items())) for reference in references]
+
+        print(f"{mode:12} replay {replay_time: .3f} s ({count / replay_time: .0f} rows/sec), value {value_time * 1e3: .3f} ms, "
+              f"max cost drift: rational {drifts[0]: .3e}, cent book {drifts[1]: .3e}")
+        if mode == "fixed point":
+            print(f"{mode:12} value from price units {units_value_time * 1e3: .3f} ms")
@@ -0,0 +1,51 @@
+"""Benchmark of the sharded parallel replay against the in process batch replay
+
+Usage:
+    python benchmarks/bench_sharded_replay.py [transaction_count] [asset_count] [workers]
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import time
+from Currency import Currency
+from Asset import Asset
+import MockPricingSystem
+from Portfolio import Portfolio
+from TransactionBatch import TransactionBatch
+from ShardedReplay import ShardedReplayer
+import synthetic
+
+
+def timed(function):
+    """Runs function and returns (result, elapsed seconds)"""
+
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    asset_count = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count()
+
+    Asset.pricing_system = MockPricingSystem.MockPricingSystem()
+    batch = TransactionBatch.from_transactions(synthetic.generate_transactions(count, asset_count))
+
+    batch_portfolio = Portfolio()
+    _, batch_time = timed(lambda: batch_portfolio.batch_transactions(batch))
+
+    with ShardedReplayer(max_workers = workers) as replayer:
+        replayer.replay(Portfolio(), TransactionBatch.from_transactions(synthetic.generate_transactions(10, 10)))  # starts the workers
+        sharded_portfolio = Portfolio()
+        _, sharded_time = timed(lambda: replayer.replay(sharded_portfolio, batch))
+
+    value = batch_portfolio.get_current_value(Currency.Dollars)
+    difference = abs(value - sharded_portfolio.get_current_value(Currency.Dollars)) / max(abs(value), 1)
+    print(f"Transactions: {count}, Assets: {asset_count}, Workers: {workers}")
+    print(f"Batch replay:   {batch_time: .3f} s ({count / batch_time: .0f} rows/sec)")
+    print(f"Sharded replay: {sharded_time: .3f} s ({count / sharded_time: .0f} rows/sec)")
+    print(f"Relative value difference: {difference: .3e}")
@@ -0,0 +1,113 @@
+"""Benchmark of the portfolio_info.py startup and request latency, with and without the PortfolioServer daemon
+
+Measures, over repeated runs on a seeded synthetic history:
+    - the import time of portfolio_info (thin client imports) and of the full set of modules
+    - the wall time of a standalone portfolio_info.py process (startup, imports, pricing setup, replay, report)
+    - the wall time of a portfolio_info.py --server client process against a running daemon
+    - the latency of a request sent from this process to the daemon (no interpreter startup)
+
+Usage:
+    python benchmarks/bench_startup.py [transaction_count] [asset_count] [runs]
+"""
+
+import os
+import sys
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(ROOT_DIR)
+
+import json
+import math
+import time
+import socket
+import shutil
+import tempfile
+import statistics
+import subprocess
+import synthetic
+from bench_transaction_log import asset_record
+
+
+def wall_times(command, runs):
+    """Runs a command runs times and returns the wall time of each run in seconds"""
+
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, check = True, stdout = subprocess.DEVNULL, cwd = ROOT_DIR)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def wait_for_server(socket_path, timeout = 30):
+    """Waits until the server accepts connections (the socket file exists before the server listens)
+
+    Raises:
+        TimeoutError: if the server does not accept a connection within timeout seconds
+    """
+
+    deadline = time.monotonic() + timeout
+    while True:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            try:
+                connection.connect(socket_path)
+                return
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Server not ready on {socket_path}")
+        time.sleep(0.01)
+
+
+def summary(times):
+    """Median and p90 (nearest rank) of times, in milliseconds"""
+
+    times = sorted(times)
+    p90 = times[math.ceil(0.9 * len(times)) - 1]
+    return f"median {statistics.median(times) * 1e3: 8.1f} ms, p90 {p90 * 1e3: 8.1f} ms"
+
+
+if __name__ == "__main__":
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    asset_count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    runs = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    directory = tempfile.mkdtemp()
+    history_path = os.path.join(directory, "history.json")
+    socket_path = os.path.join(directory, "server.sock")
+    with open(history_path, "w") as file:
+        for input_asset, output_asset in synthetic.generate_transactions(count, asset_count):
+            file.write(json.dumps({"input": asset_record(input_asset), "output": asset_record(output_asset)}) + "\n")
+
+    python = sys.executable
+    client_import = wall_times([python, "-c", "import portfolio_info"], runs)
+    full_import = wall_times([python, "-c", "import portfolio_info, Portfolio, PortfolioDatabase, TransactionLog, Metrics"], runs)
+    standalone = wall_times([python, "portfolio_info.py", history_path, "DOL"], runs)
+
+    server = subprocess.Popen([python, "PortfolioServer.py", socket_path], cwd = ROOT_DIR, stdout = subprocess.DEVNULL)
+    try:
+        wait_for_server(socket_path)
+
+        import portfolio_info
+        arguments = portfolio_info.parse_arguments([history_path, "DOL", "--server", socket_path])
+        first_start = time.perf_counter()
+        portfolio_info.request_server(socket_path, arguments)
+        first_request = time.perf_counter() - first_start
+
+        client = wall_times([python, "portfolio_info.py", history_path, "DOL", "--server", socket_path], runs)
+        requests = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            portfolio_info.request_server(socket_path, arguments)
+            requests.append(time.perf_counter() - start)
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(directory)
+
+    print(f"Transactions: {count}, Assets: {asset_count}, Runs: {runs}")
+    print(f"Client imports (python -c 'import portfolio_info'): {summary(client_import)}")
+    print(f"Full imports:                                       {summary(full_import)}")
+    print(f"Standalone portfolio_info.py process:               {summary(standalone)}")
+    print(f"First daemon request (replay):                      {first_request * 1e3: 8.1f} ms")
+    print(f"portfolio_info.py --server client process:          {summary(client)}")
+    print(f"Daemon request latency (in process client):         {summary(requests)}")
@@ -0,0 +1,73 @@
+"""Benchmark of the binary transaction log replay against the JSON transaction history load
+
+Writes the same seeded synthetic history as NDJSON and as a transaction log, then compares the file sizes
+and the time to rebuild the portfolio from each one.
+
+Usage:
+    python benchmarks/bench_transaction_log.py [transaction_count] [asset_count]
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import json
+import time
+import tempfile
+from Currency import Currency
+from Asset import Asset
+import MockPricingSystem
+from Portfolio import Portfolio
+import TransactionLoader
+import TransactionLog
+import synthetic
+
+
+def asset_record(asset):
+    """JSON record of an asset (see TransactionLoader)"""
+
+    if asset is None:
+        return None
+    return {"type": asset.type.value, "id": asset.id, "holding": asset.holding, "currency": asset.currency.value,
+            "unit_price": asset.unit_price, "timestamp": asset.timestamp}
+
+
+def timed(function):
+    """Runs function and returns (result, elapsed seconds)"""
+
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    asset_count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    Asset.pricing_system = MockPricingSystem.MockPricingSystem()
+    directory = tempfile.mkdtemp()
+    json_path = os.path.join(directory, "history.json")
+    log_path = os.path.join(directory, "history.pftlog")
+
+    with open(json_path, "w") as file:
+        for input_asset, output_asset in synthetic.generate_transactions(count, asset_count):
+            file.write(json.dumps({"input": asset_record(input_asset), "output": asset_record(output_asset)}) + "\n")
+    _, convert_time = timed(lambda: TransactionLog.convert_json(json_path, log_path))
+
+    json_portfolio = Portfolio()
+    _, json_time = timed(lambda: json_portfolio.transactions(TransactionLoader.load_transactions(json_path)))
+    log_portfolio = Portfolio()
+    _, log_time = timed(lambda: TransactionLog.replay_log(log_portfolio, TransactionLog.TransactionLog(log_path)))
+
+    json_value = json_portfolio.get_current_value(Currency.Dollars)
+    difference = abs(json_value - log_portfolio.get_current_value(Currency.Dollars)) / max(abs(json_value), 1)
+    print(f"Transactions: {count}, Assets: {asset_count}")
+    print(f"NDJSON:          {os.path.getsize(json_path) / 2 ** 20: .1f} MiB, load and replay {json_time: .3f} s ({count / json_time: .0f} rows/sec)")
+    print(f"Transaction log: {os.path.getsize(log_path) / 2 ** 20: .1f} MiB, map and replay  {log_time: .3f} s ({count / log_time: .0f} rows/sec)")
+    print(f"Conversion time: {convert_time: .3f} s")
+    print(f"Relative value difference: {difference: .3e}")
+
+    os.remove(json_path)
+    os.remove(log_path)
+    os.rmdir(directory)
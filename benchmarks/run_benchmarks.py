@@ -0,0 +1,195 @@
+"""Benchmark suite of the replay, valuation and profit hot paths
+
+Every benchmark runs on seeded synthetic histories (see synthetic.py), so two runs with the same parameters
+measure the same work. Each benchmark is timed (best of --repeat runs, without tracing) and then run once more
+under tracemalloc to get its peak memory and the memory blocks it allocated.
+
+Benchmarks:
+    - replay: Portfolio.transactions on the history, streamed in chunks (only the replay is timed)
+    - current_value: Portfolio.get_current_value of the replayed portfolio, with no memoized valuation
+    - current_value_memoized: Portfolio.get_current_value of the replayed portfolio, already valued
+    - asset_profit: Asset.profit of every asset of the replayed portfolio, one pricing request each
+    - asset_add / asset_sub: Asset.__add__ / Asset.__sub__ on seeded pairs of assets
+
+The pricing system is a LatencyMockPricingSystem, with the --latency seconds per request.
+Results are printed and written as JSON with --output. With --compare, the results are compared to a
+previous JSON output and the benchmarks slower than --threshold are reported (exit code 1).
+
+Usage:
+    python benchmarks/run_benchmarks.py [--transactions N] [--assets N] [--seed N] [--latency SECONDS]
+                                        [--repeat N] [--output FILE.json] [--compare BASELINE.json]
+
+Example (regression check between two commits):
+    python benchmarks/run_benchmarks.py --transactions 1000000 --assets 100000 --output base.json
+    git checkout feature
+    python benchmarks/run_benchmarks.py --transactions 1000000 --assets 100000 --compare base.json
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import json
+import time
+import platform
+import argparse
+import itertools
+import subprocess
+import tracemalloc
+import numpy as np
+from Currency import Currency
+from Asset import Asset
+import MockPricingSystem
+from Portfolio import Portfolio
+import synthetic
+
+
+# Transactions replayed per chunk, so histories of any size can be streamed
+CHUNK_SIZE = 100000
+
+
+def parse_arguments(argv):
+    """Parses the command line arguments"""
+
+    parser = argparse.ArgumentParser(description = "Benchmark suite of the replay, valuation and profit hot paths")
+    parser.add_argument("--transactions", type = int, default = 100000, help = "transactions of the history (1e3 to 1e7)")
+    parser.add_argument("--assets", type = int, default = 1000, help = "distinct asset ids (10 to 1e6)")
+    parser.add_argument("--seed", type = int, default = 0, help = "random seed of the synthetic data")
+    parser.add_argument("--latency", type = float, default = 0.0, help = "seconds waited by each pricing request")
+    parser.add_argument("--pairs", type = int, default = 100000, help = "asset pairs of the add/substract benchmarks")
+    parser.add_argument("--repeat", type = int, default = 3, help = "timed runs of each benchmark, the best one is kept")
+    parser.add_argument("--output", help = "JSON results file")
+    parser.add_argument("--compare", help = "JSON results file of a previous run to compare with")
+    parser.add_argument("--threshold", type = float, default = 0.1, help = "relative slowdown reported as a regression")
+    return parser.parse_args(argv)
+
+
+def replay(arguments):
+    """Replays the synthetic history and returns (portfolio, seconds spent in Portfolio.transactions)"""
+
+    portfolio = Portfolio()
+    transactions = synthetic.generate_transactions(arguments.transactions, arguments.assets, arguments.seed)
+    elapsed = 0.0
+    while True:
+        chunk = list(itertools.islice(transactions, CHUNK_SIZE))
+        if not chunk:
+            return portfolio, elapsed
+        start = time.perf_counter()
+        portfolio.transactions(chunk)
+        elapsed += time.perf_counter() - start
+
+
+def measure(run, repeat, self_timed = False):
+    """Times run, a function with no arguments (returning the seconds to report if self_timed)
+
+    Returns:
+        dict with the best seconds of the repeated runs, and the peak memory and allocated blocks
+        of a traced run
+    """
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        seconds = run()
+        timings.append(seconds if self_timed else time.perf_counter() - start)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    run()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    allocated_blocks = sum(max(stat.count_diff, 0) for stat in after.compare_to(before, "filename"))
+
+    return {"seconds": min(timings), "peak_bytes": peak, "allocated_blocks": allocated_blocks}
+
+
+def run_benchmarks(arguments):
+    """Runs every benchmark and returns the results dict"""
+
+    Asset.pricing_system = MockPricingSystem.LatencyMockPricingSystem(arguments.latency)
+    currency = Currency.Euros
+    results = {}
+
+    results["replay"] = measure(lambda: replay(arguments)[1], arguments.repeat, self_timed = True)
+    results["replay"]["operations"] = arguments.transactions
+
+    portfolio, _ = replay(arguments)
+    assets = list(portfolio)
+
+    def cold_value():
+        portfolio.valuations.clear()
+        return portfolio.get_current_value(currency)
+
+    results["current_value"] = measure(cold_value, arguments.repeat)
+    results["current_value"]["operations"] = 1
+    results["current_value_memoized"] = measure(lambda: portfolio.get_current_value(currency), arguments.repeat)
+    results["current_value_memoized"]["operations"] = 1
+
+    results["asset_profit"] = measure(lambda: [asset.profit(currency) for asset in assets], arguments.repeat)
+    results["asset_profit"]["operations"] = len(assets)
+
+    pairs = synthetic.generate_asset_pairs(arguments.pairs, arguments.assets, arguments.seed)
+    results["asset_add"] = measure(lambda: [first + second for first, second in pairs], arguments.repeat)
+    results["asset_add"]["operations"] = len(pairs)
+    results["asset_sub"] = measure(lambda: [first - second for first, second in pairs], arguments.repeat)
+    results["asset_sub"]["operations"] = len(pairs)
+
+    for result in results.values():
+        result["operations_per_second"] = result["operations"] / max(result["seconds"], 1e-12)
+    return results
+
+
+def git_commit():
+    """Returns the current git commit of the repository, None if not available"""
+
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output = True, text = True, check = True,
+                              cwd = os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Prints the change of each benchmark against the baseline results and returns the regressed benchmarks"""
+
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        change = result["seconds"] / max(baseline[name]["seconds"], 1e-12) - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:24s} {baseline[name]['seconds']: .4f} s -> {result['seconds']: .4f} s ({change:+.1%}){flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+
+    arguments = parse_arguments(sys.argv[1:])
+    results = run_benchmarks(arguments)
+
+    for name, result in results.items():
+        print(f"{name:24s} {result['seconds']: .4f} s, {result['operations_per_second']: .0f} ops/sec, "
+              f"peak {result['peak_bytes'] / 2 ** 20: .1f} MiB, {result['allocated_blocks']} blocks")
+
+    output = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "parameters": {name: getattr(arguments, name) for name in ["transactions", "assets", "seed", "latency", "pairs", "repeat"]},
+        "results": results,
+    }
+    if arguments.output is not None:
+        with open(arguments.output, "w") as file:
+            json.dump(output, file, indent = 2)
+
+    if arguments.compare is not None:
+        with open(arguments.compare) as file:
+            baseline = json.load(file)
+        if baseline["parameters"] != output["parameters"]:
+            print("Warning: the baseline was run with other parameters")
+        if compare(results, baseline["results"], arguments.threshold):
+            sys.exit(1)
@@ -0,0 +1,89 @@
+"""Seeded synthetic transaction histories for the benchmarks
+
+The same (count, asset_count, seed) always gives the same history, so results can be compared between commits.
+Histories mix bonds and stocks bought in dollars and euros, start with one large cash investment per
+currency and never go short. They are generated lazily, so 1e7 transactions do not need to fit in memory.
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import random
+from Currency import Currency
+from Asset import CashAsset, BondAsset, StockAsset
+
+
+# Cash of the initial investments, large enough to fund every purchase
+INITIAL_CASH = 1e15
+
+# Cash asset id of each currency
+CASH_IDS = {Currency.Dollars: "DOL", Currency.Euros: "EU"}
+
+
+def asset_id(index):
+    """Id of a synthetic asset: even indices are bonds, odd indices are stocks"""
+    return f"BOND{index}" if index % 2 == 0 else f"STOCK{index}"
+
+
+def asset_class(index):
+    """Asset class of a synthetic asset"""
+    return BondAsset if index % 2 == 0 else StockAsset
+
+
+def generate_transactions(count, asset_count, seed = 0, sell_ratio = 0.4, foreign_ratio = 0.2, initial_cash = INITIAL_CASH):
+    """Yields count seeded (input_asset, output_asset) transactions over asset_count distinct assets
+
+    Args:
+        count: number of transactions, including the initial investments
+        asset_count: number of distinct non cash asset ids
+        seed: random seed
+        sell_ratio: probability that a transaction sells part of an asset held
+        foreign_ratio: probability that an asset is bought in the other currency than its first purchase
+        initial_cash: cash of the initial investments
+
+    The timestamps are the transaction numbers.
+    """
+
+    generator = random.Random(seed)
+    holdings = [0] * asset_count
+    currencies = [Currency.Dollars if generator.random() < 0.6 else Currency.Euros for _ in range(asset_count)]
+
+    for number, currency in enumerate(list(CASH_IDS)[:count]):
+        yield (CashAsset(CASH_IDS[currency], initial_cash, currency, 1, float(number)), None)
+
+    for number in range(len(CASH_IDS), count):
+        index = generator.randrange(asset_count)
+        currency = currencies[index]
+        if holdings[index] > 0 and generator.random() < sell_ratio:
+            quantity = generator.randint(1, holdings[index])
+            holdings[index] -= quantity
+            yield (CashAsset(CASH_IDS[currency], quantity * generator.uniform(1, 10), currency, 1, float(number)),
+                   asset_class(index)(asset_id(index), quantity))
+        else:
+            if generator.random() < foreign_ratio:
+                currency = Currency.Euros if currency == Currency.Dollars else Currency.Dollars
+            quantity = generator.randint(1, 100)
+            unit_price = generator.uniform(1, 10)
+            holdings[index] += quantity
+            yield (asset_class(index)(asset_id(index), quantity, currency, unit_price, float(number)),
+                   CashAsset(CASH_IDS[currency], quantity * unit_price))
+
+
+def generate_asset_pairs(count, asset_count, seed = 0):
+    """Returns count seeded pairs of assets with the same id and type, to add and substract them
+
+    The holding of the second asset of a pair is never greater than the first one.
+    """
+
+    generator = random.Random(seed)
+    pairs = []
+    for _ in range(count):
+        index = generator.randrange(asset_count)
+        assets = []
+        for holding_range in [(50, 100), (1, 50)]:
+            currency = Currency.Dollars if generator.random() < 0.8 else Currency.Euros
+            assets.append(asset_class(index)(asset_id(index), generator.randint(*holding_range), currency,
+                                             generator.uniform(1, 10), generator.uniform(0, 1e6)))
+        pairs.append(tuple(assets))
+    return pairs
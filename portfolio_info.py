@@ -4,68 +4,247 @@ Usage:
     From the console, go to the directory where this file is located ($ROOT_DIR):
 
         cd $ROOT_DIR
-    
+
     and execute this script
 
-        python portfolio_info.py <transaction_history_file.json> <DOL|EUR>
+        python portfolio_info.py <transaction_history_file.json> <DOL|EUR> [--stats] [--checkpoint FILE]
+                                 [--database FILE [--portfolio-id ID]] [--skip-invalid] [--profile dict|prometheus|cprofile] [--profile-file FILE]
+                                 [--server SOCKET]
+
+    Example:
+        python portfolio_info.py transactions_example.json DOL
 
-    Example: 
-        python portfolio_info.py FILE.json DOL
-    
-    Important! for the purpuse of this excersise, the transactions file is ignored and a fixed set of transactions is loaded
+    The transaction history can be a NDJSON file or a JSON array (see TransactionLoader).
+    It is streamed one transaction at a time, so memory stays flat regardless of its size.
+    It can also be a binary transaction log (see TransactionLog), memory mapped and replayed in batches.
+    With --stats, the load rows/sec and peak memory are reported.
+    With --checkpoint, the portfolio is restored from the snapshot FILE (if it exists), only the transactions
+    after it are replayed and the snapshot is updated, so daily runs only cost the new transactions.
+    With --database, the portfolio --portfolio-id is restored from the SQLite database FILE (see PortfolioDatabase),
+    the transactions not stored yet are replayed and appended to it, and its positions are saved.
+    With --skip-invalid, each chunk of transactions is validated before being applied (see TransactionValidation):
+    the rejected transactions are reported on stderr and skipped instead of stopping the load.
+    With --profile, the run is instrumented (see Metrics) and the metrics are printed as a dict or in
+    the Prometheus text format, or the run is profiled with cProfile and the stats dumped to --profile-file.
+    With --server, the arguments are sent to a PortfolioServer daemon on the Unix socket SOCKET, which keeps
+    the pricing cache warm and the portfolios loaded, and its reply is printed: only this module and argparse
+    are imported by the client.
 
 """
 
+import os
 import sys
-import Portfolio
-from Currency import Currency
-from Asset import BondAsset, StockAsset, CashAsset, AssetType, Asset
-import MockPricingSystem 
-import time
-import datetime
+import argparse
+
+# The heavy modules (NumPy, the portfolio and pricing modules) are imported by the functions that need them,
+# so the --server client starts with the interpreter and argparse only
+
+
+def parse_arguments(argv):
+    """Parses the command line arguments"""
+
+    parser = argparse.ArgumentParser(description = "Get the info of a portfolio loading its transaction history")
+    parser.add_argument("transaction_history_file", help = "NDJSON, JSON array or binary transaction log history file")
+    parser.add_argument("currency", choices = ["DOL", "EUR"], help = "valuation currency")
+    parser.add_argument("--stats", action = "store_true", help = "report load rows/sec and peak memory")
+    storage = parser.add_mutually_exclusive_group()
+    storage.add_argument("--checkpoint", help = "portfolio snapshot file, restored before and saved after the replay")
+    storage.add_argument("--database", help = "SQLite portfolio database, restored before and updated after the replay")
+    parser.add_argument("--portfolio-id", default = "default", help = "id of the portfolio in the database")
+    parser.add_argument("--skip-invalid", action = "store_true",
+                        help = "validate the transactions, skip (and report) the rejected ones instead of stopping")
+    parser.add_argument("--profile", choices = ["dict", "prometheus", "cprofile"],
+                        help = "report the run metrics as a dict or in Prometheus text format, or profile it with cProfile")
+    parser.add_argument("--profile-file", default = "portfolio_info.prof", help = "cProfile stats output file")
+    parser.add_argument("--server", metavar = "SOCKET",
+                        help = "send the request to the PortfolioServer daemon listening on this Unix socket")
+    arguments = parser.parse_args(argv)
+    if arguments.server is not None and arguments.profile is not None:
+        parser.error("--profile can not be used with --server")
+    return arguments
+
+
+def create_pricing_system():
+    """Returns the pricing system of the runs: the MOCK pricing system, instrumented and cached"""
+
+    import MockPricingSystem
+    from CachingPricingSystem import CachingPricingSystem
+    from Metrics import InstrumentedPricingSystem
+
+    return CachingPricingSystem(InstrumentedPricingSystem(MockPricingSystem.MockPricingSystem()))
+
+
+def load_portfolio(arguments, stats, log = None):
+    """Builds the portfolio of the arguments: restores it (checkpoint or database) and replays its history
+
+    Args:
+        arguments: parsed command line arguments (see parse_arguments)
+        stats: TransactionLoader.LoaderStats updated with the number of replayed rows
+        log: file where the skipped transactions are reported, sys.stderr if None
+    """
+
+    import itertools
+    import Portfolio
+    import TransactionLoader
+    import TransactionLog
+    from PortfolioDatabase import PortfolioDatabase
+    from TransactionValidation import SKIP
+
+    database = None
+    if arguments.database is not None:
+        database = PortfolioDatabase(arguments.database)
+        portfolio = database.load_portfolio(arguments.portfolio_id)
+    elif arguments.checkpoint is not None and os.path.exists(arguments.checkpoint):
+        portfolio = Portfolio.Portfolio.load_snapshot(arguments.checkpoint)
+    else:
+        portfolio = Portfolio.Portfolio()
+
+    # Register transaction history of the portfolio (after the checkpoint), streaming it from the input file,
+    # or replaying it in batches from the memory mapped binary transaction log.
+    # With a database or --skip-invalid, the new transactions are applied one chunk at a time,
+    # appended to the database and/or validated before being applied.
+    # A portfolio restored from a snapshot seeks to the history file offset saved in it (if known), and the
+    # offset after the last record read is saved in the new snapshot
+    loader_stats = TransactionLoader.LoaderStats()
+    if database is not None or arguments.skip_invalid:
+        # Row in the file of the first transaction after the checkpoint (the skipped rows are numbered in the file)
+        first_row = portfolio.sequence
+        if TransactionLog.is_transaction_log(arguments.transaction_history_file):
+            transactions = TransactionLog.TransactionLog(arguments.transaction_history_file).transactions(portfolio.sequence)
+        else:
+            transactions = TransactionLoader.load_transactions(arguments.transaction_history_file, stats = loader_stats,
+                                                               skip = portfolio.sequence, offset = portfolio.snapshot_offset)
+        for chunk in iter(lambda: list(itertools.islice(transactions, TransactionLoader.DEFAULT_CHUNK_SIZE)), []):
+            if arguments.skip_invalid:
+                for violation in portfolio.validated_transactions(chunk, SKIP):
+                    print(f"Skipped transaction {first_row + stats.rows + violation.row}: {violation.message}: {violation.asset_id}",
+                          file = log if log is not None else sys.stderr)
+            else:
+                portfolio.transactions(chunk)
+            if database is not None:
+                database.append_transactions(arguments.portfolio_id, chunk)
+            stats.rows += len(chunk)
+        if database is not None:
+            database.save_portfolio(arguments.portfolio_id, portfolio)
+    elif TransactionLog.is_transaction_log(arguments.transaction_history_file):
+        stats.rows = TransactionLog.replay_log(portfolio, TransactionLog.TransactionLog(arguments.transaction_history_file))
+    else:
+        portfolio.transactions(TransactionLoader.load_transactions(arguments.transaction_history_file, stats = stats,
+                                                                   skip = portfolio.sequence, offset = portfolio.snapshot_offset))
+        loader_stats = stats
+    if arguments.checkpoint is not None:
+        portfolio.save_snapshot(arguments.checkpoint, loader_stats.offset)
+    if database is not None:
+        database.close()
+    return portfolio
+
+
+def report(portfolio, currency_name, stats = None):
+    """Returns the info of the portfolio as text
+
+    Args:
+        portfolio: Portfolio to value
+        currency_name: valuation currency, DOL or EUR
+        stats: TransactionLoader.LoaderStats of the load, reported with the pricing cache stats if not None
+    """
+
+    import io
+    from Currency import Currency
+    from Asset import Asset
+
+    currency = Currency.Dollars if currency_name == "DOL" else Currency.Euros
+    output = io.StringIO()
+
+    # Get the current value and profits of the portfolio, with a single price snapshot and conversion matrix
+    prices = portfolio.get_price_snapshot(currency)
+    current_value = portfolio.get_current_value(currency, prices)
+    profits = portfolio.get_asset_profits(currency, prices)
 
-if __name__ == "__main__":
-    
-    if len(sys.argv) < 3:
-        print("Error: Expecting 2 parameters ")
-        print(" - Usage: python portfolio_info.py <transaction_history_file.json> <DOL|EUR>")
-        exit()
-
-    # Define currency, pricing system (MOCK), and create empy portfolio
-    currency = Currency.Dollars if sys.argv[2] == "DOL" else Currency.Euros
-    Asset.pricing_system = MockPricingSystem.MockPricingSystem()
-    portfolio = Portfolio.Portfolio()
-
-    # This transaction list should have been loaded from the imput file 
-    ts1 = time.mktime(datetime.datetime.strptime("01/01/2020", "%d/%m/%Y").timetuple())
-    ts2 = time.mktime(datetime.datetime.strptime("14/02/2020", "%d/%m/%Y").timetuple())
-    ts3 = time.mktime(datetime.datetime.strptime("15/03/2020", "%d/%m/%Y").timetuple())
-    transactions_list = [ 
-                            (CashAsset("DOL", 1000, Currency.Dollars, 1, ts1), None),                        # Initial investment
-                            (CashAsset("EU", 1000, Currency.Euros, 1, ts1), None),                           # Initial investment
-                            (BondAsset("BOND1", 50, Currency.Dollars, 3.2, ts2), CashAsset("DOL", 160)),     # Buy Bond
-                            (BondAsset("STOCK1", 60, Currency.Euros, 2.1, ts2), CashAsset("EU", 126)),       # Buy Stock
-                            (CashAsset("DOL", 240, Currency.Dollars, 1, ts3), BondAsset("BOND1", 40)),       # Sell Bond
-                        ]
-
-    # Register transaction history of the portfolio
-    portfolio.transactions(transactions_list)
-
-    # Get the current value and assets ot the portfolio
-    current_value = portfolio.get_current_value(currency)
-    
     # Print portfolio info, value and individual profits
-    print("\r\n#########################################################\r\n")
-    print(f"Portfolio value: {current_value: .3f} {currency.name}")
+    print("\r\n#########################################################\r\n", file = output)
+    print(f"Portfolio value: {current_value: .3f} {currency.name}", file = output)
     for asset in portfolio:
         asset_id = asset.id
         asset_type = asset.type
         asset_holding = asset.holding
-        asset_profit = asset.profit(currency)
-        asset_value = asset.current_value(currency)
-        print(f"   - Asset id: {asset_id}, Asset type: {asset_type.name}, Asset holding: {asset_holding}, ", end = "" )
-        print(f"Current Value: {asset_value: .3f} {currency.name}, Asset profit: {asset_profit: .3f} {currency.name}")
+        asset_profit = profits[asset_id]
+        asset_value = asset.current_value(currency, prices[asset_id])
+        print(f"   - Asset id: {asset_id}, Asset type: {asset_type.name}, Asset holding: {asset_holding}, ", end = "", file = output)
+        print(f"Current Value: {asset_value: .3f} {currency.name}, Asset profit: {asset_profit: .3f} {currency.name}", file = output)
+
+    print("\r\n#########################################################\r\n", file = output)
+
+    if stats is not None:
+        print(f"Load stats: {stats}", file = output)
+        print(f"Pricing cache stats: {Asset.pricing_system.stats()}", file = output)
+    return output.getvalue()
+
+
+def main(arguments):
+    """Prints the info of the portfolio"""
+
+    import TransactionLoader
+    from Asset import Asset
+
+    Asset.pricing_system = create_pricing_system()
+    stats = TransactionLoader.LoaderStats()
+    portfolio = load_portfolio(arguments, stats)
+    stats.stop()
+    print(report(portfolio, arguments.currency, stats if arguments.stats else None), end = "")
+
 
-    print("\r\n#########################################################\r\n")
+def request_server(socket_path, arguments):
+    """Sends the arguments to a PortfolioServer daemon and returns the info text it replies
+
+    The skipped transactions reported by the server are written to stderr.
+
+    Raises:
+        RuntimeError: if the server could not build the info
+    """
+
+    import json
+    import socket
+
+    request = {name: value for name, value in vars(arguments).items() if name not in ("server", "profile", "profile_file")}
+    for name in ("transaction_history_file", "checkpoint", "database"):
+        if request[name] is not None:
+            request[name] = os.path.abspath(request[name])
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        connection.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        connection.shutdown(socket.SHUT_WR)
+        with connection.makefile("rb") as reply_file:
+            reply = json.loads(reply_file.read())
+
+    if "error" in reply:
+        raise RuntimeError(reply["error"])
+    sys.stderr.write(reply.get("log", ""))
+    return reply["output"]
+
+
+if __name__ == "__main__":
 
+    arguments = parse_arguments(sys.argv[1:])
 
+    if arguments.server is not None:
+        try:
+            print(request_server(arguments.server, arguments), end = "")
+        except (OSError, RuntimeError) as error:
+            print(f"Error: {error}", file = sys.stderr)
+            sys.exit(1)
+    elif arguments.profile == "cprofile":
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.runcall(main, arguments)
+        profiler.dump_stats(arguments.profile_file)
+        print(f"cProfile stats written to {arguments.profile_file}")
+    else:
+        from Metrics import METRICS
+        METRICS.enabled = arguments.profile is not None
+        main(arguments)
+        if arguments.profile == "dict":
+            import pprint
+            pprint.pprint(METRICS.snapshot())
+        elif arguments.profile == "prometheus":
+            print(METRICS.prometheus(), end = "")
@@ -0,0 +1,15 @@
+"""Transaction history shared by the tests"""
+
+import sys
+sys.path.append("../")
+
+from Currency import Currency
+from Asset import CashAsset, BondAsset
+
+transactions_list = [
+                        (CashAsset("DOL", 1000, Currency.Dollars, 1), None),                        # Initial investment
+                        (CashAsset("EU", 1000, Currency.Euros, 1), None),                           # Initial investment
+                        (BondAsset("BOND1", 50, Currency.Dollars, 3.2), CashAsset("DOL", 160)),     # Buy Bond
+                        (BondAsset("STOCK1", 60, Currency.Euros, 2.1), CashAsset("EU", 126)),       # Buy Stock
+                        (CashAsset("DOL", 240, Currency.Dollars, 1), BondAsset("BOND1", 40)),       # Sell Bond
+                    ]
@@ -3,9 +3,10 @@
 import sys
 sys.path.append("../")
 
+import pickle
 import unittest
 from Currency import Currency
-from  Asset import Asset, CashAsset, BondAsset, StockAsset 
+from  Asset import Asset, AssetType, CashAsset, BondAsset, StockAsset 
 import MockPricingSystem
 
 class TestAsset(unittest.TestCase):
@@ -108,7 +109,41 @@ class TestAsset(unittest.TestCase):
         self.assertEqual(self.stock_asset_1.profit(), 140)
         self.assertEqual(self.stock_asset_1.profit(Currency.Euros), 146)
         self.assertEqual(self.stock_asset_1.profit(Currency.Dollars), 140)
-    
+
+    def test_compact_representation(self):
+        """Test assets have no __dict__, interned ids and enum codes"""
+
+        self.assertFalse(hasattr(self.cash_asset_1, "__dict__"))
+        self.assertIs(CashAsset("".join(["C", "A1"]), 1).id, self.cash_asset_1.id)
+        for asset_type in AssetType:
+            self.assertIs(AssetType.from_code(asset_type.code), asset_type)
+        for currency in Currency:
+            self.assertIs(Currency.from_code(currency.code), currency)
+
+    def test_subclass_arithmetic(self):
+        """Test the class of the assets survives arithmetic"""
+
+        self.assertIsInstance(self.cash_asset_1 + self.cash_asset_2, CashAsset)
+        self.assertIsInstance(self.stock_asset_4 - self.stock_asset_1, StockAsset)
+        self.assertIsInstance(self.bond_asset_1 + self.bond_asset_2, BondAsset)
+
+    def test_freeze(self):
+        """Test frozen assets can not be modified, can be hashed, copied and pickled"""
+
+        asset = BondAsset("BA1", 20, Currency.Euros, 3).freeze()
+        self.assertTrue(asset.frozen)
+        self.assertIsInstance(asset, BondAsset)
+        self.assertEqual(asset, self.bond_asset_1)
+        with self.assertRaises(AttributeError):
+            asset.holding = 10
+
+        total = asset + self.bond_asset_2
+        self.assertTrue(total.frozen)
+        self.assertEqual(total, self.bond_asset_sum_1_2)
+        self.assertEqual(hash(asset), hash(pickle.loads(pickle.dumps(asset))))
+        self.assertEqual(pickle.loads(pickle.dumps(self.stock_asset_1)), self.stock_asset_1)
+        self.assertFalse(self.bond_asset_1.frozen)
+
 
 if __name__ == "__main__":
     unittest.main()
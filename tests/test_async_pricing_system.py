@@ -0,0 +1,134 @@
+"""Tests for the AsyncPricingSystem module and the asynchronous Portfolio valuation"""
+
+import sys
+sys.path.append("../")
+
+import time
+import asyncio
+import unittest
+from Currency import Currency
+from Asset import Asset, StockAsset
+import MockPricingSystem
+from Portfolio import Portfolio
+from AsyncPricingSystem import AsyncPricingAdapter, RequestPolicy, as_async_pricing_system
+from fixtures import transactions_list
+
+
+class LatencyAsyncPricingSystem:
+    """Asynchronous stand in of MockPricingSystem that simulates the latency of a remote service
+
+    The first failures requests fail, to test retries.
+    """
+
+    def __init__(self, latency, failures = 0):
+        self.mock = MockPricingSystem.MockPricingSystem()
+        self.latency = latency
+        self.failures = failures
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = 0
+
+    async def _wait(self):
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            if self.failures > 0:
+                self.failures -= 1
+                raise ConnectionError("Pricing service unavailable")
+        finally:
+            self.in_flight -= 1
+
+    async def convert_currency_value(self, value, input_currency, output_currency, timestamp = None):
+        await self._wait()
+        return self.mock.convert_currency_value(value, input_currency, output_currency, timestamp)
+
+    async def get_asset_sell_price(self, asset_id, currency, timestamp = None):
+        await self._wait()
+        return self.mock.get_asset_sell_price(asset_id, currency, timestamp)
+
+
+class TestAsyncPricingSystem(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """Setup only once at class level"""
+        Asset.pricing_system = MockPricingSystem.MockPricingSystem()
+
+    def setUp(self):
+        self.portfolio = Portfolio()
+        self.portfolio.transactions(transactions_list)
+
+    def test_adapter(self):
+        """Test synchronous pricing systems are run in an executor"""
+
+        adapter = as_async_pricing_system(Asset.pricing_system)
+        self.assertIsInstance(adapter, AsyncPricingAdapter)
+        self.assertEqual(asyncio.run(adapter.get_asset_sell_price("BOND1", Currency.Euros)), 4.5)
+        self.assertEqual(asyncio.run(adapter.convert_currency_value(10, Currency.Dollars, Currency.Euros)), 8)
+
+        pricing_system = LatencyAsyncPricingSystem(0)
+        self.assertIs(as_async_pricing_system(pricing_system), pricing_system)
+
+        with self.assertRaises(ValueError):
+            RequestPolicy(max_concurrency = 0)
+
+    def test_same_as_sync(self):
+        """Test asynchronous valuation gives the same value and profits"""
+
+        self.assertEqual(asyncio.run(self.portfolio.get_current_value_async(Currency.Euros)), 6049.0)
+        profits = asyncio.run(self.portfolio.profits_async(Currency.Euros, LatencyAsyncPricingSystem(0.001)))
+        self.assertEqual(profits, {"DOL": 3996, "EU": 0, "BOND1": 19.4, "STOCK1": 144})
+
+    def test_latency_scaling(self):
+        """Test requests run concurrently, up to the concurrency limit"""
+
+        portfolio = Portfolio()
+        portfolio.transactions([(StockAsset(f"STOCK{i}", 1, Currency.Dollars, 1), None) for i in range(40)])
+        pricing_system = LatencyAsyncPricingSystem(0.05)
+
+        start = time.perf_counter()
+        value = asyncio.run(portfolio.get_current_value_async(Currency.Dollars, pricing_system, RequestPolicy(max_concurrency = 10)))
+        elapsed = time.perf_counter() - start
+
+        self.assertAlmostEqual(value, 40 * 5.2)
+        self.assertEqual(pricing_system.max_in_flight, 10)
+        self.assertLess(elapsed, 40 * 0.05 / 2)
+
+    def test_timeout_and_retries(self):
+        """Test failed and timed out requests are retried, and raise once retries are exhausted"""
+
+        policy = RequestPolicy(max_concurrency = 4, retries = 2, retry_delay = 0.001)
+        value = asyncio.run(self.portfolio.get_current_value_async(Currency.Euros, LatencyAsyncPricingSystem(0.001, failures = 2), policy))
+        self.assertEqual(value, 6049.0)
+
+        with self.assertRaises(ConnectionError):
+            asyncio.run(self.portfolio.get_current_value_async(Currency.Euros, LatencyAsyncPricingSystem(0.001, failures = 10), policy))
+
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(self.portfolio.get_current_value_async(Currency.Euros, LatencyAsyncPricingSystem(1),
+                                                               RequestPolicy(timeout = 0.01, retries = 1, retry_delay = 0.001)))
+
+    def test_cancel(self):
+        """Test a cancelled gather is not retried"""
+
+        async def cancel_gather(pricing_system):
+            policy = RequestPolicy(retries = 3, retry_delay = 0.001)
+            task = asyncio.ensure_future(policy.gather([(pricing_system.get_asset_sell_price, ("BOND1", Currency.Euros))] * 4))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            await asyncio.sleep(0.05)
+
+        pricing_system = LatencyAsyncPricingSystem(1)
+        start = time.perf_counter()
+        asyncio.run(cancel_gather(pricing_system))
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(pricing_system.requests, 4)
+        self.assertEqual(pricing_system.in_flight, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
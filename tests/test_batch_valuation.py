@@ -0,0 +1,98 @@
+"""Tests for the BatchValuation module"""
+
+import sys
+sys.path.append("../")
+
+import os
+import pickle
+import unittest
+import multiprocessing
+from Currency import Currency
+from Asset import Asset
+import MockPricingSystem
+from Portfolio import Portfolio
+from CachingPricingSystem import CachingPricingSystem
+from Metrics import InstrumentedPricingSystem
+from PricingSystem import BatchPricingAdapter
+from BatchValuation import value_portfolios, WorkerStats
+from fixtures import transactions_list
+
+example_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "transactions_example.json")
+
+
+class CountingPricingSystem(MockPricingSystem.MockPricingSystem):
+    """Mock pricing system that counts the price requests of the parent process"""
+
+    def __init__(self):
+        self.priced = []
+
+    def get_asset_sell_prices(self, asset_ids, currency, timestamp = None):
+        self.priced.extend(asset_ids)
+        return [self.get_asset_sell_price(asset_id, currency, timestamp) for asset_id in asset_ids]
+
+
+class TestBatchValuation(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """Setup only once at class level"""
+        Asset.pricing_system = MockPricingSystem.MockPricingSystem()
+
+    def test_value_portfolios(self):
+        """Test files and portfolios are valued and each asset is priced once"""
+
+        portfolios = []
+        for i in range(3):
+            portfolio = Portfolio()
+            portfolio.transactions(transactions_list)
+            portfolios.append(portfolio)
+
+        pricing_system = CountingPricingSystem()
+        stats = WorkerStats()
+        valuations = list(value_portfolios(portfolios + [example_file], Currency.Euros, pricing_system, max_workers = 2, stats = stats))
+
+        self.assertEqual(len(valuations), 4)
+        for valuation in valuations:
+            self.assertAlmostEqual(valuation.value, 6049.0)
+            self.assertAlmostEqual(valuation.profits["BOND1"], 19.4)
+        self.assertEqual(sorted(pricing_system.priced), ["BOND1", "DOL", "EU", "STOCK1"])
+        self.assertEqual([valuation.worker for valuation in valuations[:3]], [os.getpid()] * 3)
+        self.assertEqual(sum(stats.portfolios.values()), 1)
+        self.assertEqual(sum(stats.transactions.values()), 5)
+        self.assertEqual(len(stats.throughput()), len(stats.portfolios))
+
+    def test_unpicklable_portfolio(self):
+        """Test portfolios are valued in the parent process, so they do not have to be picklable"""
+
+        portfolio = Portfolio()
+        portfolio.transactions(transactions_list)
+        portfolio.subscribe(lambda asset_ids: None)
+        valuations = list(value_portfolios([portfolio], Currency.Euros, max_workers = 1))
+        self.assertEqual(len(valuations), 1)
+        self.assertAlmostEqual(valuations[0].value, 6049.0)
+
+    def test_spawn_context(self):
+        """Test wrapped pricing systems are pickled to spawned workers"""
+
+        pricing_system = CachingPricingSystem(InstrumentedPricingSystem(BatchPricingAdapter(MockPricingSystem.MockPricingSystem())))
+        restored = pickle.loads(pickle.dumps(pricing_system))
+        self.assertEqual(restored.get_asset_sell_price("BOND1", Currency.Euros), 4.5)
+
+        portfolio = Portfolio()
+        portfolio.transactions(transactions_list)
+        valuations = list(value_portfolios([portfolio, example_file], Currency.Euros, pricing_system, max_workers = 1,
+                                           mp_context = multiprocessing.get_context("spawn")))
+        self.assertEqual(len(valuations), 2)
+        for valuation in valuations:
+            self.assertAlmostEqual(valuation.value, 6049.0)
+
+    def test_replay_error(self):
+        """Test replay errors are raised in the parent"""
+
+        portfolio = Portfolio()
+        with self.assertRaises(FileNotFoundError):
+            list(value_portfolios([portfolio, "missing_file.json"], Currency.Euros, max_workers = 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
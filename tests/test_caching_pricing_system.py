@@ -0,0 +1,109 @@
+"""Tests for the CachingPricingSystem module"""
+
+import sys
+sys.path.append("../")
+
+import unittest
+from Currency import Currency
+from Asset import Asset, CashAsset, BondAsset
+import MockPricingSystem
+from Portfolio import Portfolio
+from CachingPricingSystem import CachingPricingSystem
+
+
+class CountingPricingSystem(MockPricingSystem.MockPricingSystem):
+    """Mock pricing system that counts the requests"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_asset_sell_price(self, asset_id, currency, timestamp = None):
+        self.calls += 1
+        return super(CountingPricingSystem, self).get_asset_sell_price(asset_id, currency, timestamp)
+
+    def convert_currency_value(self, value, input_currency, output_currency, timestamp = None):
+        self.calls += 1
+        return super(CountingPricingSystem, self).convert_currency_value(value, input_currency, output_currency, timestamp)
+
+
+class FakeClock:
+    """Clock that only moves when told to"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCachingPricingSystem(unittest.TestCase):
+
+    def setUp(self):
+        self.inner = CountingPricingSystem()
+        self.clock = FakeClock()
+        self.pricing_system = CachingPricingSystem(self.inner, max_size = 3, price_ttl = 10, clock = self.clock)
+
+    def test_price_cache_and_ttl(self):
+        """Test live prices are cached until their TTL expires"""
+
+        self.assertEqual(self.pricing_system.get_asset_sell_price("BOND1", Currency.Euros), 4.5)
+        self.assertEqual(self.pricing_system.get_asset_sell_price("BOND1", Currency.Euros), 4.5)
+        self.assertEqual(self.inner.calls, 1)
+
+        self.clock.now = 11
+        self.assertEqual(self.pricing_system.get_asset_sell_price("BOND1", Currency.Euros), 4.5)
+        self.assertEqual(self.inner.calls, 2)
+        self.assertEqual(self.pricing_system.stats(), {"size": 1, "hits": 1, "misses": 2, "evictions": 0, "expirations": 1})
+
+    def test_fx_cache(self):
+        """Test historical conversion rates never expire and conversions use the cached rate"""
+
+        self.assertEqual(self.pricing_system.convert_currency_value(100, Currency.Dollars, Currency.Euros, 5.0), 80)
+        self.clock.now = 1000
+        self.assertEqual(self.pricing_system.convert_currency_value(10, Currency.Dollars, Currency.Euros, 5.0), 8)
+        self.assertEqual(self.pricing_system.convert_currency_value(10, Currency.Euros, Currency.Euros, 5.0), 10)
+        self.assertEqual(self.inner.calls, 1)
+
+    def test_lru_eviction_and_invalidation(self):
+        """Test least recently used entries are evicted and entries can be invalidated"""
+
+        for asset_id in ["A", "B", "C"]:
+            self.pricing_system.get_asset_sell_price(asset_id, Currency.Dollars)
+        self.pricing_system.get_asset_sell_price("A", Currency.Dollars)
+        self.pricing_system.get_asset_sell_price("D", Currency.Dollars)    # Evicts B
+        self.assertEqual(self.pricing_system.evictions, 1)
+
+        calls = self.inner.calls
+        self.pricing_system.get_asset_sell_price("A", Currency.Dollars)
+        self.pricing_system.get_asset_sell_price("B", Currency.Dollars)
+        self.assertEqual(self.inner.calls, calls + 1)
+
+        self.pricing_system.invalidate("A")
+        self.pricing_system.get_asset_sell_price("A", Currency.Dollars)
+        self.assertEqual(self.inner.calls, calls + 2)
+        self.pricing_system.invalidate()
+        self.assertEqual(self.pricing_system.stats()["size"], 0)
+
+    def test_batch_and_portfolio(self):
+        """Test batch requests only fetch the missing prices and a portfolio reuses the cache"""
+
+        self.pricing_system.max_size = 100
+        self.assertEqual(self.pricing_system.get_asset_sell_prices(["DOL", "BOND1"], Currency.Dollars), [1, 5.2])
+        self.assertEqual(self.pricing_system.get_asset_sell_prices(["DOL", "EU", "BOND1"], Currency.Dollars), [1, 5.2, 5.2])
+        self.assertEqual(self.inner.calls, 3)
+
+        Asset.pricing_system = self.pricing_system
+        try:
+            portfolio = Portfolio()
+            portfolio.transactions([(CashAsset("DOL", 1000, Currency.Dollars, 1), None),
+                                    (BondAsset("BOND1", 50, Currency.Euros, 3.2), CashAsset("DOL", 160))])
+            calls = self.inner.calls
+            for i in range(3):
+                self.assertAlmostEqual(portfolio.get_asset_profit("BOND1", Currency.Dollars), 50 * 5.2 - 50 * 3.2 * 0.8)
+            self.assertEqual(self.inner.calls, calls + 1)
+        finally:
+            Asset.pricing_system = MockPricingSystem.MockPricingSystem()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+"""Tests for the FixedPoint module"""
+
+import sys
+sys.path.append("../")
+
+import random
+import unittest
+import numpy as np
+from Currency import Currency
+from Asset import Asset, CashAsset, BondAsset, StockAsset
+import MockPricingSystem
+from Portfolio import Portfolio
+from TransactionBatch import TransactionBatch
+from FixedPoint import FixedPointPositionStore, mul_div, to_units, convert_minor_units, rate_units, RATE_DECIMALS
+from fixtures import transactions_list
+
+
+class TestFixedPoint(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """Setup only once at class level"""
+        Asset.pricing_system = MockPricingSystem.MockPricingSystem()
+
+    def test_mul_div(self):
+        """Test the split int64 products match the exact rounded integer results"""
+
+        generator = random.Random(0)
+        for d in [1, 7, 10 ** 8, 10 ** 10]:
+            a = [generator.randrange(-10 ** 12, 10 ** 12) for _ in range(200)]
+            b = [generator.randrange(0, 10 ** 6) for _ in range(200)]
+            expected = [(x * y + d // 2) // d for x, y in zip(a, b)]
+            self.assertEqual(mul_div(a, b, d).tolist(), expected)
+
+        with self.assertRaises(OverflowError):
+            mul_div([2 ** 62], [4], 1)
+        self.assertEqual(to_units(3.2, 2), 320)
+        self.assertEqual(convert_minor_units(12345, rate_units(Currency.Dollars, Currency.Euros), Currency.Dollars, Currency.Euros),
+                         9876)
+        self.assertEqual(convert_minor_units(np.array([100, 101]), 10 ** RATE_DECIMALS // 2, Currency.Euros, Currency.Dollars).tolist(),
+                         [50, 51])
+        self.assertEqual(Currency.Euros.minor_units, 2)
+
+    def test_portfolio(self):
+        """Test a fixed point portfolio gives the float portfolio positions, values and profits"""
+
+        expected = Portfolio()
+        expected.transactions(transactions_list)
+        for replay in ["transactions", "batch_transactions"]:
+            portfolio = Portfolio(FixedPointPositionStore())
+            if replay == "transactions":
+                portfolio.transactions(transactions_list)
+            else:
+                portfolio.batch_transactions(TransactionBatch.from_transactions(transactions_list))
+
+            for asset_id in expected.get_asset_ids():
+                self.assertEqual(portfolio.assets.get_position(asset_id), expected.assets.get_position(asset_id))
+            prices = portfolio.get_price_snapshot(Currency.Euros)
+            self.assertEqual(portfolio.get_current_value(Currency.Euros, prices), 6049.0)
+            self.assertEqual(portfolio.assets.current_value_minor(Currency.Euros, prices), 604900)
+            self.assertEqual(portfolio.assets.profits_minor(Currency.Euros, prices),
+                             {"DOL": 399600, "EU": 0, "BOND1": 1940, "STOCK1": 14400})
+            for asset_id, profit in expected.get_asset_profits(Currency.Euros, prices).items():
+                self.assertAlmostEqual(portfolio.get_asset_profit(asset_id, Currency.Euros, prices), profit)
+
+        restored = FixedPointPositionStore()
+        for asset_id in portfolio.get_asset_ids():
+            restored.set_position(asset_id, *portfolio.assets.get_position(asset_id))
+        self.assertEqual(restored.costs[:4].tolist(), portfolio.assets.costs[:4].tolist())
+
+    def test_inexact_quantity(self):
+        """Test quantities finer than the quantity units are rejected before the transaction is applied"""
+
+        portfolio = Portfolio(FixedPointPositionStore())
+        portfolio.transactions(transactions_list)
+        for transaction in [(StockAsset("SA1", 0.00004, Currency.Euros, 2), CashAsset("EU", 1)),
+                            (CashAsset("EU", 1, Currency.Euros, 1), BondAsset("BOND1", 0.00004))]:
+            with self.assertRaises(ValueError):
+                portfolio.transaction(*transaction)
+            self.assertEqual(portfolio.get_current_value(Currency.Euros), 6049.0)
+            self.assertEqual(portfolio.sequence, 5)
+
+        # In a batch, the quantities of every row are checked before the first row is applied
+        batch = TransactionBatch.from_transactions([(StockAsset("SA2", 1, Currency.Euros, 2), CashAsset("EU", 2)),
+                                                    (StockAsset("SA1", 0.00001, Currency.Euros, 2), CashAsset("EU", 1))])
+        with self.assertRaises(ValueError):
+            portfolio.batch_transactions(batch)
+        self.assertNotIn("SA2", portfolio.assets)
+        self.assertEqual(portfolio.get_current_value(Currency.Euros), 6049.0)
+        self.assertEqual(portfolio.sequence, 5)
+
+        portfolio.transaction(StockAsset("SA1", 0.0001 * 3, Currency.Euros, 2), CashAsset("EU", 0.1 + 0.2))
+        self.assertEqual(portfolio.assets.holding("SA1"), 0.0003)
+
+        prices = portfolio.get_price_snapshot(Currency.Euros)
+        self.assertEqual(portfolio.assets.current_value_minor(Currency.Euros, portfolio.assets.price_units(prices)),
+                         portfolio.assets.current_value_minor(Currency.Euros, prices))
+
+    def test_purchase_rates(self):
+        """Test the purchase costs are converted at the purchase timestamp of the positions, as the float profits"""
+
+        class TimeRatePricingSystem(MockPricingSystem.MockPricingSystem):
+            def convert_currency_value(self, value, input_currency, output_currency, timestamp = None):
+                rate = 0.8 if timestamp is None else 0.5 + timestamp / 1000
+                return value if input_currency == output_currency else rate * value
+
+        Asset.pricing_system = TimeRatePricingSystem()
+        try:
+            transactions = [(CashAsset("DOL", 1000, Currency.Dollars, 1, 100.0), None),
+                            (BondAsset("BOND1", 50, Currency.Dollars, 3.2, 200.0), CashAsset("DOL", 160)),
+                            (StockAsset("SA1", 10, Currency.Dollars, 2, 400.0), CashAsset("DOL", 20))]
+            expected = Portfolio()
+            expected.transactions(transactions)
+            portfolio = Portfolio(FixedPointPositionStore())
+            portfolio.transactions(transactions)
+
+            prices = portfolio.get_price_snapshot(Currency.Euros)
+            profits = portfolio.assets.profits_minor(Currency.Euros, prices)
+            for asset_id, profit in expected.get_asset_profits(Currency.Euros, prices).items():
+                self.assertAlmostEqual(profits[asset_id] / 100, profit, places = 2)
+            self.assertEqual(profits["BOND1"], 50 * 450 - 160 * 70)
+            self.assertEqual(portfolio.assets.profits_minor(Currency.Euros, prices, {Currency.Dollars: 10 ** RATE_DECIMALS})["BOND1"],
+                             50 * 450 - 16000)
+        finally:
+            Asset.pricing_system = MockPricingSystem.MockPricingSystem()
+
+    def test_no_drift(self):
+        """Test the cost of a position is the exact sum of its purchases over many merges"""
+
+        generator = random.Random(1)
+        portfolio = Portfolio(FixedPointPositionStore())
+        portfolio.transaction(CashAsset("EU", 1e9, Currency.Euros, 1))
+        exact_cost = 0
+        for _ in range(3000):
+            quantity, cents = generator.randint(1, 100), generator.randint(1, 1000)
+            portfolio.transaction(StockAsset("SA1", quantity, Currency.Euros, cents / 100), CashAsset("EU", quantity * cents / 100))
+            exact_cost += quantity * cents
+
+        row = portfolio.assets._index["SA1"]
+        self.assertEqual(int(portfolio.assets.costs[row]), exact_cost)
+        self.assertEqual(int(portfolio.assets.costs[portfolio.assets._index["EU"]]), 10 ** 11 - exact_cost)
+
+        portfolio.transaction(CashAsset("EU", 1, Currency.Euros, 1), StockAsset("SA1", portfolio.assets.holding("SA1")))
+        self.assertEqual(int(portfolio.assets.costs[row]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+"""Tests for the FXMatrix module and the currency registry"""
+
+import sys
+sys.path.append("../")
+
+import unittest
+import numpy as np
+from Currency import Currency, CurrencyRegistry
+from Asset import Asset, BondAsset
+import MockPricingSystem
+from Portfolio import Portfolio
+from PositionStore import ArrayPositionStore
+from FXMatrix import FXMatrix
+from fixtures import transactions_list
+
+
+class RatesPricingSystem(MockPricingSystem.MockPricingSystem):
+    """Mock pricing system with a value in dollars for each currency, that changes with the timestamp"""
+
+    def __init__(self, dollar_values):
+        self.dollar_values = dollar_values
+        self.calls = 0
+
+    def convert_currency_value(self, value, input_currency, output_currency, timestamp = None):
+        self.calls += 1
+        factor = 2 if timestamp is not None else 1
+        dollar_value = lambda currency: self.dollar_values[currency] * (factor if currency != Currency.Dollars else 1)
+        return value * dollar_value(input_currency) / dollar_value(output_currency)
+
+
+class TestFXMatrix(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """Setup only once at class level"""
+        Asset.pricing_system = MockPricingSystem.MockPricingSystem()
+
+    def test_registry(self):
+        """Test the dense indices of the currency registry"""
+
+        registry = CurrencyRegistry([Currency.Euros, "USD", "EUR"])
+        self.assertEqual(len(registry), 2)
+        self.assertEqual(registry.index(Currency.Dollars), 1)
+        self.assertEqual(registry.indices(["EUR", Currency.Dollars]), [0, 1])
+        self.assertEqual(list(registry), [Currency.Euros, Currency.Dollars])
+        self.assertNotIn("GBP", registry)
+        self.assertEqual(Currency.Euros.iso_code, "EUR")
+        self.assertEqual(Currency.from_iso("USD"), Currency.Dollars)
+
+        with self.assertRaises(KeyError):
+            registry.index("GBP")
+        with self.assertRaises(ValueError):
+            Currency.from_iso("GBP")
+
+        # Currencies that are not Currency members could not be held by the stores, snapshots and logs
+        for currency in ["JPY", "Dollars", None]:
+            with self.assertRaises(ValueError):
+                registry.register(currency)
+        with self.assertRaises(ValueError):
+            FXMatrix(MockPricingSystem.MockPricingSystem(), [Currency.Euros, "JPY"])
+        self.assertEqual(len(registry), 2)
+
+    def test_triangulation(self):
+        """Test the cross rates and the conversion of arrays of values"""
+
+        pricing_system = RatesPricingSystem({Currency.Dollars: 1, Currency.Euros: 1.25})
+        fx = FXMatrix(pricing_system, ["EUR", Currency.Dollars], [None, 100], pivot = Currency.Euros)
+        self.assertEqual(pricing_system.calls, 0)
+
+        self.assertAlmostEqual(fx.rate(Currency.Dollars, Currency.Euros), 1 / 1.25)
+        self.assertEqual(pricing_system.calls, 1)
+        self.assertAlmostEqual(fx.rate("USD", "EUR"), 1 / 1.25)
+        self.assertEqual(pricing_system.calls, 1)
+        self.assertAlmostEqual(fx.rate(Currency.Euros, Currency.Dollars, 100), 2.5)
+        self.assertEqual(fx.rate("USD", Currency.Dollars), 1.0)
+
+        matrix = fx.matrix()
+        self.assertEqual(matrix.shape, (2, 2))
+        self.assertEqual(pricing_system.calls, 3)
+        for i, input_currency in enumerate(fx.registry):
+            for j, output_currency in enumerate(fx.registry):
+                self.assertAlmostEqual(matrix[i, j], fx.rate(input_currency, output_currency))
+
+        values = fx.convert([10, 20, 30], [Currency.Dollars, Currency.Dollars, Currency.Euros], Currency.Dollars, [None, 100, 100])
+        self.assertTrue(np.allclose(values, [10, 20, 30 * 2.5]))
+
+        with self.assertRaises(KeyError):
+            fx.rate(Currency.Euros, "CHF")
+        with self.assertRaises(KeyError):
+            fx.matrix(50)
+
+    def test_many_values(self):
+        """Test the conversion of many values at many timestamps matches the per value conversions"""
+
+        pricing_system = RatesPricingSystem({Currency.Dollars: 1, Currency.Euros: 1.25})
+        currencies = [Currency.Dollars, Currency.Euros] * 500
+        timestamps = [None if index % 3 == 0 else float(index) for index in range(len(currencies))]
+        fx = FXMatrix(pricing_system, currencies, timestamps)
+
+        values = np.arange(len(currencies), dtype = np.float64)
+        expected = [pricing_system.convert_currency_value(value, currency, Currency.Euros, timestamp)
+                    for value, currency, timestamp in zip(values, currencies, timestamps)]
+        self.assertTrue(np.allclose(fx.convert(values, currencies, Currency.Euros, timestamps), expected))
+
+    def test_portfolio_profits(self):
+        """Test the profits computed with the conversion matrix match the profit of each asset"""
+
+        for store in [None, ArrayPositionStore()]:
+            portfolio = Portfolio(store)
+            portfolio.transactions(transactions_list)
+
+            for currency in Currency:
+                profits = portfolio.get_asset_profits(currency)
+                for asset_id in portfolio.get_asset_ids():
+                    self.assertAlmostEqual(profits[asset_id], portfolio.get_asset_profit(asset_id, currency))
+
+        self.assertEqual(Portfolio().get_asset_profits(Currency.Euros), {})
+
+    def test_requested_rates(self):
+        """Test only the rates of the positions not in the valuation currency are requested"""
+
+        pricing_system = RatesPricingSystem({Currency.Dollars: 1, Currency.Euros: 1.25})
+        Asset.pricing_system = pricing_system
+        try:
+            portfolio = Portfolio()
+            portfolio.transactions([(BondAsset(f"BOND{index}", 1, Currency.Dollars, 2, float(index)), None) for index in range(1000)])
+            portfolio.transaction(BondAsset("BOND_EU", 1, Currency.Euros, 2, 5.0), None)
+
+            prices = {asset_id: 1.0 for asset_id in portfolio.get_asset_ids()}
+            profits = portfolio.get_asset_profits(Currency.Dollars, prices)
+            self.assertEqual(pricing_system.calls, 1)
+            self.assertAlmostEqual(profits["BOND_EU"], 1 - 2 * 1.25 * 2)
+            self.assertAlmostEqual(profits["BOND0"], -1)
+
+            pricing_system.calls = 0
+            portfolio.get_asset_profits(Currency.Euros, prices)
+            self.assertEqual(pricing_system.calls, 1000)
+        finally:
+            Asset.pricing_system = MockPricingSystem.MockPricingSystem()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+"""Tests for the LotLedger module and the Portfolio lot tracking"""
+
+import sys
+sys.path.append("../")
+
+import unittest
+from Currency import Currency
+from Asset import Asset, CashAsset, StockAsset
+import MockPricingSystem
+from Portfolio import Portfolio
+from LotLedger import LotLedger
+from TransactionBatch import TransactionBatch
+from fixtures import transactions_list
+
+
+class TestLotLedger(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """Setup only once at class level"""
+        Asset.pricing_system = MockPricingSystem.MockPricingSystem()
+
+    def ledger(self, policy):
+        """Ledger with three lots of SA1 bought at 2, 4 and 3"""
+
+        ledger = LotLedger(policy)
+        for lot_id, unit_price in enumerate([2, 4, 3]):
+            ledger.buy(StockAsset("SA1", 10, Currency.Dollars, unit_price), lot_id)
+        return ledger
+
+    def test_policies(self):
+        """Test the lots relieved by each policy and the realized profit"""
+
+        expected = {"FIFO": ([(1, 5), (2, 10)], 15 * 5 - (10 * 2 + 5 * 4)),
+                    "LIFO": ([(0, 10), (1, 5)], 15 * 5 - (10 * 3 + 5 * 4)),
+                    "HIFO": ([(0, 10), (2, 5)], 15 * 5 - (10 * 4 + 5 * 3))}
+
+        for policy, (remaining, realized) in expected.items():
+            ledger = self.ledger(policy)
+            self.assertEqual(ledger.sell("SA1", 15, 15 * 5), realized)
+            self.assertEqual(sorted((lot.lot_id, lot.quantity) for lot in ledger.lots("SA1")), remaining)
+            self.assertEqual(ledger.cost_basis("SA1"), 90 - (15 * 5 - realized))
+            self.assertEqual(ledger.realized_profit("SA1"), realized)
+
+        with self.assertRaises(ValueError):
+            LotLedger("AVERAGE")
+
+    def test_specific(self):
+        """Test specific lots relief"""
+
+        ledger = self.ledger("SPECIFIC")
+        self.assertEqual(ledger.sell("SA1", 12, 12 * 5, [2, 0]), 60 - (10 * 3 + 2 * 2))
+        self.assertEqual(sorted((lot.lot_id, lot.quantity) for lot in ledger.lots("SA1")), [(0, 8), (1, 10)])
+
+        for lot_ids in [None, [7], [0]]:
+            with self.assertRaises(ValueError):
+                ledger.check_sell("SA1", 9, lot_ids)
+
+    def test_small_quantities(self):
+        """Test the relief tolerance is relative to the lot size"""
+
+        for policy in ["FIFO", "SPECIFIC"]:
+            ledger = LotLedger(policy)
+            ledger.buy(StockAsset("SA1", 1e-10, Currency.Dollars, 2), 0)
+            ledger.buy(StockAsset("SA2", 1e-10, Currency.Dollars, 2), 1)
+            ledger.buy(StockAsset("SA2", 1e-10, Currency.Dollars, 3), 2)
+
+            self.assertAlmostEqual(ledger.sell("SA1", 1e-10, 5e-10), 3e-10, places = 20)
+            self.assertEqual(ledger.lots("SA1"), [])
+            ledger.sell("SA2", 1.5e-10, 6e-10, [1, 2] if policy == "SPECIFIC" else None)
+            self.assertEqual([lot.lot_id for lot in ledger.lots("SA2")], [2])
+            self.assertAlmostEqual(ledger.lots("SA2")[0].quantity, 0.5e-10, places = 20)
+
+    def test_portfolio(self):
+        """Test realized and unrealized profits of a portfolio"""
+
+        for batch in [False, True]:
+            portfolio = Portfolio(lot_policy = "FIFO")
+            if batch:
+                portfolio.batch_transactions(TransactionBatch.from_transactions(transactions_list))
+            else:
+                portfolio.transactions(transactions_list)
+
+            self.assertAlmostEqual(portfolio.get_realized_profit("BOND1", Currency.Dollars), 240 - 40 * 3.2)
+            self.assertAlmostEqual(portfolio.get_unrealized_profit("BOND1", Currency.Dollars), 10 * 5.2 - 10 * 3.2)
+            self.assertAlmostEqual(portfolio.get_unrealized_profit("BOND1", Currency.Dollars),
+                                   portfolio.get_asset_profit("BOND1", Currency.Dollars))
+            self.assertAlmostEqual(portfolio.get_realized_profit("DOL", Currency.Dollars), 0)
+            self.assertAlmostEqual(portfolio.get_realized_profit("BOND1", Currency.Euros), (240 - 40 * 3.2) * 0.8)
+            self.assertIsNone(portfolio.get_unrealized_profit("UNKNOWN", Currency.Dollars))
+
+        with self.assertRaises(ValueError):
+            Portfolio().get_realized_profit("BOND1", Currency.Dollars)
+
+    def test_portfolio_specific_lots(self):
+        """Test a sale of unknown specific lots leaves the portfolio unchanged"""
+
+        portfolio = Portfolio(lot_policy = "SPECIFIC")
+        portfolio.transactions(transactions_list[:3])
+        portfolio.transaction(StockAsset("SA1", 10, Currency.Dollars, 2), CashAsset("DOL", 20))
+        portfolio.transaction(StockAsset("SA1", 10, Currency.Dollars, 4), CashAsset("DOL", 40))
+
+        with self.assertRaises(ValueError):
+            portfolio.transaction(CashAsset("DOL", 50, Currency.Dollars, 1), StockAsset("SA1", 5), lot_ids = [99])
+        self.assertEqual(portfolio.assets["SA1"].holding, 20)
+
+        portfolio.transaction(CashAsset("DOL", 50, Currency.Dollars, 1), StockAsset("SA1", 10), lot_ids = [4])
+        self.assertEqual(portfolio.get_realized_profit("SA1", Currency.Dollars), 50 - 40)
+
+        # The lot ids can be given in a list of transactions, not in a batch
+        portfolio.transactions([(CashAsset("DOL", 30, Currency.Dollars, 1), StockAsset("SA1", 5), [3])])
+        self.assertEqual(portfolio.get_realized_profit("SA1", Currency.Dollars), 50 - 40 + 30 - 5 * 2)
+        portfolio.transaction(StockAsset("SA1", 10, Currency.Dollars, 3), CashAsset("DOL", 30), lot_ids = [0])
+        batch = TransactionBatch.from_transactions([(StockAsset("SA2", 1, Currency.Dollars, 2), None),
+                                                    (CashAsset("DOL", 30, Currency.Dollars, 1), StockAsset("SA1", 5))])
+        with self.assertRaises(ValueError):
+            portfolio.batch_transactions(batch)
+        self.assertNotIn("SA2", portfolio.assets)
+        self.assertEqual(portfolio.sequence, 8)
+        self.assertEqual(sorted(lot.quantity for lot in portfolio.lots.lots("SA1")), [5, 10])
+
+
+if __name__ == "__main__":
+    unittest.main()
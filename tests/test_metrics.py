@@ -0,0 +1,97 @@
+"""Tests for the Metrics module"""
+
+import sys
+sys.path.append("../")
+
+import pickle
+import unittest
+from Currency import Currency
+from Asset import Asset
+import MockPricingSystem
+from Portfolio import Portfolio
+from TransactionBatch import TransactionBatch
+from CachingPricingSystem import CachingPricingSystem
+from Metrics import METRICS, Histogram, InstrumentedPricingSystem
+from fixtures import transactions_list
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        Asset.pricing_system = CachingPricingSystem(InstrumentedPricingSystem(MockPricingSystem.MockPricingSystem()))
+        METRICS.reset()
+
+    def tearDown(self):
+        METRICS.enabled = False
+        METRICS.reset()
+
+    def test_histogram(self):
+        """Test the quantiles estimated from the buckets"""
+
+        histogram = Histogram()
+        self.assertIsNone(histogram.quantile(0.5))
+
+        for _ in range(99):
+            histogram.observe(3e-6)
+        histogram.observe(1.0)
+
+        self.assertEqual(histogram.count, 100)
+        self.assertTrue(2e-6 <= histogram.quantile(0.5) <= 4e-6)
+        self.assertTrue(2e-6 <= histogram.quantile(0.99) <= 4e-6)
+        self.assertTrue(0.5 <= histogram.quantile(1) <= 1.1)
+
+    def test_disabled(self):
+        """Test nothing is collected when the metrics are disabled"""
+
+        portfolio = Portfolio()
+        portfolio.transactions(transactions_list)
+        portfolio.get_current_value(Currency.Euros)
+
+        self.assertEqual(METRICS.counters, {})
+        self.assertEqual(METRICS.histograms, {})
+
+    def test_instrumented_pricing_system(self):
+        """Test the pricing methods are the wrapped ones when disabled, and cached timing wrappers when enabled"""
+
+        mock = MockPricingSystem.MockPricingSystem()
+        pricing_system = InstrumentedPricingSystem(mock)
+        self.assertEqual(pricing_system.get_asset_sell_price, mock.get_asset_sell_price)
+
+        METRICS.enabled = True
+        method = pricing_system.get_asset_sell_price
+        self.assertIs(pricing_system.get_asset_sell_price, method)
+        self.assertEqual(method("BOND1", Currency.Euros), 4.5)
+        self.assertEqual(METRICS.snapshot()["histograms"]['pricing_call_seconds{method="get_asset_sell_price"}']["count"], 1)
+
+        restored = pickle.loads(pickle.dumps(pricing_system))
+        self.assertEqual(restored.get_asset_sell_price("BOND1", Currency.Euros), 4.5)
+
+    def test_portfolio(self):
+        """Test the calls, replayed rows and pricing requests collected on a valuation"""
+
+        METRICS.enabled = True
+        portfolio = Portfolio()
+        portfolio.transactions(transactions_list)
+        portfolio.batch_transactions(TransactionBatch.from_transactions(transactions_list[:2]))
+        portfolio.get_current_value(Currency.Euros)
+        portfolio.get_current_value(Currency.Euros)   # memoized
+        portfolio.get_price_snapshot(Currency.Euros)
+
+        snapshot = METRICS.snapshot()
+        self.assertEqual(snapshot["counters"]["replay_rows_total"], 7)
+        self.assertEqual(snapshot["histograms"]['call_seconds{method="Portfolio.get_current_value"}']["count"], 2)
+        self.assertEqual(snapshot["histograms"]['call_seconds{method="Portfolio.transactions"}']["count"], 1)
+        self.assertEqual(snapshot["histograms"]['pricing_call_seconds{method="get_asset_sell_price"}']["count"], 4)
+        self.assertEqual(snapshot["counters"]['pricing_cache_requests_total{method="get_asset_sell_prices",status="miss"}'], 4)
+        self.assertEqual(snapshot["counters"]['pricing_cache_requests_total{method="get_asset_sell_prices",status="hit"}'], 4)
+        self.assertGreater(snapshot["throughputs"]["replay_rows_per_second"], 0)
+
+        text = METRICS.prometheus()
+        self.assertIn("# TYPE call_seconds histogram\n", text)
+        self.assertIn('call_seconds_count{method="Portfolio.get_current_value"} 2\n', text)
+        self.assertIn('call_seconds_bucket{method="Portfolio.get_current_value",le="+Inf"} 2\n', text)
+        self.assertIn("replay_rows_total 7\n", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+"""Tests for the PortfolioAggregate module"""
+
+import sys
+sys.path.append("../")
+
+import math
+import unittest
+from Currency import Currency
+from Asset import Asset, CashAsset, BondAsset, StockAsset
+import MockPricingSystem
+from Portfolio import Portfolio
+from PositionStore import ArrayPositionStore
+from TransactionBatch import TransactionBatch
+from PortfolioAggregate import PortfolioAggregate
+from fixtures import transactions_list
+
+
+class CountingPricingSystem(MockPricingSystem.MockPricingSystem):
+    """Mock pricing system that counts the priced asset ids"""
+
+    def __init__(self):
+        self.priced = []
+
+    def get_asset_sell_price(self, asset_id, currency, timestamp = None):
+        self.priced.append(asset_id)
+        return super(CountingPricingSystem, self).get_asset_sell_price(asset_id, currency, timestamp)
+
+
+class TestPortfolioAggregate(unittest.TestCase):
+
+    def setUp(self):
+        self.pricing_system = Asset.pricing_system = CountingPricingSystem()
+        self.portfolios = {"P1": Portfolio(), "P2": Portfolio(ArrayPositionStore())}
+        self.portfolios["P1"].transactions(transactions_list)
+        self.portfolios["P2"].transactions(transactions_list[:3])
+        self.aggregate = PortfolioAggregate(self.portfolios)
+
+    def tearDown(self):
+        Asset.pricing_system = MockPricingSystem.MockPricingSystem()
+
+    def check_totals(self):
+        """Checks the aggregate against the sum of the portfolio valuations"""
+
+        self.pricing_system.priced = []
+        prices = self.aggregate.get_price_snapshot(Currency.Euros)
+        self.assertEqual(sorted(self.pricing_system.priced), sorted(self.aggregate.asset_ids()))
+
+        expected = sum(portfolio.get_current_value(Currency.Euros, prices) for portfolio in self.portfolios.values())
+        self.assertAlmostEqual(self.aggregate.total_value(Currency.Euros, prices), expected)
+        self.assertAlmostEqual(sum(self.aggregate.currency_totals(Currency.Euros, prices).values()), expected)
+
+    def test_index(self):
+        """Test the holders, exposures and concentrations of the assets"""
+
+        self.assertEqual(self.aggregate.holders("BOND1"), {"P1": 10, "P2": 50})
+        self.assertEqual(self.aggregate.holding("DOL"), 1080 + 840)
+        self.assertEqual(self.aggregate.holders("UNKNOWN"), {})
+        self.check_totals()
+
+        prices = {"DOL": 1, "EU": 1, "BOND1": 4.5, "STOCK1": 4.5}
+        exposures = self.aggregate.exposures(Currency.Euros, prices)
+        self.assertEqual(exposures, {"DOL": 1920, "EU": 1874, "BOND1": 270, "STOCK1": 270})
+        top = self.aggregate.top_concentrations(2, Currency.Euros, prices)
+        self.assertEqual([asset_id for asset_id, _, _ in top], ["DOL", "EU"])
+        self.assertAlmostEqual(top[0][2], 1920 / 4334)
+        self.assertEqual(self.aggregate.currency_totals(Currency.Euros, prices),
+                         {Currency.Dollars: 1920 + 270, Currency.Euros: 1874 + 270})
+
+    def test_incremental_updates(self):
+        """Test transactions, batches, added and removed portfolios update the index"""
+
+        self.portfolios["P2"].transaction(StockAsset("SA1", 10, Currency.Euros, 2), CashAsset("EU", 20))
+        self.portfolios["P1"].batch_transactions(TransactionBatch.from_transactions(
+            [(CashAsset("DOL", 50, Currency.Dollars, 1), BondAsset("BOND1", 10))]))
+        self.assertEqual(self.aggregate.holders("SA1"), {"P2": 10})
+        self.assertEqual(self.aggregate.holders("BOND1"), {"P1": 0, "P2": 50})
+        self.check_totals()
+
+        with self.assertRaises(ValueError):
+            self.aggregate.add("P1", Portfolio())
+
+        self.portfolios["P3"] = Portfolio()
+        self.portfolios["P3"].transactions(transactions_list[:2])
+        self.aggregate.add("P3", self.portfolios["P3"])
+        self.assertEqual(self.aggregate.holding("EU"), 874 + 980 + 1000)
+
+        self.aggregate.remove("P2")
+        portfolio = self.portfolios.pop("P2")
+        portfolio.transaction(StockAsset("SA2", 1, Currency.Euros, 2), CashAsset("EU", 2))
+        self.assertNotIn("SA1", self.aggregate.asset_ids())
+        self.assertNotIn("SA2", self.aggregate.asset_ids())
+        self.check_totals()
+
+    def test_no_drift(self):
+        """Test the totals stay the sum of the holdings of the portfolios over many updates"""
+
+        portfolios = {"P1": Portfolio(), "P2": Portfolio()}
+        portfolios["P1"].transaction(CashAsset("EU", 2.0 ** 53, Currency.Euros, 1))
+        aggregate = PortfolioAggregate(portfolios)
+        for _ in range(100):
+            portfolios["P2"].transaction(CashAsset("EU", 1, Currency.Euros, 1))
+
+        expected = math.fsum(portfolio.assets.holding("EU") for portfolio in portfolios.values())
+        self.assertEqual(aggregate.holding("EU"), expected)
+        self.assertEqual(aggregate.currency_totals(Currency.Euros, {"EU": 1}), {Currency.Euros: expected})
+
+
+if __name__ == "__main__":
+    unittest.main()
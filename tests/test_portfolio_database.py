@@ -0,0 +1,97 @@
+"""Tests for the PortfolioDatabase module"""
+
+import sys
+sys.path.append("../")
+
+import unittest
+from Currency import Currency
+from Asset import Asset, AssetType, CashAsset, BondAsset
+import MockPricingSystem
+from Portfolio import Portfolio
+from PositionStore import ArrayPositionStore
+import PortfolioDatabase
+
+transactions_list = [ 
+                        (CashAsset("DOL", 1000, Currency.Dollars, 1, 10.0), None),                  # Initial investment
+                        (CashAsset("EU", 1000, Currency.Euros, 1), None),                           # Initial investment
+                        (BondAsset("BOND1", 50, Currency.Dollars, 3.2, 20.0), CashAsset("DOL", 160)),   # Buy Bond
+                        (BondAsset("STOCK1", 60, Currency.Euros, 2.1, 30.0), CashAsset("EU", 126)),     # Buy Stock
+                        (CashAsset("DOL", 240, Currency.Dollars, 1, 40.0), BondAsset("BOND1", 40)),     # Sell Bond
+                    ]
+
+
+class TestPortfolioDatabase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """Setup only once at class level"""
+        Asset.pricing_system = MockPricingSystem.MockPricingSystem()
+
+    def setUp(self):
+        self.database = PortfolioDatabase.PortfolioDatabase(":memory:")
+        self.addCleanup(self.database.close)
+
+    def test_save_and_load(self):
+        """Test a loaded portfolio has the saved positions and replays the transactions stored after them"""
+
+        portfolio = Portfolio()
+        portfolio.transactions(transactions_list[:3])
+        self.assertEqual(self.database.append_transactions("P1", transactions_list[:3]), 3)
+        self.database.save_portfolio("P1", portfolio)
+        self.database.append_transactions("P1", transactions_list[3:])
+        portfolio.transactions(transactions_list[3:])
+
+        for store in [None, ArrayPositionStore()]:
+            loaded = self.database.load_portfolio("P1", store)
+            self.assertEqual(loaded.sequence, 5)
+            self.assertEqual(sorted(loaded.get_asset_ids()), sorted(portfolio.get_asset_ids()))
+            for asset_id in portfolio.get_asset_ids():
+                self.assertEqual(loaded.assets.get_position(asset_id), portfolio.assets.get_position(asset_id))
+
+        self.assertEqual(self.database.transaction_count("P1"), 5)
+        self.assertEqual(self.database.portfolio_ids(), ["P1"])
+        self.assertEqual(len(self.database.load_portfolio("P2").assets), 0)
+
+        stored = list(self.database.transactions("P1", 2))
+        self.assertEqual(len(stored), 3)
+        self.assertEqual((stored[0][0].id, stored[0][0].type, stored[0][0].timestamp), ("BOND1", AssetType.Bond, 20.0))
+        self.assertEqual((stored[0][1].id, stored[0][1].type, stored[0][1].holding), ("DOL", AssetType.Cash, 160))
+
+    def test_queries(self):
+        """Test the positions of an asset across portfolios and the holdings as of a date"""
+
+        for portfolio_id, count in [("P1", 5), ("P2", 3)]:
+            portfolio = Portfolio()
+            portfolio.transactions(transactions_list[:count])
+            self.database.append_transactions(portfolio_id, transactions_list[:count])
+            self.database.save_portfolio(portfolio_id, portfolio)
+
+        positions = self.database.positions_for_asset("BOND1")
+        self.assertEqual(positions, {"P1": (AssetType.Bond, Currency.Dollars, 10, 3.2, 20.0),
+                                     "P2": (AssetType.Bond, Currency.Dollars, 50, 3.2, 20.0)})
+
+        # The EU investment has no timestamp: it takes the previous one (10.0)
+        self.assertEqual(self.database.holdings_as_of("P1", 5.0), {})
+        self.assertEqual(self.database.holdings_as_of("P1", 10.0), {"DOL": 1000, "EU": 1000})
+        self.assertEqual(self.database.holdings_as_of("P1", 35.0), {"DOL": 840, "EU": 874, "BOND1": 50, "STOCK1": 60})
+        self.assertEqual(self.database.holdings_as_of("P1", 40.0), {"DOL": 1080, "EU": 874, "BOND1": 10, "STOCK1": 60})
+        self.assertEqual(self.database.holding_as_of("P1", "BOND1", 40.0), 10)
+        self.assertEqual(self.database.holding_as_of("P2", "DOL", 40.0), 840)
+        self.assertEqual(self.database.holding_as_of("P2", "UNKNOWN", 40.0), 0)
+
+    def test_indexed_queries(self):
+        """Test the queries use the indexes"""
+
+        def plan(query, parameters):
+            rows = self.database.connection.execute("EXPLAIN QUERY PLAN " + query, parameters).fetchall()
+            return " ".join(row[-1] for row in rows)
+
+        self.assertIn("INDEX positions_asset", plan(PortfolioDatabase._POSITIONS_FOR_ASSET, ("BOND1",)))
+        self.assertNotIn("SCAN transactions", plan(PortfolioDatabase._HOLDINGS_AS_OF, ("P1", 1.0, "P1", 1.0)))
+        holding_plan = plan(PortfolioDatabase._HOLDING_AS_OF, ("P1", "DOL", 1.0, "P1", "DOL", 1.0))
+        self.assertIn("transactions_input", holding_plan)
+        self.assertIn("transactions_output", holding_plan)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+"""Tests for the PortfolioServer module and the portfolio_info thin client"""
+
+import sys
+sys.path.append("../")
+
+import io
+import os
+import json
+import tempfile
+import threading
+import contextlib
+import unittest
+from Asset import Asset
+import MockPricingSystem
+import portfolio_info
+from PortfolioServer import PortfolioServer
+
+transactions_records = [
+    {"input": {"type": "CASH", "id": "DOL", "holding": 1000, "currency": "Dollars", "unit_price": 1}},
+    {"input": {"type": "CASH", "id": "EU", "holding": 1000, "currency": "Euros", "unit_price": 1}},
+    {"input": {"type": "BOND", "id": "BOND1", "holding": 50, "currency": "Dollars", "unit_price": 3.2},
+     "output": {"type": "CASH", "id": "DOL", "holding": 160}},
+    {"input": {"type": "BOND", "id": "STOCK1", "holding": 60, "currency": "Euros", "unit_price": 2.1},
+     "output": {"type": "CASH", "id": "EU", "holding": 126}},
+    {"input": {"type": "CASH", "id": "DOL", "holding": 240, "currency": "Dollars", "unit_price": 1},
+     "output": {"type": "BOND", "id": "BOND1", "holding": 40}},
+]
+
+
+class TestPortfolioServer(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.history_path = os.path.join(directory.name, "history.json")
+        self.write_history(transactions_records[:4])
+
+        self.socket_path = os.path.join(directory.name, "server.sock")
+        self.server = PortfolioServer(self.socket_path)
+        thread = threading.Thread(target = self.server.serve_forever, kwargs = {"poll_interval": 0.05})
+        thread.start()
+        self.addCleanup(setattr, Asset, "pricing_system", MockPricingSystem.MockPricingSystem())
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.shutdown)
+
+    def write_history(self, records):
+        with open(self.history_path, "w") as file:
+            for record in records:
+                file.write(json.dumps(record) + "\n")
+
+    def request(self, *argv):
+        arguments = portfolio_info.parse_arguments([self.history_path, "EUR"] + list(argv) + ["--server", self.socket_path])
+        return portfolio_info.request_server(self.socket_path, arguments)
+
+    def local(self, *argv):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            portfolio_info.main(portfolio_info.parse_arguments([self.history_path, "EUR"] + list(argv)))
+        return output.getvalue()
+
+    def test_requests(self):
+        """Test the server replies the local output, reusing the loaded portfolio until the history changes"""
+
+        self.assertEqual(self.request(), self.local())
+        portfolio = self.server._portfolios[self.history_path][1]
+        self.assertIn("Rows: 0,", self.request("--stats"))
+        self.assertIs(self.server._portfolios[self.history_path][1], portfolio)
+
+        self.write_history(transactions_records)
+        output = self.request()
+        self.assertIsNot(self.server._portfolios[self.history_path][1], portfolio)
+        self.assertEqual(output, self.local())
+        self.assertIn("Portfolio value:  6049.000 Euros", output)
+
+    def test_errors(self):
+        """Test the server reports the errors of a request and keeps serving"""
+
+        self.write_history(transactions_records[:2] + [{"input": {"type": "BOND", "id": "B1", "holding": 1, "unit_price": 1},
+                                                        "output": {"type": "CASH", "id": "DOL", "holding": 5000}}])
+        with self.assertRaises(RuntimeError):
+            self.request()
+
+        # The skipped transactions are reported again when the loaded portfolio is reused
+        for _ in range(2):
+            stderr = io.StringIO()
+            with contextlib.redirect_stderr(stderr):
+                output = self.request("--skip-invalid")
+            self.assertIn("Skipped transaction 2", stderr.getvalue())
+            self.assertIn("Portfolio value:", output)
+
+        stderr = io.StringIO()
+        with self.assertRaises(SystemExit), contextlib.redirect_stderr(stderr):
+            portfolio_info.parse_arguments([self.history_path, "EUR", "--profile", "dict", "--server", self.socket_path])
+        self.assertIn("--server", stderr.getvalue())
+
+    def test_resumed_skipped_rows(self):
+        """Test the skipped transactions after a checkpoint are reported with their row in the file"""
+
+        checkpoint = self.history_path + ".snapshot"
+        self.local("--checkpoint", checkpoint)
+        self.write_history(transactions_records[:4] + [{"input": {"type": "BOND", "id": "B1", "holding": 1, "unit_price": 1},
+                                                        "output": {"type": "CASH", "id": "DOL", "holding": 5000}}])
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            self.local("--checkpoint", checkpoint, "--skip-invalid")
+        self.assertIn("Skipped transaction 4:", stderr.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+"""Tests for the PortfolioSnapshot module and the Portfolio snapshot/restore"""
+
+import sys
+sys.path.append("../")
+
+import os
+import json
+import tempfile
+import unittest
+from Currency import Currency
+from Asset import Asset, AssetType, CashAsset, BondAsset
+import MockPricingSystem
+from Portfolio import Portfolio
+from PositionStore import ArrayPositionStore
+import PortfolioSnapshot
+import TransactionLoader
+
+transactions_list = [ 
+                        (CashAsset("DOL", 1000, Currency.Dollars, 1, 1.0), None),                   # Initial investment
+                        (CashAsset("EU", 1000, Currency.Euros, 1), None),                           # Initial investment
+                        (BondAsset("BOND1", 50, Currency.Dollars, 3.2), CashAsset("DOL", 160)),     # Buy Bond
+                        (BondAsset("STOCK1", 60, Currency.Euros, 2.1), CashAsset("EU", 126)),       # Buy Stock
+                        (CashAsset("DOL", 240, Currency.Dollars, 1), BondAsset("BOND1", 40)),       # Sell Bond
+                    ]
+
+
+class TestPortfolioSnapshot(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """Setup only once at class level"""
+        Asset.pricing_system = MockPricingSystem.MockPricingSystem()
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "portfolio.snapshot")
+
+    def test_round_trip(self):
+        """Test positions and sequence are restored"""
+
+        positions = [("ÁSSET", AssetType.Stock, Currency.Euros, 1.5, 2.25, None), ("DOL", AssetType.Cash, Currency.Dollars, 10, 1, 3.0)]
+        PortfolioSnapshot.write_snapshot(self.path, 42, positions)
+        self.assertEqual(PortfolioSnapshot.read_snapshot(self.path), (42, positions, None))
+        PortfolioSnapshot.write_snapshot(self.path, 42, positions, 1234)
+        self.assertEqual(PortfolioSnapshot.read_snapshot(self.path), (42, positions, 1234))
+
+        with open(self.path, "r+b") as file:
+            file.truncate(30)
+        with self.assertRaises(ValueError):
+            PortfolioSnapshot.read_snapshot(self.path)
+
+    def test_restore_and_resume(self):
+        """Test a restored portfolio only replays the transactions after the snapshot"""
+
+        portfolio = Portfolio()
+        portfolio.transactions(transactions_list[:3])
+        self.assertEqual(portfolio.sequence, 3)
+        portfolio.save_snapshot(self.path)
+
+        for store in [None, ArrayPositionStore()]:
+            restored = Portfolio.load_snapshot(self.path, store)
+            self.assertEqual(restored.sequence, 3)
+            restored.transactions(transactions_list[restored.sequence:])
+            self.assertEqual(restored.sequence, 5)
+            self.assertAlmostEqual(restored.get_current_value(Currency.Euros), 6049.0)
+            self.assertEqual(restored.assets.get_position("DOL")[4], None)
+
+    def test_loader_skip(self):
+        """Test the loader skips the transactions already applied"""
+
+        history = os.path.join(os.path.dirname(self.path), "history.json")
+        with open(history, "w") as file:
+            for i in range(5):
+                file.write(json.dumps({"input": {"type": "CASH", "id": f"C{i}", "holding": i}}) + "\n")
+
+        ids = [input_asset.id for input_asset, _ in TransactionLoader.load_transactions(history, skip = 3)]
+        self.assertEqual(ids, ["C3", "C4"])
+
+    def test_loader_offset(self):
+        """Test the loader resumes at the offset after the last record read, without reading the records before"""
+
+        records = [{"input": {"type": "CASH", "id": f"Ç{i}", "holding": i}} for i in range(6)]
+        layouts = {"ndjson": "".join(json.dumps(record, ensure_ascii = False) + "\r\n" for record in records),
+                   "array": " [\n" + ",\n".join(json.dumps(record, ensure_ascii = False) for record in records) + "\n]\n"}
+        history = os.path.join(os.path.dirname(self.path), "history.json")
+
+        for layout, text in layouts.items():
+            with open(history, "w", encoding = "utf-8", newline = "") as file:
+                file.write(text)
+
+            stats = TransactionLoader.LoaderStats()
+            transactions = TransactionLoader.load_transactions(history, chunk_size = 7, stats = stats)
+            self.assertEqual([next(transactions)[0].id for _ in range(4)], ["Ç0", "Ç1", "Ç2", "Ç3"])
+            transactions.close()
+
+            # The records before the offset are not read: corrupting them does not matter
+            with open(history, "r+b") as file:
+                file.seek(text.encode("utf-8").index(b'"type"'))
+                file.write(b"#")
+
+            resumed = TransactionLoader.LoaderStats()
+            ids = [input_asset.id for input_asset, _ in TransactionLoader.load_transactions(history, 7, resumed, offset = stats.offset)]
+            self.assertEqual(ids, ["Ç4", "Ç5"], layout)
+            self.assertEqual(resumed.rows, 2)
+            self.assertEqual(resumed.offset, len(text.rstrip("\n]\r").encode("utf-8")) if layout == "array" else len(text.encode("utf-8")))
+
+            # The offset is kept in the snapshot of the portfolio
+            portfolio = Portfolio()
+            portfolio.save_snapshot(self.path, stats.offset)
+            self.assertEqual(Portfolio.load_snapshot(self.path).snapshot_offset, stats.offset)
+
+
+if __name__ == "__main__":
+    unittest.main()
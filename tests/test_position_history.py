@@ -0,0 +1,158 @@
+"""Tests for the PositionHistory module and the Portfolio as-of valuation"""
+
+import sys
+sys.path.append("../")
+
+import unittest
+from Currency import Currency
+from Asset import Asset, AssetType, CashAsset, BondAsset
+import MockPricingSystem
+from Portfolio import Portfolio
+from PositionHistory import PositionHistory
+from TransactionBatch import TransactionBatch, TransactionError
+
+transactions_list = [ 
+                        (CashAsset("DOL", 1000, Currency.Dollars, 1, 10.0), None),                        # Initial investment
+                        (CashAsset("EU", 1000, Currency.Euros, 1), None),                                 # Initial investment
+                        (BondAsset("BOND1", 50, Currency.Dollars, 3.2, 20.0), CashAsset("DOL", 160)),     # Buy Bond
+                        (BondAsset("STOCK1", 60, Currency.Euros, 2.1, 30.0), CashAsset("EU", 126)),       # Buy Stock
+                        (CashAsset("DOL", 240, Currency.Dollars, 1, 40.0), BondAsset("BOND1", 40)),       # Sell Bond
+                    ]
+
+
+class TimePricingSystem(MockPricingSystem.MockPricingSystem):
+    """Mock pricing system whose prices change with the timestamp"""
+
+    def get_asset_sell_price(self, asset_id, currency, timestamp = None):
+        price = super(TimePricingSystem, self).get_asset_sell_price(asset_id, currency, timestamp)
+        return price if timestamp is None or asset_id in ["DOL", "EU"] else price * (1 + timestamp / 100)
+
+
+class TestPositionHistory(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """Setup only once at class level"""
+        Asset.pricing_system = TimePricingSystem()
+
+    @classmethod
+    def tearDownClass(cls):
+        Asset.pricing_system = MockPricingSystem.MockPricingSystem()
+
+    def replay_until(self, timestamp):
+        """Reference: replays the transactions up to timestamp"""
+
+        portfolio = Portfolio()
+        portfolio.transactions(transaction for transaction in transactions_list
+                               if transaction[0].timestamp is None or transaction[0].timestamp <= timestamp)
+        return portfolio
+
+    def test_history(self):
+        """Test binary search of the recorded positions"""
+
+        history = PositionHistory()
+        history.record(history.transaction_timestamp(None), "A", (AssetType.Cash, Currency.Dollars, 1, 1, None))
+        history.record(history.transaction_timestamp(5), "A", (AssetType.Cash, Currency.Dollars, 2, 1, 5))
+        history.record(history.transaction_timestamp(5), "A", (AssetType.Cash, Currency.Dollars, 3, 1, 5))
+        history.record(history.transaction_timestamp(None), "B", (AssetType.Cash, Currency.Dollars, 4, 1, None))
+
+        self.assertEqual(history.position_as_of("A", -1000)[2], 1)
+        self.assertEqual(history.position_as_of("A", 5)[2], 3)
+        self.assertEqual(len(history.changes("A")[0]), 2)
+        self.assertIsNone(history.position_as_of("B", 4))
+        self.assertIsNone(history.position_as_of("C", 4))
+        with self.assertRaises(ValueError):
+            history.transaction_timestamp(4)
+
+    def test_value_as_of(self):
+        """Test as of valuation is the one of the portfolio replayed up to that date"""
+
+        for batch in [False, True]:
+            portfolio = Portfolio(track_history = True)
+            if batch:
+                portfolio.batch_transactions(TransactionBatch.from_transactions(transactions_list))
+            else:
+                portfolio.transactions(transactions_list)
+
+            for timestamp in [10, 15, 20, 35, 40, 100]:
+                reference = self.replay_until(timestamp)
+                prices = {asset_id: Asset.pricing_system.get_asset_sell_price(asset_id, Currency.Euros, timestamp)
+                          for asset_id in reference.get_asset_ids()}
+                self.assertAlmostEqual(portfolio.value_as_of(timestamp, Currency.Euros), reference.get_current_value(Currency.Euros, prices))
+                for asset_id in reference.get_asset_ids():
+                    self.assertAlmostEqual(portfolio.profit_as_of(asset_id, timestamp, Currency.Euros),
+                                           reference.get_asset_profit(asset_id, Currency.Euros, prices))
+
+            self.assertEqual(portfolio.value_as_of(0, Currency.Euros), 0)
+            self.assertIsNone(portfolio.profit_as_of("BOND1", 19, Currency.Euros))
+            self.assertEqual(portfolio.sequence, 5)
+
+    def test_errors(self):
+        """Test as of valuation requires the history and ordered transactions"""
+
+        portfolio = Portfolio()
+        with self.assertRaises(ValueError):
+            portfolio.value_as_of(10, Currency.Euros)
+
+        portfolio = Portfolio(track_history = True)
+        portfolio.transactions(transactions_list)
+        with self.assertRaises(ValueError):
+            portfolio.transaction(CashAsset("DOL", 1, Currency.Dollars, 1, 5.0))
+
+        # A batch with a transaction out of order is rejected before any of its transactions is applied
+        batch = TransactionBatch.from_transactions([(CashAsset("DOL", 1, Currency.Dollars, 1, 50.0), None),
+                                                    (CashAsset("EU", 1, Currency.Euros, 1, 45.0), None)])
+        with self.assertRaises(TransactionError) as context:
+            portfolio.batch_transactions(batch)
+        self.assertEqual(context.exception.row, 1)
+        self.assertEqual(portfolio.sequence, 5)
+        self.assertEqual(portfolio.assets.holding("DOL"), 1000 - 160 + 240)
+        self.assertEqual(portfolio.history.last_timestamp, 40.0)
+
+    def test_value_series(self):
+        """Test the value series matches the as of valuation at every timestamp"""
+
+        portfolio = Portfolio(track_history = True)
+        portfolio.transactions(transactions_list)
+
+        timestamps, values = portfolio.value_series(0, 50, 5, Currency.Dollars)
+        self.assertEqual(list(timestamps), list(range(0, 55, 5)))
+        for timestamp, value in zip(timestamps, values):
+            self.assertAlmostEqual(value, portfolio.value_as_of(timestamp, Currency.Dollars))
+
+        timestamps, values = portfolio.value_series(0, 2 * 86400, "D", Currency.Euros)
+        self.assertEqual(len(values), 3)
+        self.assertEqual(values[0], 0)
+
+        self.assertEqual(len(portfolio.value_series(10, 0, 1, Currency.Euros)[0]), 0)
+        with self.assertRaises(ValueError):
+            portfolio.value_series(0, 10, "M", Currency.Euros)
+
+    def test_price_matrix(self):
+        """Test the price matrix batch request is used when the pricing system has it"""
+
+        class MatrixPricingSystem(TimePricingSystem):
+            requests = 0
+
+            def get_asset_sell_prices(self, asset_ids, currency, timestamp = None):
+                return [self.get_asset_sell_price(asset_id, currency, timestamp) for asset_id in asset_ids]
+
+            def get_asset_price_matrix(self, asset_ids, timestamps, currency):
+                self.requests += 1
+                return [[self.get_asset_sell_price(asset_id, currency, timestamp) for timestamp in timestamps] for asset_id in asset_ids]
+
+        portfolio = Portfolio(track_history = True)
+        portfolio.transactions(transactions_list)
+        expected = portfolio.value_series(0, 50, 1, Currency.Euros)[1]
+
+        Asset.pricing_system = MatrixPricingSystem()
+        try:
+            values = portfolio.value_series(0, 50, 1, Currency.Euros)[1]
+            self.assertEqual(Asset.pricing_system.requests, 1)
+            self.assertTrue(all(abs(values - expected) < 1e-9))
+        finally:
+            Asset.pricing_system = TimePricingSystem()
+
+
+if __name__ == "__main__":
+    unittest.main()
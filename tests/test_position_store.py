@@ -0,0 +1,73 @@
+"""Tests for the PositionStore module"""
+
+import sys
+sys.path.append("../")
+
+import unittest
+from Currency import Currency
+from Asset import Asset, AssetType, CashAsset, BondAsset, StockAsset
+import MockPricingSystem
+from Portfolio import Portfolio
+from PositionStore import ArrayPositionStore, DictPositionStore
+import fixtures
+
+transactions_list = fixtures.transactions_list + [
+                        (BondAsset("BOND1", 30, Currency.Euros, 3.5, 10.0), CashAsset("EU", 105)),  # Buy Bond in other currency
+                    ]
+
+class TestArrayPositionStore(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """Setup only once at class level"""
+        Asset.pricing_system = MockPricingSystem.MockPricingSystem()
+
+    def setUp(self):
+        self.portfolio = Portfolio(ArrayPositionStore(capacity = 1))
+        self.portfolio.transactions(transactions_list)
+        self.reference = Portfolio()
+        self.reference.transactions(transactions_list)
+
+    def test_default_store(self):
+        """Test the default store is a dict of assets"""
+        self.assertIsInstance(self.reference.assets, DictPositionStore)
+
+    def test_positions(self):
+        """Test positions match the ones of the dict store"""
+
+        self.assertEqual(list(self.portfolio.get_asset_ids()), list(self.reference.get_asset_ids()))
+        for asset, reference in zip(self.portfolio, self.reference):
+            self.assertEqual(asset.id, reference.id)
+            self.assertIs(type(asset), type(reference))
+            self.assertEqual(asset.type, reference.type)
+            self.assertEqual(asset.currency, reference.currency)
+            self.assertAlmostEqual(asset.holding, reference.holding)
+            self.assertAlmostEqual(asset.unit_price, reference.unit_price)
+            self.assertEqual(asset.timestamp, reference.timestamp)
+        self.assertEqual(self.portfolio.assets["BOND1"].timestamp, 10.0)
+        self.assertIsNone(self.portfolio.assets.get("UNKNOWN"))
+
+    def test_current_value(self):
+        """Test current value and profits match the ones of the dict store"""
+
+        for currency in Currency:
+            self.assertAlmostEqual(self.portfolio.get_current_value(currency), self.reference.get_current_value(currency))
+            for asset_id in self.reference.get_asset_ids():
+                self.assertAlmostEqual(self.portfolio.get_asset_profit(asset_id, currency),
+                                       self.reference.get_asset_profit(asset_id, currency))
+
+    def test_errors(self):
+        """Test short positions and type mismatches are rejected"""
+
+        with self.assertRaises(ValueError):
+            self.portfolio.transaction(CashAsset("DOL", 1), StockAsset("STOCK2", 1))
+        with self.assertRaises(ValueError):
+            self.portfolio.transaction(CashAsset("DOL", 1), CashAsset("EU", 10000))
+        with self.assertRaises(ValueError):
+            self.portfolio.transaction(StockAsset("DOL", 1))
+        self.assertEqual(self.portfolio.assets.types[0], 0)
+        self.assertEqual(self.portfolio.assets["DOL"].type, AssetType.Cash)
+
+
+if __name__ == "__main__":
+    unittest.main()
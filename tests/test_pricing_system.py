@@ -0,0 +1,74 @@
+"""Tests for the PricingSystem module"""
+
+import sys
+sys.path.append("../")
+
+import unittest
+from Currency import Currency
+from Asset import Asset
+import MockPricingSystem
+from Portfolio import Portfolio
+from PositionStore import ArrayPositionStore
+from PricingSystem import BatchPricingAdapter, as_batch_pricing_system, get_price_snapshot
+from fixtures import transactions_list
+
+
+class CountingPricingSystem(MockPricingSystem.MockPricingSystem):
+    """Mock pricing system that counts the requests and supports batches"""
+
+    def __init__(self):
+        self.single_calls = 0
+        self.batch_calls = 0
+
+    def get_asset_sell_price(self, asset_id, currency, timestamp = None):
+        self.single_calls += 1
+        return super(CountingPricingSystem, self).get_asset_sell_price(asset_id, currency, timestamp)
+
+    def get_asset_sell_prices(self, asset_ids, currency, timestamp = None):
+        self.batch_calls += 1
+        return [super(CountingPricingSystem, self).get_asset_sell_price(asset_id, currency, timestamp) for asset_id in asset_ids]
+
+
+class TestPricingSystem(unittest.TestCase):
+
+    def setUp(self):
+        self.pricing_system = CountingPricingSystem()
+        Asset.pricing_system = self.pricing_system
+
+    def tearDown(self):
+        Asset.pricing_system = MockPricingSystem.MockPricingSystem()
+
+    def test_adapter(self):
+        """Test single call pricing systems are adapted to the batch method"""
+
+        mock = MockPricingSystem.MockPricingSystem()
+        adapter = as_batch_pricing_system(mock)
+        self.assertIsInstance(adapter, BatchPricingAdapter)
+        self.assertEqual(adapter.get_asset_sell_prices(["DOL", "BOND1"], Currency.Dollars), [1, 5.2])
+        self.assertEqual(adapter.convert_currency_value(10, Currency.Dollars, Currency.Euros), 8)
+        self.assertEqual(as_batch_pricing_system(self.pricing_system).get_asset_sell_prices(["DOL"], Currency.Dollars), [1])
+        self.assertEqual((self.pricing_system.batch_calls, self.pricing_system.single_calls), (1, 0))
+        self.assertEqual(get_price_snapshot(mock, ["EU"], Currency.Euros), {"EU": 1})
+
+    def test_snapshot_reused(self):
+        """Test a valuation requests a single snapshot and reuses it for value and profits"""
+
+        for store in [None, ArrayPositionStore()]:
+            portfolio = Portfolio(store)
+            portfolio.transactions(transactions_list)
+            self.pricing_system.batch_calls = 0
+
+            prices = portfolio.get_price_snapshot(Currency.Euros)
+            self.assertAlmostEqual(portfolio.get_current_value(Currency.Euros, prices), 6049.0)
+            profits = [portfolio.get_asset_profit(asset_id, Currency.Euros, prices) for asset_id in portfolio.get_asset_ids()]
+            self.assertEqual(profits, [3996, 0, 19.4, 144])
+            self.assertEqual(self.pricing_system.batch_calls, 1)
+            self.assertEqual(self.pricing_system.single_calls, 0)
+
+            # Without snapshot, get_current_value makes its own batch request
+            self.assertAlmostEqual(portfolio.get_current_value(Currency.Dollars), 5988.8)
+            self.assertEqual(self.pricing_system.batch_calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+"""Tests for the ScenarioEngine module"""
+
+import sys
+sys.path.append("../")
+
+import unittest
+import numpy as np
+from Currency import Currency
+from Asset import Asset
+import MockPricingSystem
+from Portfolio import Portfolio
+from ScenarioEngine import ScenarioEngine
+from fixtures import transactions_list
+
+
+class ShockedPricingSystem(MockPricingSystem.MockPricingSystem):
+    """Mock pricing system with relative price shocks per asset id"""
+
+    def __init__(self, shocks):
+        self.shocks = shocks
+
+    def get_asset_sell_price(self, asset_id, currency, timestamp = None):
+        price = super(ShockedPricingSystem, self).get_asset_sell_price(asset_id, currency, timestamp)
+        return price * (1 + self.shocks.get(asset_id, 0))
+
+
+class TestScenarioEngine(unittest.TestCase):
+
+    def setUp(self):
+        Asset.pricing_system = MockPricingSystem.MockPricingSystem()
+        self.portfolio = Portfolio()
+        self.portfolio.transactions(transactions_list)
+        self.engine = ScenarioEngine(self.portfolio, Currency.Euros)
+
+    def test_price_shocks(self):
+        """Test price shock scenarios match re-pricing the portfolio with shocked prices"""
+
+        scenarios = [{}, {"STOCK1": -0.2}, {"BOND1": 0.1, "DOL": 0.05}]
+        result = self.engine.evaluate(self.engine.price_shock_matrix(scenarios))
+
+        self.assertAlmostEqual(self.engine.base_value, self.portfolio.get_current_value(Currency.Euros))
+        for row, scenario in enumerate(scenarios):
+            Asset.pricing_system = ShockedPricingSystem(scenario)
+            value = self.portfolio.get_current_value(Currency.Euros)
+            self.assertAlmostEqual(result.values[row], value)
+            self.assertAlmostEqual(result.pnl[row], value - self.engine.base_value)
+
+        with self.assertRaises(ValueError):
+            self.engine.price_shock_matrix([{"UNKNOWN": 0.1}])
+        with self.assertRaises(ValueError):
+            self.engine.evaluate(np.zeros((2, 3)))
+        with self.assertRaises(ValueError):
+            self.engine.evaluate()
+
+    def test_fx_shocks(self):
+        """Test FX shocks apply to the assets of their currency, the valuation currency is not shocked"""
+
+        prices = self.portfolio.get_price_snapshot(Currency.Euros)
+        dollar_value = sum(self.portfolio.assets[asset_id].holding * prices[asset_id] for asset_id in ["DOL", "BOND1"])
+
+        fx_shocks = self.engine.fx_shock_matrix([{"USD": 0.1}, {Currency.Euros: 0.5}])
+        price_shocks = self.engine.price_shock_matrix([{"BOND1": 1}, {}])
+        result = self.engine.evaluate(price_shocks, fx_shocks)
+
+        bond_value = self.portfolio.assets["BOND1"].holding * prices["BOND1"]
+        self.assertAlmostEqual(result.pnl[0], (dollar_value + bond_value) * 1.1 - dollar_value)
+        self.assertAlmostEqual(result.pnl[1], 0)
+        np.testing.assert_allclose(self.engine.evaluate(fx_shocks = fx_shocks).values,
+                                   [self.engine.base_value + dollar_value * 0.1, self.engine.base_value])
+
+    def test_chunked_pool(self):
+        """Test the process pool path gives the in process results"""
+
+        rng = np.random.default_rng(0)
+        price_shocks = rng.normal(0, 0.1, (50, len(self.engine.asset_ids)))
+        fx_shocks = rng.normal(0, 0.05, (50, len(self.engine.currencies)))
+
+        expected = self.engine.evaluate(price_shocks, fx_shocks)
+        result = self.engine.evaluate(price_shocks, fx_shocks, max_workers = 2, chunk_size = 16)
+        np.testing.assert_allclose(result.values, expected.values)
+        np.testing.assert_allclose(result.pnl, expected.pnl)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+"""Tests for the ShardedReplay module"""
+
+import sys
+sys.path.append("../")
+
+import random
+import unittest
+import multiprocessing
+from Currency import Currency
+from Asset import Asset, CashAsset, BondAsset, StockAsset
+import MockPricingSystem
+from Portfolio import Portfolio
+from PositionStore import ArrayPositionStore
+from TransactionBatch import TransactionBatch, TransactionError
+from CachingPricingSystem import CachingPricingSystem
+from Metrics import InstrumentedPricingSystem
+from ShardedReplay import ShardedReplayer, shard_legs
+from fixtures import transactions_list
+
+
+def random_transactions(count, seed = 0):
+    """Random buy and sell transactions in both currencies that never go short"""
+
+    generator = random.Random(seed)
+    holdings = {}
+    transactions = [(CashAsset("DOL", 1e6, Currency.Dollars, 1, 0.0), None)]
+    for i in range(count):
+        asset_id = f"S{generator.randrange(20)}"
+        holding = holdings.get(asset_id, 0)
+        if holding > 0 and generator.random() < 0.4:
+            quantity = generator.randint(1, holding)
+            holdings[asset_id] = holding - quantity
+            transactions.append((CashAsset("DOL", quantity * 5, Currency.Dollars, 1, float(i)), StockAsset(asset_id, quantity)))
+        else:
+            quantity = generator.randint(1, 50)
+            holdings[asset_id] = holding + quantity
+            currency = Currency.Dollars if generator.random() < 0.7 else Currency.Euros
+            transactions.append((StockAsset(asset_id, quantity, currency, generator.uniform(1, 10), float(i)), CashAsset("DOL", quantity)))
+    return transactions
+
+
+class TestShardedReplay(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """Setup only once at class level"""
+        Asset.pricing_system = MockPricingSystem.MockPricingSystem()
+        cls.replayer = ShardedReplayer(shard_count = 4, max_workers = 2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.replayer.close()
+
+    def test_shard_legs(self):
+        """Test the legs of an asset id are in a single shard, in their order"""
+
+        legs = TransactionBatch.from_transactions(random_transactions(200)).legs()
+        shards = shard_legs(legs, 4)
+
+        self.assertEqual(sum(len(shard.asset_ids) for shard in shards), len(legs.asset_ids))
+        shard_ids = [set(shard.asset_ids) for shard in shards]
+        for i in range(4):
+            for j in range(i + 1, 4):
+                self.assertFalse(shard_ids[i] & shard_ids[j])
+        for shard in shards:
+            for asset_id in set(shard.asset_ids):
+                self.assertEqual(list(shard.sequence[shard.asset_ids == asset_id]),
+                                 list(legs.sequence[legs.asset_ids == asset_id]))
+
+    def test_replay(self):
+        """Test the sharded replay gives the positions of the serial replay, in chunks and on any store"""
+
+        transactions = random_transactions(500)
+        expected = Portfolio()
+        expected.transactions(transactions)
+
+        for store in [None, ArrayPositionStore()]:
+            portfolio = Portfolio(store)
+            self.replayer.replay(portfolio, TransactionBatch.from_transactions(transactions[:200]))
+            portfolio.get_current_value(Currency.Euros)    # memoized, the next replay must invalidate it
+            self.replayer.replay(portfolio, TransactionBatch.from_transactions(transactions[200:]))
+
+            self.assertEqual(portfolio.sequence, len(transactions))
+            self.assertEqual(set(portfolio.get_asset_ids()), set(expected.get_asset_ids()))
+            for asset_id in expected.get_asset_ids():
+                self.assertAlmostEqual(portfolio.assets.holding(asset_id), expected.assets.holding(asset_id))
+                self.assertAlmostEqual(portfolio.assets[asset_id].unit_price, expected.assets[asset_id].unit_price)
+            self.assertAlmostEqual(portfolio.get_current_value(Currency.Euros), expected.get_current_value(Currency.Euros))
+
+        portfolio = Portfolio(track_history = True)
+        self.replayer.replay(portfolio, TransactionBatch.from_transactions(transactions_list))
+        self.assertAlmostEqual(portfolio.get_current_value(Currency.Euros), 6049.0)
+
+    def test_first_error(self):
+        """Test the first rejected transaction by global sequence is reported and nothing is applied"""
+
+        transactions = transactions_list + [
+            (StockAsset("SA1", 10, Currency.Dollars, 1), CashAsset("EU", 10)),
+            (CashAsset("EU", 10, Currency.Euros, 1), BondAsset("BOND1", 50)),     # short BOND1
+            (CashAsset("DOL", 10, Currency.Dollars, 1), StockAsset("SA1", 20)),   # short SA1
+        ]
+
+        # BOND1 and SA1 are in different shards
+        for sequence, expected_id in [(transactions, "BOND1"), (transactions[:6] + transactions[7:], "SA1")]:
+            portfolio = Portfolio()
+            with self.assertRaises(TransactionError) as context:
+                self.replayer.replay(portfolio, TransactionBatch.from_transactions(sequence))
+            self.assertEqual(context.exception.row, 6)
+            self.assertIn(expected_id, str(context.exception))
+            self.assertEqual(portfolio.sequence, 0)
+            self.assertEqual(len(portfolio.assets), 0)
+
+    def test_spawn_context(self):
+        """Test a replayer with spawned workers and a wrapped pricing system"""
+
+        pricing_system = CachingPricingSystem(InstrumentedPricingSystem(MockPricingSystem.MockPricingSystem()))
+        replayer = ShardedReplayer(shard_count = 2, max_workers = 1, pricing_system = pricing_system,
+                                   mp_context = multiprocessing.get_context("spawn"))
+        try:
+            portfolio = Portfolio()
+            replayer.replay(portfolio, TransactionBatch.from_transactions(transactions_list))
+            self.assertAlmostEqual(portfolio.get_current_value(Currency.Euros), 6049.0)
+        finally:
+            replayer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+"""Tests for the StreamingPortfolio module"""
+
+import sys
+sys.path.append("../")
+
+import io
+import json
+import threading
+import unittest
+from Currency import Currency
+from Asset import Asset, CashAsset, BondAsset, StockAsset
+import MockPricingSystem
+from Portfolio import Portfolio
+from StreamingPortfolio import StreamingPortfolio, PriceTick, QueueFeed, LineFeed
+from fixtures import transactions_list
+
+
+class CountingPricingSystem(MockPricingSystem.MockPricingSystem):
+    """Mock pricing system that counts the single price requests"""
+
+    def __init__(self):
+        self.price_requests = 0
+
+    def get_asset_sell_price(self, asset_id, currency, timestamp = None):
+        self.price_requests += 1
+        return super(CountingPricingSystem, self).get_asset_sell_price(asset_id, currency, timestamp)
+
+
+class TestStreamingPortfolio(unittest.TestCase):
+
+    def setUp(self):
+        self.pricing_system = Asset.pricing_system = CountingPricingSystem()
+        self.portfolio = Portfolio()
+        self.portfolio.transactions(transactions_list)
+        self.stream = StreamingPortfolio(self.portfolio, Currency.Euros)
+        self.events = []
+        self.stream.subscribe(self.events.append)
+        self.pricing_system.price_requests = 0
+
+    def tearDown(self):
+        Asset.pricing_system = MockPricingSystem.MockPricingSystem()
+
+    def test_ticks(self):
+        """Test ticks update the value and profit of their asset only"""
+
+        self.assertAlmostEqual(self.stream.total, 6049.0)
+        self.stream.on_tick(PriceTick("BOND1", Currency.Euros, 5.5))
+        self.stream.on_tick(PriceTick("STOCK1", Currency.Dollars, 10))
+        self.stream.on_tick(PriceTick("UNKNOWN", Currency.Euros, 1))
+
+        self.assertEqual(self.pricing_system.price_requests, 0)
+        self.assertAlmostEqual(self.stream.total, 6049.0 + 10 * 1 + 60 * (8 - 4.5))
+        self.assertAlmostEqual(self.stream.profit("BOND1"), 19.4 + 10)
+        self.assertEqual([(event.kind, event.asset_id) for event in self.events], [("tick", "BOND1"), ("tick", "STOCK1")])
+        self.assertAlmostEqual(self.events[-1].total, self.stream.total)
+        self.assertAlmostEqual(self.stream.total, self.portfolio.get_current_value(Currency.Euros, self.stream.prices))
+
+    def test_trades(self):
+        """Test trades, from the stream or applied directly to the portfolio, re-value the touched assets"""
+
+        self.stream.on_trade(StockAsset("SA1", 10, Currency.Euros, 2), CashAsset("EU", 20))
+        self.portfolio.transaction(CashAsset("EU", 9, Currency.Euros, 1), BondAsset("BOND1", 2))
+
+        self.assertEqual(self.pricing_system.price_requests, 1)
+        self.assertEqual([(event.kind, event.asset_id) for event in self.events],
+                         [("trade", "SA1"), ("trade", "EU"), ("trade", "EU"), ("trade", "BOND1")])
+        self.assertAlmostEqual(self.stream.total, self.portfolio.get_current_value(Currency.Euros, self.stream.prices))
+        self.assertAlmostEqual(self.stream.profit("SA1"), 10 * 4.5 - 20)
+
+        event_count = len(self.events)
+        with self.assertRaises(ValueError):
+            self.stream.on_trade(CashAsset("EU", 1, Currency.Euros, 1), BondAsset("BOND1", 100))
+        self.assertEqual(len(self.events), event_count)
+
+        # A rejected input still re-values the removed output
+        with self.assertRaises(ValueError):
+            self.stream.on_trade(StockAsset("EU", 1, Currency.Euros, 1), BondAsset("BOND1", 1))
+        self.assertEqual([(event.kind, event.asset_id) for event in self.events[event_count:]], [("trade", "BOND1")])
+
+        self.assertAlmostEqual(self.stream.total, self.portfolio.get_current_value(Currency.Euros, self.stream.prices))
+
+        self.stream.close()
+        event_count = len(self.events)
+        self.portfolio.transaction(CashAsset("EU", 1, Currency.Euros, 1))
+        self.assertEqual(len(self.events), event_count)
+
+    def test_feeds(self):
+        """Test a queue feed consumed by a thread and a NDJSON line feed"""
+
+        feed = QueueFeed()
+        thread = threading.Thread(target = self.stream.run, args = (feed,))
+        thread.start()
+        feed.put_tick(PriceTick("BOND1", Currency.Euros, 5.5))
+        feed.put_trade(CashAsset("EU", 1, Currency.Euros, 1), BondAsset("BOND1", 100))
+        feed.put_trade(StockAsset("SA1", 10, Currency.Euros, 2), CashAsset("EU", 20))
+        feed.close()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertAlmostEqual(self.stream.total, 6049.0 + 10 + 45 - 20)
+
+        # The rejected trade is published and the trade after it is applied
+        rejected = [event for event in self.events if event.kind == "rejected"]
+        self.assertEqual([(event.asset_id, event.total) for event in rejected], [("EU", 6049.0 + 10)])
+        self.assertIn("short", rejected[0].error)
+        self.assertEqual(self.events[-1].kind, "trade")
+
+        lines = [json.dumps({"tick": {"asset_id": "SA1", "currency": "Euros", "price": 5}}), "",
+                 json.dumps({"input": {"type": "CASH", "id": "EU", "holding": 50, "currency": "Euros", "unit_price": 1},
+                             "output": {"type": "STOCK", "id": "SA1", "holding": 10}})]
+        self.stream.run(LineFeed(io.BytesIO("\n".join(lines).encode("utf-8"))))
+        self.assertAlmostEqual(self.stream.total, 6049.0 + 10 + 45 - 20 + 5 + 50 - 50)
+        self.assertEqual(self.portfolio.assets.holding("SA1"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+"""Tests for the TransactionBatch module"""
+
+import sys
+sys.path.append("../")
+
+import math
+import random
+import warnings
+import unittest
+from Currency import Currency
+from Asset import Asset, AssetType, CashAsset, BondAsset, StockAsset
+import MockPricingSystem
+from Portfolio import Portfolio
+from PositionStore import ArrayPositionStore
+from TransactionBatch import TransactionBatch, TransactionError
+from fixtures import transactions_list
+
+
+def random_transactions(count, seed = 0):
+    """Random buy and sell transactions that never go short"""
+
+    generator = random.Random(seed)
+    holdings = {}
+    transactions = [(CashAsset("DOL", 1e6, Currency.Dollars, 1, 0.0), None)]
+    for i in range(count):
+        asset_id = f"STOCK{generator.randrange(10)}"
+        currency = generator.choice(list(Currency))
+        if holdings.get(asset_id, 0) > 0 and generator.random() < 0.4:
+            quantity = generator.choice([holdings[asset_id], generator.uniform(0, holdings[asset_id])])
+            holdings[asset_id] -= quantity
+            transactions.append((CashAsset("DOL", quantity * 5, Currency.Dollars, 1, float(i)), StockAsset(asset_id, quantity)))
+        else:
+            quantity = generator.randint(1, 100)
+            holdings[asset_id] = holdings.get(asset_id, 0) + quantity
+            transactions.append((StockAsset(asset_id, quantity, currency, generator.uniform(1, 10), float(i)), CashAsset("DOL", quantity)))
+    return transactions
+
+
+def fractional_transactions(count, generator):
+    """Random transactions with fractional quantities, sales to zero and a large cash position"""
+
+    holdings = {}
+    transactions = [(CashAsset("DOL", generator.choice([1e6, 1e12, 1e15]), Currency.Dollars, 1, 0.0), None)]
+    for i in range(count):
+        asset_id = f"STOCK{generator.randrange(generator.choice([3, 30]))}"
+        if holdings.get(asset_id, 0) > 0 and generator.random() < 0.4:
+            quantity = generator.choice([holdings[asset_id], holdings[asset_id] * generator.random()])
+            output_asset = StockAsset(asset_id, quantity)
+            input_asset = generator.choice([CashAsset("DOL", quantity * 5, Currency.Dollars, 1, float(i)),
+                                            StockAsset(f"STOCK{generator.randrange(30)}", quantity, Currency.Euros, 2, float(i))])
+            holdings[asset_id] -= quantity
+        else:
+            quantity = round(generator.uniform(0, 10), generator.randint(0, 5)) or 0.5
+            input_asset = StockAsset(asset_id, quantity, generator.choice(list(Currency)), generator.uniform(1, 50), float(i))
+            output_asset = generator.choice([None, CashAsset("DOL", quantity)])
+        holdings[input_asset.id] = holdings.get(input_asset.id, 0) + input_asset.holding
+        transactions.append((input_asset, output_asset))
+    return transactions
+
+
+class TestTransactionBatch(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """Setup only once at class level"""
+        Asset.pricing_system = MockPricingSystem.MockPricingSystem()
+
+    def assertSamePositions(self, portfolio, reference):
+        """Checks two portfolios have the same positions"""
+
+        self.assertEqual(sorted(portfolio.get_asset_ids()), sorted(reference.get_asset_ids()))
+        for asset in reference:
+            position = portfolio.assets.get_position(asset.id)
+            self.assertEqual(position[0], asset.type)
+            self.assertEqual(position[1], asset.currency)
+            self.assertAlmostEqual(position[2], asset.holding, places = 6)
+            self.assertAlmostEqual(position[3], asset.unit_price, places = 6)
+            self.assertEqual(position[4], asset.timestamp)
+
+    def test_from_transactions(self):
+        """Test batch columns built from transaction tuples"""
+
+        batch = TransactionBatch.from_transactions(transactions_list)
+        self.assertEqual(len(batch), 5)
+        self.assertEqual(list(batch.output_holdings), [0, 0, 160, 126, 40])
+        self.assertEqual(batch.input_types[2], AssetType.Bond)
+
+        legs = batch.legs()
+        self.assertEqual(len(legs.asset_ids), 8)
+        self.assertEqual(list(legs.sequence[:3]), [4, 6, 8])
+
+        with self.assertRaises(ValueError):
+            TransactionBatch(["A"], [1, 2], [1], [Currency.Dollars], [None], [None], [0], [AssetType.Cash])
+
+    def test_same_as_loop(self):
+        """Test the batch gives the same positions as the per tuple loop"""
+
+        for store in [None, ArrayPositionStore()]:
+            portfolio = Portfolio(store)
+            portfolio.batch_transactions(TransactionBatch.from_transactions(transactions_list))
+            reference = Portfolio()
+            reference.transactions(transactions_list)
+            self.assertSamePositions(portfolio, reference)
+            self.assertAlmostEqual(portfolio.get_current_value(Currency.Euros), 6049.0)
+
+        transactions = random_transactions(2000)
+        portfolio = Portfolio()
+        portfolio.batch_transactions(TransactionBatch.from_transactions(transactions[:700]))
+        portfolio.batch_transactions(TransactionBatch.from_transactions(transactions[700:]))
+        reference = Portfolio()
+        reference.transactions(transactions)
+        self.assertSamePositions(portfolio, reference)
+
+    def test_differential(self):
+        """Test random fractional histories give the positions of the per tuple loop, with no NaN"""
+
+        generator = random.Random(3)
+        for run in range(200):
+            transactions = fractional_transactions(generator.choice([5, 40, 300]), generator)
+            reference = Portfolio()
+            reference.transactions(transactions)
+            portfolio = Portfolio(ArrayPositionStore() if run % 2 else None)
+            split = generator.randrange(len(transactions))
+            with warnings.catch_warnings():
+                warnings.simplefilter("error")
+                portfolio.batch_transactions(TransactionBatch.from_transactions(transactions[:split]))
+                portfolio.batch_transactions(TransactionBatch.from_transactions(transactions[split:]))
+
+            for asset in reference:
+                position = portfolio.assets.get_position(asset.id)
+                self.assertEqual(position[2], asset.holding)
+                self.assertTrue(math.isclose(position[3], asset.unit_price, rel_tol = 1e-9), (run, asset.id, position, asset))
+
+    def test_short_rejected(self):
+        """Test short positions report the first rejected row and leave the portfolio unchanged"""
+
+        portfolio = Portfolio()
+        portfolio.transactions(transactions_list)
+        rejected = [
+                        (StockAsset("STOCK2", 10, Currency.Dollars, 1), CashAsset("DOL", 10)),
+                        (CashAsset("DOL", 100, Currency.Dollars, 1), StockAsset("STOCK2", 10)),     # Sells everything
+                        (CashAsset("EU", 100, Currency.Euros, 1), BondAsset("BOND1", 20)),          # Short
+                        (CashAsset("DOL", 100, Currency.Dollars, 1), StockAsset("STOCK2", 1)),      # Short
+                   ]
+        with self.assertRaises(TransactionError) as context:
+            portfolio.batch_transactions(TransactionBatch.from_transactions(rejected))
+        self.assertEqual(context.exception.row, 2)
+        self.assertEqual(portfolio.get_current_value(Currency.Euros), 6049.0)
+
+        # Exactly selling the holding built from float quantities is allowed
+        portfolio.batch_transactions(TransactionBatch.from_transactions([
+                        (StockAsset("STOCK3", 0.1, Currency.Dollars, 1), None),
+                        (StockAsset("STOCK3", 0.2, Currency.Dollars, 1), None),
+                        (CashAsset("DOL", 1, Currency.Dollars, 1), StockAsset("STOCK3", 0.1 + 0.2))]))
+        self.assertEqual(portfolio.assets.holding("STOCK3"), 0)
+
+    def test_type_mismatch(self):
+        """Test adding a different type to a position is rejected"""
+
+        portfolio = Portfolio()
+        with self.assertRaises(ValueError) as context:
+            portfolio.batch_transactions(TransactionBatch.from_transactions(transactions_list + [(StockAsset("BOND1", 1), None)]))
+        self.assertEqual(context.exception.row, 5)
+        self.assertEqual(len(portfolio.assets), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+"""Tests for the TransactionLoader module"""
+
+import sys
+sys.path.append("../")
+
+import io
+import os
+import json
+import tempfile
+import unittest
+from Currency import Currency
+from Asset import Asset, CashAsset, BondAsset
+import MockPricingSystem
+from Portfolio import Portfolio
+import TransactionLoader
+
+records = [
+            {"input": {"type": "CASH", "id": "DOL", "holding": 1000, "currency": "Dollars", "unit_price": 1}, "output": None},
+            {"input": {"type": "CASH", "id": "EU", "holding": 1000, "currency": "Euros", "unit_price": 1}, "output": None},
+            {"input": {"type": "BOND", "id": "BOND1", "holding": 50, "currency": "Dollars", "unit_price": 3.2}, "output": {"type": "CASH", "id": "DOL", "holding": 160}},
+            {"input": {"type": "BOND", "id": "STOCK1", "holding": 60, "currency": "Euros", "unit_price": 2.1}, "output": {"type": "CASH", "id": "EU", "holding": 126}},
+            {"input": {"type": "CASH", "id": "DOL", "holding": 240, "currency": "Dollars", "unit_price": 1}, "output": {"type": "BOND", "id": "BOND1", "holding": 40}},
+          ]
+
+class TestTransactionLoader(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """Setup only once at class level"""
+        Asset.pricing_system = MockPricingSystem.MockPricingSystem()
+
+    def _write(self, text):
+        """Writes text into a temporary file and returns its path"""
+
+        file = tempfile.NamedTemporaryFile("w", suffix = ".json", delete = False, encoding = "utf-8")
+        file.write(text)
+        file.close()
+        self.addCleanup(os.remove, file.name)
+        return file.name
+
+    def test_record_to_transaction(self):
+        """Test conversion of a record into assets"""
+
+        input_asset, output_asset = TransactionLoader.record_to_transaction(records[2])
+        self.assertIsInstance(input_asset, BondAsset)
+        self.assertEqual(input_asset, BondAsset("BOND1", 50, Currency.Dollars, 3.2))
+        self.assertEqual(output_asset, CashAsset("DOL", 160))
+
+        input_asset, output_asset = TransactionLoader.record_to_transaction(records[0])
+        self.assertIsNone(output_asset)
+
+        # Dates are converted to timestamps
+        self.assertEqual(TransactionLoader.parse_timestamp(1.5), 1.5)
+        self.assertIsInstance(TransactionLoader.parse_timestamp("01/01/2020"), float)
+
+        # Unknown types are rejected
+        with self.assertRaises(ValueError):
+            TransactionLoader.record_to_asset({"type": "GOLD", "id": "G", "holding": 1})
+
+    def test_ndjson(self):
+        """Test loading a NDJSON history"""
+
+        path = self._write("\n" + "\n".join(json.dumps(record) for record in records) + "\n\n")
+        transactions = list(TransactionLoader.load_transactions(path))
+        self.assertEqual(len(transactions), 5)
+        self.assertEqual(transactions[4][1], BondAsset("BOND1", 40))
+
+    def test_json_array_chunks(self):
+        """Test loading a JSON array with records split between chunks"""
+
+        path = self._write(json.dumps(records, indent = 2))
+        expected = list(TransactionLoader.load_transactions(path))
+        for chunk_size in [1, 3, 7, 64]:
+            transactions = list(TransactionLoader.load_transactions(path, chunk_size))
+            self.assertEqual(transactions, expected)
+        self.assertEqual(len(expected), 5)
+
+        # Empty and truncated arrays
+        self.assertEqual(list(TransactionLoader.iter_records(io.StringIO(" [ ] "))), [])
+        self.assertEqual(list(TransactionLoader.iter_records(io.StringIO(""))), [])
+        with self.assertRaises(ValueError):
+            list(TransactionLoader.iter_records(io.StringIO(json.dumps(records)[:-10]), 8))
+
+    def test_portfolio_and_stats(self):
+        """Test the loaded transactions build the portfolio lazily and stats are collected"""
+
+        path = self._write("\n".join(json.dumps(record) for record in records))
+        stats = TransactionLoader.LoaderStats()
+        portfolio = Portfolio()
+        portfolio.transactions(TransactionLoader.load_transactions(path, stats = stats))
+        stats.stop()
+
+        self.assertEqual(portfolio.get_current_value(Currency.Euros), 6049.0)
+        self.assertEqual(stats.rows, 5)
+        self.assertGreater(stats.rows_per_second(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+"""Tests for the TransactionLog module"""
+
+import sys
+sys.path.append("../")
+
+import os
+import json
+import tempfile
+import unittest
+from Currency import Currency
+from Asset import Asset, CashAsset, BondAsset, StockAsset
+import MockPricingSystem
+from Portfolio import Portfolio
+from TransactionBatch import TransactionError
+import TransactionLog
+from fixtures import transactions_list
+
+
+class TestTransactionLog(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """Setup only once at class level"""
+        Asset.pricing_system = MockPricingSystem.MockPricingSystem()
+
+    def _path(self):
+        """Returns a temporary file path removed after the test"""
+
+        file = tempfile.NamedTemporaryFile(suffix = ".pftlog", delete = False)
+        file.close()
+        self.addCleanup(os.remove, file.name)
+        return file.name
+
+    def _write(self, transactions, buffer_size = 1 << 16):
+        path = self._path()
+        with TransactionLog.TransactionLogWriter(path, buffer_size) as writer:
+            writer.write_transactions(transactions)
+        return path
+
+    def test_round_trip(self):
+        """Test the transactions read back from a log"""
+
+        transactions = transactions_list + [(StockAsset("SA1", 5, Currency.Euros, 2.5, 1234.5), CashAsset("EU", 12.5))]
+        log = TransactionLog.TransactionLog(self._write(transactions, buffer_size = 2))
+
+        self.assertEqual(len(log), len(transactions))
+        self.assertEqual(log.records["sequence"].tolist(), list(range(len(transactions))))
+        self.assertEqual(list(log.ids[:-1]), ["DOL", "EU", "BOND1", "STOCK1", "SA1"])
+        for (input_asset, output_asset), (expected_input, expected_output) in zip(log.transactions(), transactions):
+            self.assertEqual(input_asset, expected_input)
+            self.assertEqual(input_asset.currency, expected_input.currency)
+            self.assertEqual(input_asset.unit_price, expected_input.unit_price)
+            self.assertEqual(input_asset.timestamp, expected_input.timestamp)
+            if expected_output is None:
+                self.assertIsNone(output_asset)
+            else:
+                self.assertEqual(output_asset, expected_output)
+                self.assertEqual(output_asset.holding, expected_output.holding)
+
+        # Read in chunks, from a start transaction
+        for chunk_size in [1, 2, 4]:
+            self.assertEqual([(input_asset.id, input_asset.holding) for input_asset, _ in log.transactions(1, chunk_size)],
+                             [(input_asset.id, input_asset.holding) for input_asset, _ in transactions[1:]])
+
+    def test_replay(self):
+        """Test the batch replay of a log, from the start and after a checkpoint"""
+
+        log = TransactionLog.TransactionLog(self._write(transactions_list))
+
+        for chunk_size in [1, 2, 10]:
+            portfolio = Portfolio()
+            self.assertEqual(TransactionLog.replay_log(portfolio, log, chunk_size), 5)
+            self.assertAlmostEqual(portfolio.get_current_value(Currency.Euros), 6049.0)
+            self.assertEqual(portfolio.sequence, 5)
+
+        portfolio = Portfolio()
+        portfolio.transactions(transactions_list[:3])
+        self.assertEqual(TransactionLog.replay_log(portfolio, log), 2)
+        self.assertAlmostEqual(portfolio.get_current_value(Currency.Dollars), 5988.8)
+        self.assertEqual(TransactionLog.replay_log(portfolio, log), 0)
+
+        short_log = TransactionLog.TransactionLog(self._write([transactions_list[0], (BondAsset("BOND1", 5), CashAsset("DOL", 2000))]))
+        with self.assertRaises(TransactionError):
+            TransactionLog.replay_log(Portfolio(), short_log)
+
+    def test_convert_json(self):
+        """Test the conversion of a JSON transaction history"""
+
+        path = self._path()
+        source = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "transactions_example.json")
+        self.assertEqual(TransactionLog.convert_json(source, path), 5)
+        self.assertTrue(TransactionLog.is_transaction_log(path))
+        self.assertFalse(TransactionLog.is_transaction_log(source))
+
+        portfolio = Portfolio()
+        TransactionLog.replay_log(portfolio, TransactionLog.TransactionLog(path))
+        self.assertAlmostEqual(portfolio.get_current_value(Currency.Euros), 6049.0)
+
+    def test_invalid(self):
+        """Test empty and invalid logs"""
+
+        log = TransactionLog.TransactionLog(self._write([]))
+        self.assertEqual(len(log), 0)
+        self.assertEqual(list(log.transactions()), [])
+        self.assertEqual(TransactionLog.replay_log(Portfolio(), log), 0)
+
+        path = self._write(transactions_list)
+        with open(path, "r+b") as file:
+            file.truncate(100)
+        with self.assertRaises(ValueError):
+            TransactionLog.TransactionLog(path)
+
+        path = self._path()
+        with open(path, "w") as file:
+            json.dump([], file)
+        with self.assertRaises(ValueError):
+            TransactionLog.TransactionLog(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+"""Tests for the TransactionValidation module and Portfolio.validated_transactions"""
+
+import sys
+sys.path.append("../")
+
+import unittest
+from Currency import Currency
+from Asset import Asset, CashAsset, StockAsset
+import MockPricingSystem
+from Portfolio import Portfolio
+from PositionStore import ArrayPositionStore
+from FixedPoint import FixedPointPositionStore
+from TransactionValidation import ATOMIC, SKIP, ValidationError, validate_transactions
+from fixtures import transactions_list
+
+
+# Rows 1 (short), 2 (input type), 4 (short once row 1 is skipped) and 5 (output type) are rejected
+bad_transactions_list = [
+                        (StockAsset("SA1", 10, Currency.Euros, 2), CashAsset("EU", 20)),
+                        (StockAsset("SA2", 10, Currency.Euros, 2), CashAsset("EU", 5000)),
+                        (StockAsset("BOND1", 1, Currency.Euros, 2), CashAsset("EU", 2)),
+                        (CashAsset("EU", 30, Currency.Euros, 1), StockAsset("SA1", 5)),
+                        (CashAsset("EU", 30, Currency.Euros, 1), StockAsset("SA2", 5)),
+                        (CashAsset("EU", 30, Currency.Euros, 1), StockAsset("STOCK1", 5)),
+                        (StockAsset("SA1", 10, Currency.Euros, 3), CashAsset("EU", 30)),
+                    ]
+
+
+class TestTransactionValidation(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """Setup only once at class level"""
+        Asset.pricing_system = MockPricingSystem.MockPricingSystem()
+
+    def test_validate(self):
+        """Test every violation is collected, rejected rows do not change the running holdings"""
+
+        portfolio = Portfolio()
+        portfolio.transactions(transactions_list)
+        valid_rows, violations = validate_transactions(bad_transactions_list, portfolio.assets)
+
+        self.assertEqual(valid_rows, [0, 3, 6])
+        self.assertEqual([(violation.row, violation.asset_id) for violation in violations],
+                         [(1, "EU"), (2, "BOND1"), (4, "SA2"), (5, "STOCK1")])
+        self.assertEqual(validate_transactions(transactions_list, Portfolio().assets), ([0, 1, 2, 3, 4], []))
+        self.assertEqual(validate_transactions([(CashAsset("DOL", 10, Currency.Dollars, 1), CashAsset("DOL", 10))],
+                                               Portfolio().assets)[0], [])
+
+    def test_policies(self):
+        """Test the ATOMIC policy leaves the portfolio unchanged, the SKIP policy applies the valid rows"""
+
+        for store in [None, ArrayPositionStore()]:
+            portfolio = Portfolio(store)
+            portfolio.transactions(transactions_list)
+            value = portfolio.get_current_value(Currency.Euros)
+
+            with self.assertRaises(ValidationError) as context:
+                portfolio.validated_transactions(bad_transactions_list)
+            self.assertEqual(len(context.exception.violations), 4)
+            self.assertEqual(portfolio.sequence, 5)
+            self.assertAlmostEqual(portfolio.get_current_value(Currency.Euros), value)
+            self.assertNotIn("SA1", portfolio.assets)
+
+            violations = portfolio.validated_transactions(bad_transactions_list, SKIP)
+            self.assertEqual([violation.row for violation in violations], [1, 2, 4, 5])
+            self.assertEqual(portfolio.sequence, 5 + len(bad_transactions_list))
+
+            expected = Portfolio()
+            expected.transactions(transactions_list + [bad_transactions_list[row] for row in [0, 3, 6]])
+            for asset_id in expected.get_asset_ids():
+                self.assertAlmostEqual(portfolio.assets.holding(asset_id), expected.assets.holding(asset_id))
+                self.assertAlmostEqual(portfolio.assets[asset_id].unit_price, expected.assets[asset_id].unit_price)
+            self.assertAlmostEqual(portfolio.get_current_value(Currency.Euros), expected.get_current_value(Currency.Euros))
+
+        self.assertEqual(Portfolio().validated_transactions(transactions_list, ATOMIC), [])
+        with self.assertRaises(ValueError):
+            Portfolio().validated_transactions(transactions_list, "RETRY")
+
+    def test_portfolio_rules(self):
+        """Test the history order, exact quantity and specific lot violations are found before any row is applied"""
+
+        cases = [
+            (lambda: Portfolio(track_history = True),
+             [(CashAsset("EU", 10, Currency.Euros, 1, 200), None), (CashAsset("EU", 10, Currency.Euros, 1, 100), None)],
+             "Transactions must be recorded in timestamp order"),
+            (lambda: Portfolio(FixedPointPositionStore()),
+             [(CashAsset("EU", 10, Currency.Euros, 1), None), (StockAsset("SA1", 0.00001, Currency.Euros, 2), CashAsset("EU", 1))],
+             "is not a multiple"),
+            (lambda: Portfolio(lot_policy = "SPECIFIC"),
+             [(StockAsset("SA1", 10, Currency.Euros, 2), CashAsset("EU", 20)), (StockAsset("SA1", 10, Currency.Euros, 3), CashAsset("EU", 30)),
+              (CashAsset("EU", 10, Currency.Euros, 1), StockAsset("SA1", 5))],
+             "The lots to sell must be specified"),
+        ]
+
+        for new_portfolio, transactions, message in cases:
+            portfolio = new_portfolio()
+            portfolio.transaction(CashAsset("DOL", 100, Currency.Dollars, 1, 150))
+            portfolio.transaction(CashAsset("EU", 100, Currency.Euros, 1, 150))
+            rows = [(CashAsset("DOL", 10, Currency.Dollars, 1, 150), None)] + transactions
+
+            with self.assertRaises(ValidationError) as context:
+                portfolio.validated_transactions(rows)
+            self.assertEqual([violation.row for violation in context.exception.violations], [len(rows) - 1])
+            self.assertIn(message, context.exception.violations[0].message)
+            self.assertEqual(portfolio.sequence, 2)
+            self.assertEqual(portfolio.assets.holding("DOL"), 100)
+            self.assertNotIn("SA1", portfolio.assets)
+
+            violations = portfolio.validated_transactions(rows, SKIP)
+            self.assertEqual([violation.row for violation in violations], [len(rows) - 1])
+            self.assertEqual(portfolio.sequence, 2 + len(rows))
+            self.assertEqual(portfolio.assets.holding("DOL"), 110)
+
+        # The lots opened by the list are checked too: a single specific lot can be sold without lot ids
+        portfolio = Portfolio(lot_policy = "SPECIFIC")
+        portfolio.transaction(CashAsset("EU", 100, Currency.Euros, 1))
+        portfolio.validated_transactions([(StockAsset("SA1", 10, Currency.Euros, 2), CashAsset("EU", 20)),
+                                          (CashAsset("DOL", 30, Currency.Dollars, 1), StockAsset("SA1", 10)),
+                                          (StockAsset("SA1", 10, Currency.Euros, 3), CashAsset("DOL", 30)),
+                                          (StockAsset("SA2", 5, Currency.Euros, 3), StockAsset("SA1", 5))])
+        self.assertEqual([(lot.quantity, lot.unit_price) for lot in portfolio.lots.lots("SA1")], [(5, 3)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+"""Tests for the ValuationCache module and the memoized Portfolio valuations"""
+
+import sys
+sys.path.append("../")
+
+import math
+import unittest
+from Currency import Currency
+from Asset import Asset, CashAsset, BondAsset, StockAsset
+import MockPricingSystem
+from Portfolio import Portfolio
+from PositionStore import ArrayPositionStore
+from TransactionBatch import TransactionBatch
+from CachingPricingSystem import CachingPricingSystem
+from fixtures import transactions_list
+
+
+class VersionedPricingSystem(MockPricingSystem.MockPricingSystem):
+    """Mock pricing system with a price version, that records the priced asset ids"""
+
+    def __init__(self):
+        self.priced = []
+        self.price_version = 0
+        self.bond_price = None
+
+    def get_asset_sell_price(self, asset_id, currency, timestamp = None):
+        self.priced.append(asset_id)
+        if asset_id == "BOND1" and self.bond_price is not None:
+            return self.bond_price
+        return super(VersionedPricingSystem, self).get_asset_sell_price(asset_id, currency, timestamp)
+
+
+class TestValuationCache(unittest.TestCase):
+
+    def setUp(self):
+        self.pricing_system = Asset.pricing_system = VersionedPricingSystem()
+
+    def tearDown(self):
+        Asset.pricing_system = MockPricingSystem.MockPricingSystem()
+
+    def test_memoized_value(self):
+        """Test only the assets touched since the last valuation are priced again"""
+
+        for store in [None, ArrayPositionStore()]:
+            self.pricing_system.priced = []
+            portfolio = Portfolio(store)
+            portfolio.transactions(transactions_list)
+
+            self.assertAlmostEqual(portfolio.get_current_value(Currency.Euros), 6049.0)
+            self.assertAlmostEqual(portfolio.get_current_value(Currency.Euros), 6049.0)
+            self.assertEqual(sorted(self.pricing_system.priced), ["BOND1", "DOL", "EU", "STOCK1"])
+
+            self.pricing_system.priced = []
+            portfolio.transaction(StockAsset("SA1", 10, Currency.Euros, 2), CashAsset("EU", 20))
+            portfolio.transaction(CashAsset("EU", 9, Currency.Euros, 1), BondAsset("BOND1", 2))
+            value = portfolio.get_current_value(Currency.Euros)
+            self.assertEqual(self.pricing_system.priced, ["SA1"])
+            self.assertAlmostEqual(value, portfolio.get_current_value(Currency.Euros, portfolio.get_price_snapshot(Currency.Euros)))
+            self.assertAlmostEqual(value, 6049.0 - 20 + 45 + 9 - 2 * 4.5)
+
+            self.pricing_system.priced = []
+            portfolio.batch_transactions(TransactionBatch.from_transactions([(CashAsset("EU", 1, Currency.Euros, 1), BondAsset("BOND1", 1))]))
+            self.assertAlmostEqual(portfolio.get_current_value(Currency.Euros), value + 1 - 4.5)
+            self.assertEqual(self.pricing_system.priced, [])
+
+    def test_price_version(self):
+        """Test a new price version values the whole book again"""
+
+        portfolio = Portfolio()
+        portfolio.transactions(transactions_list)
+        self.assertAlmostEqual(portfolio.get_asset_profit("BOND1", Currency.Dollars), 20.0)
+        self.assertAlmostEqual(portfolio.get_current_value(Currency.Dollars), 5988.8)
+
+        self.pricing_system.bond_price = 6.2
+        self.assertAlmostEqual(portfolio.get_current_value(Currency.Dollars), 5988.8)
+        self.pricing_system.price_version += 1
+        self.assertAlmostEqual(portfolio.get_current_value(Currency.Dollars), 5998.8)
+        self.assertAlmostEqual(portfolio.get_asset_profit("BOND1", Currency.Dollars), 30.0)
+
+        portfolio.transaction(BondAsset("BOND1", 10, Currency.Dollars, 6.2), CashAsset("DOL", 62))
+        self.assertAlmostEqual(portfolio.get_asset_profit("BOND1", Currency.Dollars), 20 * 6.2 - 32 - 62)
+
+        self.pricing_system.price_version = None
+        self.pricing_system.priced = []
+        portfolio.get_current_value(Currency.Dollars)
+        portfolio.get_current_value(Currency.Dollars)
+        self.assertEqual(len(self.pricing_system.priced), 8)
+
+    def test_caching_pricing_system(self):
+        """Test the invalidation of a caching pricing system changes its price version"""
+
+        caching = CachingPricingSystem(self.pricing_system)
+        version = caching.price_version
+        self.assertIsNotNone(version)
+        caching.invalidate("BOND1")
+        self.assertNotEqual(caching.price_version, version)
+        self.assertIsNone(CachingPricingSystem(object()).price_version)
+
+    def test_caching_expiration(self):
+        """Test the expiration of a cached price changes the price version, so the memoized value is updated"""
+
+        now = [0.0]
+        caching = Asset.pricing_system = CachingPricingSystem(self.pricing_system, price_ttl = 10, clock = lambda: now[0])
+        portfolio = Portfolio()
+        portfolio.transactions(transactions_list)
+        self.assertAlmostEqual(portfolio.get_current_value(Currency.Dollars), 5988.8)
+
+        self.pricing_system.bond_price = 6.2
+        now[0] = 5.0
+        self.assertAlmostEqual(portfolio.get_current_value(Currency.Dollars), 5988.8)
+        now[0] = 10.0
+        self.assertAlmostEqual(portfolio.get_current_value(Currency.Dollars), 5998.8)
+        version = caching.price_version
+        now[0] = 15.0
+        self.assertEqual(caching.price_version, version)
+
+    def test_no_drift(self):
+        """Test the memoized total stays the sum of the asset values over many updates"""
+
+        portfolio = Portfolio()
+        portfolio.transaction(StockAsset("SA1", 1e12, Currency.Euros, 1))
+        portfolio.transaction(CashAsset("EU", 0.1, Currency.Euros, 1))
+        for _ in range(1000):
+            portfolio.get_current_value(Currency.Euros)
+            portfolio.transaction(CashAsset("EU", 0.1, Currency.Euros, 1))
+
+        expected = math.fsum(portfolio.assets.holding(asset_id) * price
+                             for asset_id, price in portfolio.get_price_snapshot(Currency.Euros).items())
+        self.assertEqual(portfolio.get_current_value(Currency.Euros), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()